@@ -0,0 +1,265 @@
+"""Admission control: bounded concurrency and load shedding per route class.
+
+Every API request is sorted into a class:
+- interactive: single-profile reads, charts, pillars, calendars
+- write: POST/PUT/PATCH/DELETE
+- bulk: listings, sync, admin, cross-profile queries
+
+Each class has its own concurrency limit and a short wait queue. All
+classes also share a process-wide limit. When a slot frees up, queued
+requests are admitted in priority order (interactive, then write, then
+bulk), so a batch client paging through ``/profiles?limit=10000`` cannot
+starve practitioners opening a profile.
+
+A request is refused with 503 and Retry-After instead of waiting when any
+of these holds:
+- its class queue is full;
+- the expected wait already exceeds the class deadline, estimated from
+  the queue ahead of it and the class's recent service time;
+- it waited the whole deadline without getting a slot.
+A rejected client gets a fast answer and latency for admitted requests
+stays bounded.
+
+Long-lived streams (/sync/stream), health checks, metrics and CORS
+preflights are never limited. Limits are per worker process.
+
+Configuration (environment):
+    BAZINGSE_ADMISSION=0                  disable admission control
+    BAZINGSE_ADMISSION_TOTAL=24           shared concurrency limit
+    BAZINGSE_ADMISSION_BULK=2,8,10        "max_active,max_queue,max_wait_seconds" per class
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+
+ENABLED = os.environ.get("BAZINGSE_ADMISSION", "1") != "0"
+MAX_TOTAL = int(os.environ.get("BAZINGSE_ADMISSION_TOTAL", "24"))
+
+INTERACTIVE = "interactive"
+WRITE = "write"
+BULK = "bulk"
+
+# name: (priority, max_active, max_queue, max_wait seconds); lower priority value runs first
+DEFAULT_LIMITS = {
+    INTERACTIVE: (0, 16, 64, 2.0),
+    WRITE: (1, 4, 32, 5.0),
+    BULK: (2, 4, 8, 10.0),
+}
+
+# Paths (after the /api prefix) that are listings or otherwise heavy reads
+BULK_PATHS = ("/profiles", "/profiles/duplicates", "/sync", "/analysis_jobs")
+BULK_PREFIXES = ("/admin/", "/luck_pillars/", "/batch/")
+# Never limited: long-lived streams and monitoring
+EXEMPT_PATHS = ("/sync/stream", "/health", "/debug")
+EXEMPT_PREFIXES = ("/metrics/",)
+
+SERVICE_TIME_ALPHA = 0.2     # EWMA weight of the newest request duration
+INITIAL_SERVICE_TIME = 0.05  # Seconds assumed before a class has history
+
+
+class RouteClass:
+    """Limits, live counters and metrics of one class of requests."""
+
+    def __init__(self, name: str, priority: int, max_active: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.priority = priority
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0}
+        self.wait_seconds = 0.0
+        self.service_time = INITIAL_SERVICE_TIME
+
+    def observe(self, duration: float):
+        self.service_time += SERVICE_TIME_ALPHA * (duration - self.service_time)
+
+    def stats(self) -> dict:
+        return {
+            "priority": self.priority,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "active": self.active,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_wait_ms": round(self.wait_seconds / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "service_time_ms": round(self.service_time * 1000, 2),
+        }
+
+
+class _Waiter:
+    __slots__ = ("route_class", "order", "future")
+
+    def __init__(self, route_class: RouteClass, order: int, future: asyncio.Future):
+        self.route_class = route_class
+        self.order = order
+        self.future = future
+
+    def sort_key(self):
+        return self.route_class.priority, self.order
+
+
+class AdmissionController:
+    """Shared concurrency budget handed out to queued requests by priority."""
+
+    def __init__(self, classes: List[RouteClass], max_total: int = MAX_TOTAL):
+        self.classes: Dict[str, RouteClass] = {route_class.name: route_class for route_class in classes}
+        self.max_total = max_total
+        self.active = 0
+        self._waiters: List[_Waiter] = []
+        self._order = 0
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return route_class.active < route_class.max_active and self.active < self.max_total
+
+    def _start(self, route_class: RouteClass):
+        route_class.active += 1
+        route_class.admitted += 1
+        self.active += 1
+
+    def estimated_wait(self, route_class: RouteClass) -> float:
+        """Seconds a new request of this class would likely queue."""
+        ahead = sum(c.queued for c in self.classes.values() if c.priority <= route_class.priority)
+        slots = max(1, min(route_class.max_active, self.max_total))
+        return (ahead + 1) * route_class.service_time / slots
+
+    def _retry_after(self, route_class: RouteClass) -> int:
+        return max(1, math.ceil(self.estimated_wait(route_class)))
+
+    async def acquire(self, route_class: RouteClass) -> Optional[int]:
+        """Take a slot; returns None once admitted or a Retry-After (seconds) when shed."""
+        # Queued requests of other classes are waiting on their own limits, not on this one
+        if not route_class.queued and self._has_room(route_class):
+            self._start(route_class)
+            return None
+
+        if route_class.queued >= route_class.max_queue:
+            route_class.rejected["queue_full"] += 1
+            return self._retry_after(route_class)
+        if self.estimated_wait(route_class) > route_class.max_wait:
+            route_class.rejected["deadline"] += 1
+            return self._retry_after(route_class)
+
+        waiter = _Waiter(route_class, self._order, asyncio.get_running_loop().create_future())
+        self._order += 1
+        self._waiters.append(waiter)
+        route_class.queued += 1
+        route_class.peak_queued = max(route_class.peak_queued, route_class.queued)
+        started = time.monotonic()
+        try:
+            await asyncio.wait({waiter.future}, timeout=route_class.max_wait)
+        except asyncio.CancelledError:
+            # Cancelled right after being admitted: hand the slot on
+            if waiter.future.done():
+                self.release(route_class)
+            raise
+        finally:
+            if not waiter.future.done():
+                # Timed out or cancelled: give up the place in line
+                waiter.future.cancel()
+                self._waiters.remove(waiter)
+                route_class.queued -= 1
+        if waiter.future.cancelled():
+            route_class.rejected["timeout"] += 1
+            return self._retry_after(route_class)
+        route_class.wait_seconds += time.monotonic() - started
+        return None
+
+    def release(self, route_class: RouteClass, duration: Optional[float] = None):
+        """Return a slot and hand freed capacity to the highest-priority waiters."""
+        route_class.active -= 1
+        self.active -= 1
+        if duration is not None:
+            route_class.observe(duration)
+        for waiter in sorted(self._waiters, key=_Waiter.sort_key):
+            if self.active >= self.max_total:
+                break
+            if self._has_room(waiter.route_class):
+                self._waiters.remove(waiter)
+                waiter.route_class.queued -= 1
+                self._start(waiter.route_class)
+                waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ENABLED,
+            "max_total": self.max_total,
+            "active": self.active,
+            "classes": {name: route_class.stats() for name, route_class in self.classes.items()},
+        }
+
+
+def _limits(name: str) -> tuple:
+    priority, max_active, max_queue, max_wait = DEFAULT_LIMITS[name]
+    override = os.environ.get(f"BAZINGSE_ADMISSION_{name.upper()}")
+    if override:
+        active, queue, wait = override.split(",")
+        max_active, max_queue, max_wait = int(active), int(queue), float(wait)
+    return priority, max_active, max_queue, max_wait
+
+
+default_controller = AdmissionController([RouteClass(name, *_limits(name)) for name in DEFAULT_LIMITS])
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class of a request, or None when it is not limited."""
+    if method == "OPTIONS":
+        return None
+    if path.startswith("/api/"):
+        path = path[4:]
+    path = path.rstrip("/") or "/"
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return WRITE
+    if path in BULK_PATHS or path.startswith(BULK_PREFIXES):
+        return BULK
+    return INTERACTIVE
+
+
+def stats() -> dict:
+    """Admission counters and queue depths per route class."""
+    return default_controller.stats()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the module's AdmissionController to HTTP requests."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or default_controller
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope["method"], scope["path"]) if scope["type"] == "http" and ENABLED else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.classes[name]
+        retry_after = await self.controller.acquire(route_class)
+        if retry_after is not None:
+            response = JSONResponse(
+                {"detail": "Server is busy, retry later", "class": name},
+                status_code=503,
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.monotonic() - started)
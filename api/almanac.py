@@ -0,0 +1,209 @@
+"""Precomputed year almanacs: every day and hour pillar plus solar terms.
+
+Calendar views need a whole month or year of pillars at once. Instead of one
+``get_pillars`` call per cell, a year is built in a single pass:
+- the year, month and day pillar of each civil day,
+- its twelve hour pillars,
+- the solar terms that fall on it.
+The result is written to ALMANAC_DIR as a small binary file, about 6 KB
+per year.
+
+Files are built lazily on first request and reused from then on, so serving
+a year after the first build is one file read plus rendering. Bump
+FORMAT_VERSION whenever the layout or the pillar rules change; files of
+other versions are then ignored and rebuilt.
+
+Layout (big-endian):
+    header   magic "BZAL", version u8, year u16, days u16, terms u16
+    days     15 bytes each: year, month, day pillar at 00:00, then the
+             Zi ... Hai hour pillars (Zi starts at 23:00 the evening before)
+    terms    5 bytes each: term ID u8, seconds since Jan 1 00:00 u32
+
+Usage:
+    cd api
+    python almanac.py 2024            # build (or rebuild) one year
+    python almanac.py 1950 2050       # build a range of years
+"""
+
+import argparse
+import json
+import os
+import struct
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import data_dir
+import pillars
+import solar_terms
+
+
+ALMANAC_DIR = os.environ.get("BAZINGSE_ALMANAC_DIR") or data_dir("almanac")
+FORMAT_VERSION = 1
+MIN_YEAR = solar_terms.INDEX_START_YEAR
+MAX_YEAR = solar_terms.INDEX_END_YEAR
+
+MAGIC = b"BZAL"
+_HEADER = struct.Struct(">4sBHHH")
+_DAY_SIZE = 15
+_TERM = struct.Struct(">BI")
+
+# Hour a two-hour block starts at, Zi first
+BLOCK_START_HOURS = (23, 1, 3, 5, 7, 9, 11, 13, 15, 17, 19, 21)
+
+_build_locks: Dict[int, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def check_year(year: int):
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"Year must be between {MIN_YEAR} and {MAX_YEAR}")
+
+
+def almanac_path(year: int) -> str:
+    return os.path.join(ALMANAC_DIR, f"{year}.v{FORMAT_VERSION}.bin")
+
+
+# * =================
+# * BUILD
+# * =================
+
+def build(year: int) -> bytes:
+    """Compute a year's almanac in one pass; returns the encoded file."""
+    check_year(year)
+    start = date(year, 1, 1)
+    day_count = (date(year + 1, 1, 1) - start).days
+
+    days = bytearray()
+    for offset in range(day_count):
+        day = start + timedelta(days=offset)
+        indices = pillars.pillar_indices(datetime(day.year, day.month, day.day), has_time=False)
+        days += bytes((indices["year"], indices["month"], indices["day"]))
+        # hour_index() takes the day's own Zi block at hour 0
+        days += bytes(pillars.hour_index(indices["day"], hour % 23) for hour in BLOCK_START_HOURS)
+
+    midnight = datetime(year, 1, 1)
+    terms = solar_terms.terms_between(midnight, datetime(year + 1, 1, 1))
+    encoded_terms = b"".join(
+        _TERM.pack(term_id, int((moment - midnight).total_seconds())) for term_id, moment in terms
+    )
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, year, day_count, len(terms)) + bytes(days) + encoded_terms
+
+
+def _lock_for(year: int) -> threading.Lock:
+    with _locks_guard:
+        return _build_locks.setdefault(year, threading.Lock())
+
+
+def write(year: int, data: bytes) -> str:
+    """Atomically store an encoded almanac; returns its path."""
+    os.makedirs(ALMANAC_DIR, exist_ok=True)
+    path = almanac_path(year)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=ALMANAC_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def load(year: int) -> bytes:
+    """A year's encoded almanac, building and storing it on first use."""
+    check_year(year)
+    path = almanac_path(year)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    # One build per year at a time; others wait and then read the file
+    with _lock_for(year):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        data = build(year)
+        write(year, data)
+        return data
+
+
+# * =================
+# * DECODE AND RENDER
+# * =================
+
+def decode(data: bytes) -> Tuple[int, List[bytes], List[Tuple[int, datetime]]]:
+    """Split an encoded almanac into (year, 15-byte day records, [(term_id, datetime)])."""
+    magic, version, year, day_count, term_count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not an almanac file of the current format")
+    offset = _HEADER.size
+    days = [data[offset + i * _DAY_SIZE: offset + (i + 1) * _DAY_SIZE] for i in range(day_count)]
+    offset += day_count * _DAY_SIZE
+    midnight = datetime(year, 1, 1)
+    terms = [
+        (term_id, midnight + timedelta(seconds=seconds))
+        for term_id, seconds in (_TERM.unpack_from(data, offset + i * _TERM.size) for i in range(term_count))
+    ]
+    return year, days, terms
+
+
+def _render_day(day: date, record: bytes, terms: List[Tuple[int, datetime]]) -> dict:
+    names = pillars.SIXTY_PILLARS
+    return {
+        "date": day.isoformat(),
+        "year": names[record[0]],
+        "month": names[record[1]],
+        "day": names[record[2]],
+        "hours": [names[index] for index in record[3:]],
+        "terms": [
+            {
+                "term_id": term_id,
+                "name": solar_terms.SOLAR_TERMS[term_id][0],
+                "chinese": solar_terms.SOLAR_TERMS[term_id][1],
+                "is_jie": term_id % 2 == 1,
+                "datetime": moment.isoformat(),
+            }
+            for term_id, moment in terms
+        ],
+    }
+
+
+def iter_days(data: bytes, month: Optional[int] = None) -> Iterator[dict]:
+    """Rendered days of an almanac, optionally only one month."""
+    year, days, terms = decode(data)
+    by_day: Dict[date, list] = {}
+    for term_id, moment in terms:
+        by_day.setdefault(moment.date(), []).append((term_id, moment))
+    start = date(year, 1, 1)
+    for offset, record in enumerate(days):
+        day = start + timedelta(days=offset)
+        if month is None or day.month == month:
+            yield _render_day(day, record, by_day.get(day, []))
+
+
+def iter_json(data: bytes, month: Optional[int] = None) -> Iterator[bytes]:
+    """Stream a calendar as one JSON document, one day per chunk."""
+    year = _HEADER.unpack_from(data)[2]
+    hour_blocks = [f"{hour:02d}:00" for hour in BLOCK_START_HOURS]
+    yield f'{{"year": {year}, "month": {json.dumps(month)}, "hour_blocks": {json.dumps(hour_blocks)}, "days": ['.encode()
+    for i, day in enumerate(iter_days(data, month)):
+        yield (b"," if i else b"") + json.dumps(day, ensure_ascii=False).encode("utf-8")
+    yield b"]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build year almanac files.")
+    parser.add_argument("first", type=int, help="First year")
+    parser.add_argument("last", type=int, nargs="?", help="Last year (default: first)")
+    args = parser.parse_args()
+
+    for year in range(args.first, (args.last or args.first) + 1):
+        path = write(year, build(year))
+        print(f"{year}: {path} ({os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
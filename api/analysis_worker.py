@@ -0,0 +1,337 @@
+"""Background analysis of life events.
+
+The CRUD layer only enqueues an AnalysisJob row inside its own write
+transaction, so creating or editing an event stays fast. Worker threads then
+claim jobs from the analysis_jobs table, mirror the event into the normalized
+life_events table, compute the chart state at the event date and store it in
+``LifeEvent.analysis_snapshot`` together with ``auto_detected_patterns`` and
+EventPatternLink rows.
+
+Processing always reads the event's current state, so running a job twice is
+harmless: auto-detected links are replaced, user-reviewed links are kept.
+Failures are retried with exponential backoff up to ``max_attempts``.
+
+Workers always drain the default database. A tenant shard is drained once
+a job has been enqueued there (or at startup, for every shard on disk) and
+until it has no unfinished jobs left.
+
+Usage:
+    cd api
+    python analysis_worker.py          # run workers until interrupted
+    python analysis_worker.py --once   # drain the queue and exit
+"""
+
+import argparse
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from chart_cache import get_chart
+from database import DEFAULT_TENANT, SessionLocal, get_sessionmaker, list_tenants, tenant_of
+from models import AnalysisJob, AnalysisJobStatus, EventPatternLink, LifeEvent, Profile, ValidationStatus
+from patterns import detect_branch_patterns, ensure_patterns
+import pillars
+
+
+DEFAULT_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+POLL_INTERVAL_SECONDS = 1.0
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 5
+
+_stop = threading.Event()
+_threads: List[threading.Thread] = []
+
+# Tenant shards that may have runnable jobs
+_active_tenants: Set[str] = set()
+_active_lock = threading.Lock()
+
+
+# * =================
+# * QUEUE
+# * =================
+
+def enqueue(db: Session, profile_id: str, event_id: str) -> AnalysisJob:
+    """
+    Queue analysis of one event without committing.
+
+    A job that is still waiting for this event is reused: it will read the
+    event's latest state when it runs.
+    """
+    pending = db.query(AnalysisJob).filter(
+        AnalysisJob.event_id == event_id,
+        AnalysisJob.status == AnalysisJobStatus.PENDING,
+    ).first()
+    if pending:
+        return pending
+
+    job = AnalysisJob(profile_id=profile_id, event_id=event_id, available_at=datetime.utcnow())
+    db.add(job)
+    tenant = tenant_of(db)
+    if tenant != DEFAULT_TENANT:
+        with _active_lock:
+            _active_tenants.add(tenant)
+    return job
+
+
+def claim_next(db: Session) -> Optional[AnalysisJob]:
+    """
+    Claim the oldest runnable job, or return None if there is none.
+
+    Pending jobs past their backoff and running jobs past their lease are
+    both runnable. The claim is a conditional UPDATE, so two workers racing
+    for the same row cannot both win.
+    """
+    while True:
+        now = datetime.utcnow()
+        runnable = (
+            AnalysisJob.status.in_([AnalysisJobStatus.PENDING, AnalysisJobStatus.RUNNING]),
+            AnalysisJob.available_at <= now,
+        )
+        candidate = db.query(AnalysisJob.id).filter(*runnable).order_by(AnalysisJob.available_at).first()
+        if not candidate:
+            db.commit()
+            return None
+
+        claimed = db.query(AnalysisJob).filter(AnalysisJob.id == candidate.id, *runnable).update(
+            {
+                AnalysisJob.status: AnalysisJobStatus.RUNNING,
+                AnalysisJob.attempts: AnalysisJob.attempts + 1,
+                AnalysisJob.available_at: now + timedelta(seconds=LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        if claimed == 1:
+            return db.query(AnalysisJob).filter(AnalysisJob.id == candidate.id).first()
+        # Another worker won the race; try the next candidate
+
+
+# * =================
+# * ANALYSIS
+# * =================
+
+def event_transit(event: dict) -> Tuple[str, pillars.Chart]:
+    """
+    Pillars in force at the event date, limited to the known precision.
+
+    Returns (precision, chart) where precision is "year", "month" or "day".
+    Year-only and month-only events are evaluated mid-period so the result
+    does not depend on where the Lichun or Jie boundary falls.
+    """
+    year, month, day = event["year"], event.get("month"), event.get("day")
+    if month and day:
+        return "day", pillars.compute_chart(year, month, day)
+    if month:
+        transit = pillars.compute_chart(year, month, 20)
+        return "month", pillars.Chart(year=transit.year, month=transit.month)
+    transit = pillars.compute_chart(year, 7, 1)
+    return "year", pillars.Chart(year=transit.year)
+
+
+def render_snapshot(snapshot: Optional[dict]) -> Optional[dict]:
+    """Snapshot with packed chart codes rendered as pillar strings for the API."""
+    if not snapshot:
+        return snapshot
+    return {
+        **snapshot,
+        "natal": pillars.to_chart(snapshot["natal"]).to_strings(),
+        "transit": pillars.to_chart(snapshot["transit"]).to_strings(),
+    }
+
+
+def _find_event(profile: Optional[Profile], event_id: str) -> Optional[dict]:
+    if not profile or not profile.life_events:
+        return None
+    for event in profile.life_events:
+        if event.get("id") == event_id:
+            return event
+    return None
+
+
+def analyze_event(db: Session, job: AnalysisJob):
+    """Mirror one event into life_events and store its snapshot and pattern links."""
+    profile = db.query(Profile).filter(Profile.id == job.profile_id).first()
+    event = _find_event(profile, job.event_id)
+    row = db.query(LifeEvent).filter(LifeEvent.id == job.event_id).first()
+
+    if event is None:
+        # Event (or its profile) was deleted: drop the mirror and its links
+        if row:
+            db.delete(row)
+        return
+
+    natal = get_chart(db, profile.birth_date, profile.birth_time, profile.gender, profile.chart_fingerprint)
+    precision, transit = event_transit(event)
+    detected = detect_branch_patterns(natal, transit)
+
+    if row is None:
+        row = LifeEvent(id=job.event_id, profile_id=profile.id, life_domain="general", event_type="unclassified")
+        db.add(row)
+    row.event_date = f"{event['year']:04d}-{event.get('month') or 1:02d}-{event.get('day') or 1:02d}"
+    row.event_title = event.get("location")
+    row.event_description = event.get("notes")
+    row.analysis_snapshot = {
+        "precision": precision,
+        "natal": natal.code,  # Packed pillars.Chart; see render_snapshot
+        "transit": transit.code,
+        "analyzed_at": datetime.utcnow().isoformat(),
+    }
+    row.auto_detected_patterns = detected
+
+    # Replace auto-detected links; keep the ones a user already reviewed
+    reviewed = set()
+    for link in list(row.pattern_links):
+        if link.validation_status in (None, ValidationStatus.PENDING):
+            row.pattern_links.remove(link)
+        else:
+            reviewed.add(link.pattern_id)
+
+    ensure_patterns(db)
+    by_pattern = {}
+    for match in detected:
+        by_pattern.setdefault(match["pattern_id"], []).append(match)
+    for pattern_id, matches in by_pattern.items():
+        if pattern_id in reviewed:
+            continue
+        row.pattern_links.append(EventPatternLink(
+            pattern_id=pattern_id,
+            contribution_weight=float(len(matches)),
+            distance=min(match["distance"] for match in matches),
+        ))
+
+
+def process_job(db: Session, job: AnalysisJob):
+    """Run one claimed job and record its outcome."""
+    job_id = job.id
+    if job.attempts > job.max_attempts:
+        # Lease expired on the final attempt: the worker died mid-job
+        job.status = AnalysisJobStatus.FAILED
+        job.last_error = job.last_error or "Lease expired"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return
+
+    try:
+        analyze_event(db, job)
+        job.status = AnalysisJobStatus.DONE
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        job.last_error = f"{type(e).__name__}: {e}"
+        # Invalid dates will not fix themselves on retry
+        if isinstance(e, ValueError) or job.attempts >= job.max_attempts:
+            job.status = AnalysisJobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = AnalysisJobStatus.PENDING
+            job.available_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        db.commit()
+
+
+def has_unfinished(db: Session) -> bool:
+    """Whether any job is still pending (possibly backing off) or running."""
+    return db.query(AnalysisJob.id).filter(
+        AnalysisJob.status.in_([AnalysisJobStatus.PENDING, AnalysisJobStatus.RUNNING])
+    ).first() is not None
+
+
+def run_pending(limit: Optional[int] = None, session_factory=SessionLocal) -> int:
+    """Process runnable jobs in the calling thread until none are left."""
+    processed = 0
+    db = session_factory()
+    try:
+        while limit is None or processed < limit:
+            job = claim_next(db)
+            if job is None:
+                break
+            process_job(db, job)
+            processed += 1
+    finally:
+        db.close()
+    return processed
+
+
+# * =================
+# * WORKER POOL
+# * =================
+
+def _drain_tenants(limit: int) -> int:
+    """Run jobs on every active tenant shard; retire shards with nothing left."""
+    processed = 0
+    with _active_lock:
+        tenants = sorted(_active_tenants)
+    for tenant in tenants:
+        factory = get_sessionmaker(tenant)
+        processed += run_pending(limit, factory)
+        db = factory()
+        try:
+            idle = not has_unfinished(db)
+        finally:
+            db.close()
+        if idle:
+            with _active_lock:
+                _active_tenants.discard(tenant)
+    return processed
+
+
+def _worker_loop():
+    while not _stop.is_set():
+        try:
+            if run_pending(limit=100) + _drain_tenants(limit=100) == 0:
+                _stop.wait(POLL_INTERVAL_SECONDS)
+        except Exception as e:
+            print(f"Analysis worker error: {type(e).__name__}: {e}")
+            _stop.wait(POLL_INTERVAL_SECONDS)
+
+
+def start_workers(count: int = DEFAULT_WORKERS):
+    """Start ``count`` daemon worker threads (no-op if already running)."""
+    if _threads or count <= 0:
+        return
+    _stop.clear()
+    # Jobs left over from a previous run may sit in any shard
+    with _active_lock:
+        _active_tenants.update(t for t in list_tenants() if t != DEFAULT_TENANT)
+    for i in range(count):
+        thread = threading.Thread(target=_worker_loop, name=f"analysis-worker-{i}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_workers(timeout: float = 5.0):
+    """Signal worker threads to stop and wait for them."""
+    _stop.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background life-event analysis workers.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker threads")
+    parser.add_argument("--once", action="store_true", help="Drain the queue and exit")
+    args = parser.parse_args()
+
+    from database import init_db
+    init_db()
+
+    if args.once:
+        print(f"Processed {run_pending()} analysis jobs")
+        return
+
+    start_workers(args.workers)
+    print(f"Running {args.workers} analysis workers (Ctrl+C to stop)")
+    try:
+        _stop.wait()
+    except KeyboardInterrupt:
+        stop_workers()
+
+
+if __name__ == "__main__":
+    main()
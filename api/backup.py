@@ -0,0 +1,311 @@
+"""Online backups through SQLite's incremental backup API.
+
+A snapshot copies the live database a few hundred pages at a time. Between
+steps the source is unlocked and the copier sleeps briefly, so requests keep
+reading and writing while a backup runs. A write from another connection
+makes SQLite restart the copy; after a few restarts the rest is copied in
+one step, which holds a read lock only for the length of a file copy.
+
+Snapshots are checked with ``PRAGMA quick_check``, gzipped into
+BACKUP_DIR/<tenant>/ and pruned to the newest BACKUP_KEEP per tenant.
+Restoring copies a snapshot back over the live database through the same
+API, after taking a safety snapshot of the current state. Change-log
+sequence numbers keep increasing across a restore (see ``sync.rebase``), so
+delta-sync clients pick up the restored state with the tokens they hold.
+
+The /api/admin/backups endpoints require the X-Admin-Token header to match
+BAZINGSE_ADMIN_TOKEN and are not served at all while it is unset; the CLI
+below works without it.
+
+Usage:
+    cd api
+    python backup.py create [--tenant T]      # snapshot one tenant (default database)
+    python backup.py create --all             # snapshot every tenant shard
+    python backup.py list [--tenant T]
+    python backup.py restore FILE [--tenant T]
+    python backup.py prune [--keep N]
+"""
+
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from database import DEFAULT_TENANT, data_dir, get_engine, init_db, list_tenants, tenant_path
+import sync
+
+
+BACKUP_DIR = os.environ.get("BAZINGSE_BACKUP_DIR") or data_dir("backups", keep_legacy=True)
+BACKUP_KEEP = int(os.environ.get("BAZINGSE_BACKUP_KEEP", "7"))
+# Scheduled snapshots of every tenant; 0 disables the scheduler
+BACKUP_INTERVAL_HOURS = float(os.environ.get("BAZINGSE_BACKUP_INTERVAL_HOURS", "0"))
+
+STEP_PAGES = 256      # Pages copied per step while the source is read-locked
+STEP_PAUSE = 0.005    # Seconds yielded to other connections between steps
+MAX_RESTARTS = 3      # Copy restarts (concurrent writes) before finishing in one step
+COPY_BUFFER = 1024 * 1024
+
+_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*-\d{8}-\d{6}-\d{6}\.db\.gz$")
+
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()  # One backup or restore at a time per process
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection):
+    """Incremental copy that yields between steps, falling back to one step."""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        last_remaining = remaining
+        time.sleep(STEP_PAUSE)
+
+    try:
+        source.backup(target, pages=STEP_PAGES, progress=progress)
+    except _Restarted:
+        source.backup(target)
+
+
+def tenant_dir(tenant: str) -> str:
+    return os.path.join(BACKUP_DIR, tenant)
+
+
+def _describe(tenant: str, path: str) -> dict:
+    stat = os.stat(path)
+    return {
+        "name": os.path.basename(path),
+        "tenant": tenant,
+        "size_bytes": stat.st_size,
+        "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+    }
+
+
+def valid_name(name: str) -> bool:
+    return bool(_NAME.match(name))
+
+
+def backup_path(tenant: str, name: str) -> str:
+    """Path of a stored snapshot; raises ValueError for names outside the backup dir."""
+    if not valid_name(name):
+        raise ValueError(f"Invalid backup name: {name!r}")
+    return os.path.join(tenant_dir(tenant), name)
+
+
+# * =================
+# * SNAPSHOTS
+# * =================
+
+def create(tenant: str = DEFAULT_TENANT, keep: Optional[int] = BACKUP_KEEP) -> dict:
+    """Snapshot a tenant's database into a gzipped file; returns its description."""
+    directory = tenant_dir(tenant)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{tenant}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.db.gz"
+    path = os.path.join(directory, name)
+
+    # Make sure the shard exists and is migrated before reading it directly
+    get_engine(tenant)
+    with _lock:
+        fd, raw = tempfile.mkstemp(suffix=".db", dir=directory)
+        os.close(fd)
+        try:
+            source = sqlite3.connect(tenant_path(tenant), check_same_thread=False)
+            target = sqlite3.connect(raw)
+            try:
+                _copy(source, target)
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+                if check != "ok":
+                    raise RuntimeError(f"Snapshot failed integrity check: {check}")
+            finally:
+                target.close()
+                source.close()
+
+            with open(raw, "rb") as src, gzip.open(path + ".tmp", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER)
+            os.replace(path + ".tmp", path)
+        finally:
+            for leftover in (raw, path + ".tmp"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    if keep:
+        prune(tenant, keep)
+    return _describe(tenant, path)
+
+
+def list_backups(tenant: str = DEFAULT_TENANT) -> List[dict]:
+    """Stored snapshots of a tenant, newest first."""
+    directory = tenant_dir(tenant)
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if valid_name(name)), reverse=True)
+    return [_describe(tenant, os.path.join(directory, name)) for name in names]
+
+
+def prune(tenant: str = DEFAULT_TENANT, keep: int = BACKUP_KEEP) -> List[str]:
+    """Delete all but the newest ``keep`` snapshots; returns the deleted names."""
+    removed = [backup["name"] for backup in list_backups(tenant)[keep:]]
+    for name in removed:
+        os.remove(backup_path(tenant, name))
+    return removed
+
+
+# * =================
+# * RESTORE
+# * =================
+
+def restore(path: str, tenant: str = DEFAULT_TENANT) -> dict:
+    """
+    Replace a tenant's database with a snapshot (gzipped or plain SQLite).
+
+    The snapshot is verified before anything is touched, and the current
+    state is saved first as an ordinary snapshot. Writers wait on SQLite's
+    lock only while the pages are copied in.
+    """
+    directory = tenant_dir(tenant)
+    os.makedirs(directory, exist_ok=True)
+    fd, raw = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    try:
+        with open(path, "rb") as probe:
+            compressed = probe.read(2) == b"\x1f\x8b"
+        with (gzip.open(path, "rb") if compressed else open(path, "rb")) as src, open(raw, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+
+        snapshot = sqlite3.connect(raw)
+        try:
+            try:
+                check = snapshot.execute("PRAGMA quick_check").fetchone()[0]
+            except sqlite3.DatabaseError as e:
+                check = f"not a SQLite database ({e})"
+            if check != "ok":
+                raise ValueError(f"Snapshot failed integrity check: {check}")
+
+            safety = create(tenant, keep=None)
+            engine = get_engine(tenant)
+            with engine.connect() as conn:
+                floor_seq = sync.high_water(conn)
+                previous = sync.entities(conn)
+
+            with _lock:
+                live = sqlite3.connect(tenant_path(tenant), check_same_thread=False)
+                try:
+                    snapshot.backup(live)
+                finally:
+                    live.close()
+        finally:
+            snapshot.close()
+
+        # Drop pooled connections, then bring the restored file up to date
+        engine.dispose()
+        init_db(engine)
+        with engine.begin() as conn:
+            announced = sync.rebase(conn, floor_seq, previous)
+    finally:
+        if os.path.exists(raw):
+            os.remove(raw)
+
+    return {"tenant": tenant, "restored_from": os.path.basename(path),
+            "safety_backup": safety["name"], "changes_announced": announced}
+
+
+# * =================
+# * SCHEDULER
+# * =================
+
+def run_scheduled(keep: int = BACKUP_KEEP) -> List[dict]:
+    """Snapshot every tenant once; a failing tenant does not stop the rest."""
+    results = []
+    for tenant in list_tenants():
+        try:
+            results.append(create(tenant, keep))
+        except Exception as e:
+            print(f"Backup of {tenant} failed: {type(e).__name__}: {e}")
+    return results
+
+
+def _scheduler_loop(interval: float):
+    while not _stop.wait(interval):
+        run_scheduled()
+
+
+def start_scheduler(interval_hours: float = BACKUP_INTERVAL_HOURS):
+    """Start periodic snapshots in a daemon thread (no-op if disabled or running)."""
+    global _thread
+    if _thread or interval_hours <= 0:
+        return
+    _stop.clear()
+    _thread = threading.Thread(
+        target=_scheduler_loop, args=(interval_hours * 3600,), name="backup-scheduler", daemon=True
+    )
+    _thread.start()
+
+
+def stop_scheduler(timeout: float = 5.0):
+    global _thread
+    _stop.set()
+    if _thread:
+        _thread.join(timeout)
+        _thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online SQLite backups.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create_cmd = commands.add_parser("create", help="Take a snapshot")
+    create_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+    create_cmd.add_argument("--all", action="store_true", help="Snapshot every tenant shard")
+    create_cmd.add_argument("--keep", type=int, default=BACKUP_KEEP, help="Snapshots kept per tenant")
+
+    list_cmd = commands.add_parser("list", help="List stored snapshots")
+    list_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+
+    restore_cmd = commands.add_parser("restore", help="Restore a snapshot file")
+    restore_cmd.add_argument("file")
+    restore_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+
+    prune_cmd = commands.add_parser("prune", help="Apply retention to every tenant")
+    prune_cmd.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    args = parser.parse_args()
+
+    init_db()
+
+    if args.command == "create":
+        if args.all:
+            results = run_scheduled(args.keep)
+        else:
+            results = [create(args.tenant, args.keep)]
+        for backup in results:
+            print(f"{backup['tenant']}: {backup['name']} ({backup['size_bytes']:,} bytes)")
+    elif args.command == "list":
+        for backup in list_backups(args.tenant):
+            print(f"{backup['name']}  {backup['size_bytes']:>12,}  {backup['created_at']}")
+    elif args.command == "restore":
+        result = restore(args.file, args.tenant)
+        print(f"Restored {result['tenant']} from {result['restored_from']} "
+              f"(previous state saved as {result['safety_backup']})")
+    else:
+        for tenant in list_tenants():
+            for name in prune(tenant, args.keep):
+                print(f"Deleted {tenant}/{name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Batch chart recomputation for all stored profiles.
+
+Profiles are streamed from the database in primary-key order, split into
+chunks and fanned out over a ProcessPoolExecutor. Results are written back
+in submission order with one bulk upsert per chunk, in the same transaction
+that advances the job cursor, so an interrupted job resumes exactly where
+its last committed chunk ended.
+
+A runner claims its job with a conditional update, so a job runs in at most
+one place at a time. Every committed chunk renews the claim; a RUNNING job
+whose claim is older than LEASE belongs to a runner that died, and the next
+resume takes it over. The API starts at most one job per tenant at a time,
+and no job uses more than MAX_WORKERS (one per CPU) processes.
+
+Usage:
+    cd api
+    python batch.py                  # start a new job
+    python batch.py --resume JOB_ID  # continue an interrupted job
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+import crud
+from database import DEFAULT_TENANT, get_sessionmaker
+from models import BatchJob, BatchJobStatus, Profile, ProfileChart
+import pillars
+import solar_terms
+
+
+DEFAULT_CHUNK_SIZE = 500
+LEASE = timedelta(minutes=10)  # Longer than any single chunk takes to compute and write
+MAX_WORKERS = os.cpu_count() or 1
+
+# (profile_id, birth_date, birth_time, chart_fingerprint)
+ProfileRow = Tuple[str, str, Optional[str], Optional[str]]
+# (profile_id, packed pillars.Chart code, error); codes keep worker results small to pickle
+ChartRow = Tuple[str, Optional[int], Optional[str]]
+
+
+def compute_chunk(rows: List[ProfileRow]) -> List[ChartRow]:
+    """Worker entry point: compute one chunk, once per distinct chart fingerprint."""
+    results = []
+    computed = {}
+    for profile_id, birth_date, birth_time, fingerprint in rows:
+        key = fingerprint or (birth_date, birth_time)
+        if key not in computed:
+            try:
+                computed[key] = (pillars.chart_for(birth_date, birth_time).code, None)
+            except ValueError as e:
+                computed[key] = (None, str(e))
+        results.append((profile_id, *computed[key]))
+    return results
+
+
+def _init_worker():
+    """Build the solar-term index once per worker process."""
+    solar_terms.get_index()
+
+
+def iter_profile_chunks(db: Session, after: Optional[str], chunk_size: int) -> Iterator[List[ProfileRow]]:
+    """Stream profile birth data in ID order using keyset pagination."""
+    cursor = after
+    while True:
+        query = db.query(Profile.id, Profile.birth_date, Profile.birth_time, Profile.chart_fingerprint)
+        if cursor is not None:
+            query = query.filter(Profile.id > cursor)
+        rows = [tuple(row) for row in query.order_by(Profile.id).limit(chunk_size)]
+        if not rows:
+            return
+        yield rows
+        cursor = rows[-1][0]
+
+
+def write_chunk(db: Session, job: BatchJob, results: List[ChartRow]):
+    """Upsert one chunk of results and advance the job cursor in one commit."""
+    stmt = insert(ProfileChart)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProfileChart.profile_id],
+        set_={
+            "pillars": stmt.excluded.pillars,
+            "error": stmt.excluded.error,
+            "job_id": stmt.excluded.job_id,
+            "computed_at": func.now(),
+        },
+    )
+    db.execute(stmt, [
+        {
+            "profile_id": profile_id,
+            "pillars": pillars.Chart.from_code(code).to_strings() if code is not None else None,
+            "error": error,
+            "job_id": job.id,
+        }
+        for profile_id, code, error in results
+    ])
+    job.processed += len(results)
+    job.failed += sum(1 for _, code, _ in results if code is None)
+    job.cursor = results[-1][0]
+    db.commit()
+
+
+def create_job(db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None) -> BatchJob:
+    """Register a new pending batch job (at most MAX_WORKERS worker processes)."""
+    job = BatchJob(
+        chunk_size=chunk_size,
+        workers=min(workers, MAX_WORKERS) if workers else None,
+        total_profiles=db.query(Profile).count(),
+    )
+    db.add(job)
+    crud.commit(db)
+    db.refresh(job)
+    return job
+
+
+class JobRunning(Exception):
+    """The job is already being run by another runner."""
+
+
+def is_running(job: BatchJob) -> bool:
+    """Whether a live runner holds the job (a RUNNING job past LEASE was abandoned)."""
+    return (
+        job.status == BatchJobStatus.RUNNING
+        and job.updated_at is not None
+        and job.updated_at >= datetime.utcnow() - LEASE
+    )
+
+
+def active_job(db: Session, exclude: Optional[str] = None) -> Optional[BatchJob]:
+    """A job that is running, or was just created and is about to start (one at a time per tenant)."""
+    cutoff = datetime.utcnow() - LEASE
+    query = db.query(BatchJob).filter(or_(
+        (BatchJob.status == BatchJobStatus.RUNNING) & (BatchJob.updated_at >= cutoff),
+        (BatchJob.status == BatchJobStatus.PENDING) & (BatchJob.created_at >= cutoff),
+    ))
+    if exclude:
+        query = query.filter(BatchJob.id != exclude)
+    return query.first()
+
+
+def claim(db: Session, job_id: str) -> bool:
+    """Mark a pending, failed or abandoned job RUNNING; True if this caller got it."""
+    now = datetime.utcnow()
+    claimed = db.query(BatchJob).filter(
+        BatchJob.id == job_id,
+        or_(
+            BatchJob.status.in_([BatchJobStatus.PENDING, BatchJobStatus.FAILED]),
+            (BatchJob.status == BatchJobStatus.RUNNING) & (BatchJob.updated_at < now - LEASE),
+        ),
+    ).update(
+        {BatchJob.status: BatchJobStatus.RUNNING, BatchJob.error: None, BatchJob.updated_at: now},
+        synchronize_session=False,
+    )
+    db.commit()
+    return claimed == 1
+
+
+def run_job(
+    job_id: str,
+    progress: Optional[Callable[[BatchJob], None]] = None,
+    tenant: str = DEFAULT_TENANT,
+) -> Optional[dict]:
+    """
+    Run (or resume) a batch job to completion.
+
+    Keeps at most two chunks per worker in flight so memory stays bounded no
+    matter how many profiles are stored. Returns the final job state, or None
+    if the job does not exist. Raises JobRunning if another runner holds it.
+    """
+    db = get_sessionmaker(tenant)()
+    try:
+        job = db.query(BatchJob).filter(BatchJob.id == job_id).first()
+        if not job:
+            return None
+        if job.status == BatchJobStatus.COMPLETED:
+            return job.to_dict()
+        if not claim(db, job_id):
+            db.refresh(job)
+            if job.status == BatchJobStatus.COMPLETED:
+                return job.to_dict()
+            raise JobRunning(f"Batch job {job_id} is already running")
+        db.refresh(job)
+
+        # Warm the index before forking so workers inherit it
+        solar_terms.get_index()
+        workers = min(job.workers or MAX_WORKERS, MAX_WORKERS)
+        started = time.monotonic()
+        elapsed_before = job.elapsed_seconds or 0.0
+
+        def flush(future):
+            write_chunk(db, job, future.result())
+            job.elapsed_seconds = elapsed_before + time.monotonic() - started
+            if progress:
+                progress(job)
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                in_flight = deque()
+                for rows in iter_profile_chunks(db, job.cursor, job.chunk_size):
+                    in_flight.append(pool.submit(compute_chunk, rows))
+                    if len(in_flight) >= workers * 2:
+                        flush(in_flight.popleft())
+                while in_flight:
+                    flush(in_flight.popleft())
+        except Exception as e:
+            db.rollback()
+            job.status = BatchJobStatus.FAILED
+            job.error = f"{type(e).__name__}: {e}"
+            job.elapsed_seconds = elapsed_before + time.monotonic() - started
+            db.commit()
+            raise
+
+        job.status = BatchJobStatus.COMPLETED
+        job.elapsed_seconds = elapsed_before + time.monotonic() - started
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return job.to_dict()
+    finally:
+        db.close()
+
+
+def _print_progress(job: BatchJob):
+    rate = job.processed / job.elapsed_seconds if job.elapsed_seconds else 0.0
+    print(f"  {job.processed:,}/{job.total_profiles:,} profiles ({job.failed:,} failed) - {rate:,.0f}/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute charts for all stored profiles.")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Resume an interrupted job")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Profiles per work unit")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant shard (default database if omitted)")
+    args = parser.parse_args()
+
+    from database import init_db
+    init_db()
+
+    job_id = args.resume
+    if not job_id:
+        db = get_sessionmaker(args.tenant)()
+        try:
+            job_id = create_job(db, chunk_size=args.chunk_size, workers=args.workers).id
+        finally:
+            db.close()
+    print(f"Batch job {job_id}")
+
+    try:
+        result = run_job(job_id, progress=_print_progress, tenant=args.tenant)
+    except JobRunning as e:
+        raise SystemExit(str(e))
+    if result is None:
+        raise SystemExit(f"Batch job {job_id} not found")
+    print(f"Done: {result['processed']:,} profiles in {result['elapsed_seconds']:.1f}s "
+          f"({result['profiles_per_second'] or 0:,} profiles/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Multi-operation requests applied in one transaction.
+
+``POST /api/batch`` takes an ordered list of profile and life-event
+operations, e.g. create a profile and then add its first events. They run
+in one session and one transaction (crud.transaction). Either every
+operation is applied with a single commit, or none is.
+
+An operation can name what it creates with ``ref`` and later operations
+can use ``"$<ref>"`` wherever a profile_id or event_id is expected.
+"""
+
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+import crud
+from schemas import (
+    BatchAddLifeEvent, BatchCreateProfile, BatchDeleteLifeEvent, BatchDeleteProfile,
+    BatchUpdateLifeEvent, BatchUpdateProfile,
+)
+
+
+class BatchOperationError(Exception):
+    """One operation failed; the whole batch was rolled back."""
+
+    def __init__(self, index: int, op: str, status_code: int, detail,
+                 conflict_profile_id: Optional[str] = None):
+        super().__init__(f"Operation {index} ({op}) failed: {detail}")
+        self.index = index
+        self.op = op
+        self.status_code = status_code
+        self.detail = detail
+        self.conflict_profile_id = conflict_profile_id
+
+    def to_dict(self) -> dict:
+        return {
+            "message": "Batch rolled back; no operation was applied",
+            "failed_index": self.index,
+            "op": self.op,
+            "error": self.detail,
+        }
+
+
+class _Failed(Exception):
+    def __init__(self, status_code: int, detail):
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _resolve(value: str, refs: Dict[str, str]) -> str:
+    if not value.startswith("$"):
+        return value
+    if value[1:] not in refs:
+        raise _Failed(422, f"Unknown reference: {value}")
+    return refs[value[1:]]
+
+
+def _remember(ref: Optional[str], created_id: str, refs: Dict[str, str]):
+    if ref is None:
+        return
+    if ref in refs:
+        raise _Failed(422, f"Duplicate reference: {ref}")
+    refs[ref] = created_id
+
+
+def _apply(db: Session, operation, refs: Dict[str, str]) -> dict:
+    """Run one operation and describe its outcome."""
+    if isinstance(operation, BatchCreateProfile):
+        profile = crud.create_profile(db, operation.data)
+        _remember(operation.ref, profile.id, refs)
+        return {"status": 201, "id": profile.id, "profile_id": profile.id, "data": profile.to_dict()}
+
+    profile_id = _resolve(operation.profile_id, refs)
+
+    if isinstance(operation, BatchUpdateProfile):
+        profile = crud.update_profile(db, profile_id, operation.data, operation.version)
+        if not profile:
+            raise _Failed(404, "Profile not found")
+        return {"status": 200, "id": profile_id, "profile_id": profile_id, "data": profile.to_dict()}
+
+    if isinstance(operation, BatchDeleteProfile):
+        if not crud.delete_profile(db, profile_id, operation.version):
+            raise _Failed(404, "Profile not found")
+        return {"status": 204, "id": profile_id, "profile_id": profile_id, "data": None}
+
+    if isinstance(operation, BatchAddLifeEvent):
+        event = crud.add_life_event(db, profile_id, operation.data, operation.version)
+        if not event:
+            raise _Failed(404, "Profile not found")
+        _remember(operation.ref, event["id"], refs)
+        return {"status": 201, "id": event["id"], "profile_id": profile_id, "data": event}
+
+    event_id = _resolve(operation.event_id, refs)
+
+    if isinstance(operation, BatchUpdateLifeEvent):
+        event = crud.update_life_event(db, profile_id, event_id, operation.data, operation.version)
+        if not event:
+            raise _Failed(404, "Life event not found")
+        return {"status": 200, "id": event_id, "profile_id": profile_id, "data": event}
+
+    if isinstance(operation, BatchDeleteLifeEvent):
+        if not crud.delete_life_event(db, profile_id, event_id, operation.version):
+            raise _Failed(404, "Life event not found")
+        return {"status": 204, "id": event_id, "profile_id": profile_id, "data": None}
+
+    raise _Failed(422, f"Unsupported operation: {operation.op}")
+
+
+def run(db: Session, operations: List) -> List[dict]:
+    """
+    Apply ``operations`` in order as one transaction; returns per-op results.
+
+    Raises BatchOperationError for the first operation that fails, after
+    everything has been rolled back.
+    """
+    refs: Dict[str, str] = {}
+    results = []
+    try:
+        with crud.transaction(db):
+            for index, operation in enumerate(operations):
+                try:
+                    result = _apply(db, operation, refs)
+                except _Failed as e:
+                    raise BatchOperationError(index, operation.op, e.status_code, e.detail)
+                except crud.VersionConflict as e:
+                    raise BatchOperationError(
+                        index, operation.op, 409, {"message": str(e)},
+                        e.profile.id if e.profile else None,
+                    )
+                ref = getattr(operation, "ref", None)
+                results.append({"index": index, "op": operation.op, **({"ref": ref} if ref else {}), **result})
+    except BatchOperationError as e:
+        if e.conflict_profile_id:
+            # Report the committed state, not the rolled-back batch's view of it
+            profile = crud.get_profile(db, e.conflict_profile_id)
+            e.detail["current"] = profile.to_dict() if profile else None
+        raise
+    return results
+
+
+def touched_profiles(results: List[dict]) -> Set[str]:
+    return {result["profile_id"] for result in results}
@@ -0,0 +1,285 @@
+"""Server-sent events push channel for profile and life-event changes.
+
+Clients hold one ``GET /api/sync/stream`` connection open instead of polling
+``/profiles``. Each SSE event is a change-log entry. Its ``id`` is the
+change ``seq``, so a reconnecting EventSource sends it back as
+``Last-Event-ID`` and resumes exactly where it stopped. Notifications carry
+no state; clients fetch the entity or call ``/sync`` with the same token.
+
+One broadcaster per tenant shard and process tails the change_log table and
+fans new entries out to subscriber queues. The CRUD layer wakes it right
+after a commit that recorded changes. A slow fallback poll picks up writes
+from other processes (other uvicorn workers, CLI tools). A broadcaster only
+runs while it has subscribers: the last stream to leave stops it and drops
+it, so idle tenants are never polled and their engines can stay evicted.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import DEFAULT_TENANT, get_sessionmaker, tenant_of
+from models import ChangeLog
+import sync
+
+
+POLL_INTERVAL_SECONDS = 2.0
+HEARTBEAT_SECONDS = 15.0
+RETRY_MILLISECONDS = 3000
+QUEUE_SIZE = 1000
+REPLAY_LIMIT = 1000  # Larger gaps are told to catch up through /sync
+
+_OVERFLOW = object()
+
+
+class Subscriber:
+    """One open stream: a bounded queue and an optional profile filter."""
+
+    def __init__(self, profile_ids: Optional[Set[str]]):
+        self.profile_ids = profile_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, change: dict) -> bool:
+        return not self.profile_ids or change["profile_id"] in self.profile_ids
+
+    def offer(self, change: dict):
+        if self.overflowed or not self.wants(change):
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream so the client resumes via replay
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+
+
+def _entry(row: ChangeLog) -> dict:
+    return {
+        "seq": row.seq,
+        "entity": row.entity,
+        "id": row.entity_id,
+        "profile_id": row.profile_id,
+        "op": row.op.value,
+    }
+
+
+def load_changes(
+    since: int, limit: int, profile_ids: Optional[Set[str]] = None, session_factory=None
+) -> List[dict]:
+    """Change-log entries after ``since`` in seq order (blocking)."""
+    db = (session_factory or get_sessionmaker())()
+    try:
+        query = db.query(ChangeLog).filter(ChangeLog.seq > since)
+        if profile_ids:
+            query = query.filter(ChangeLog.profile_id.in_(profile_ids))
+        return [_entry(row) for row in query.order_by(ChangeLog.seq).limit(limit)]
+    finally:
+        db.close()
+
+
+def _current_seq(session_factory) -> int:
+    db = session_factory()
+    try:
+        return sync.current_seq(db)
+    finally:
+        db.close()
+
+
+class ChangeBroadcaster:
+    """Tail one shard's change log and fan new entries out to subscribers."""
+
+    def __init__(self, tenant: str = DEFAULT_TENANT):
+        self.tenant = tenant
+        self.session_factory = None
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self.last_seq = 0
+
+    async def start(self):
+        """Start tailing from the current end of the log (no-op if running)."""
+        async with self._start_lock:
+            if self._task and not self._task.done():
+                return
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            # Resolved on every start: the shard may have been evicted (and reopens) since
+            self.session_factory = await run_in_threadpool(get_sessionmaker, self.tenant)
+            self.last_seq = await run_in_threadpool(_current_seq, self.session_factory)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def notify(self):
+        """Wake the tail loop; safe to call from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass  # Loop shut down between the check and the call
+
+    async def subscribe(self, profile_ids: Optional[Set[str]] = None) -> Subscriber:
+        # Registered before starting, so a stream leaving meanwhile does not stop us
+        subscriber = Subscriber(profile_ids)
+        self._subscribers.add(subscriber)
+        try:
+            await self.start()
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a subscriber; the last one to leave stops the tail loop."""
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if not self._subscribers:
+                    # Nobody listening: skip the read but keep the position current
+                    self.last_seq = await run_in_threadpool(_current_seq, self.session_factory)
+                    continue
+                changes = await run_in_threadpool(
+                    load_changes, self.last_seq, QUEUE_SIZE, None, self.session_factory
+                )
+            except Exception as e:
+                print(f"Change stream error: {type(e).__name__}: {e}")
+                continue
+            for change in changes:
+                for subscriber in list(self._subscribers):
+                    subscriber.offer(change)
+                self.last_seq = change["seq"]
+            if len(changes) == QUEUE_SIZE:
+                self._wake.set()  # More waiting; go again without sleeping
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "last_seq": self.last_seq}
+
+
+# Only tenants with open streams; the last stream to leave removes its entry
+_broadcasters: Dict[str, ChangeBroadcaster] = {}
+
+
+def get_broadcaster(tenant: str) -> ChangeBroadcaster:
+    broadcaster = _broadcasters.get(tenant)
+    if broadcaster is None:
+        broadcaster = _broadcasters.setdefault(tenant, ChangeBroadcaster(tenant))
+    return broadcaster
+
+
+def _release(tenant: str, broadcaster: ChangeBroadcaster):
+    if not broadcaster._subscribers and _broadcasters.get(tenant) is broadcaster:
+        del _broadcasters[tenant]
+
+
+def notify(tenant: str):
+    """Wake the tenant's broadcaster, if any stream is open on it."""
+    broadcaster = _broadcasters.get(tenant)
+    if broadcaster:
+        broadcaster.notify()
+
+
+async def stop_all():
+    for broadcaster in list(_broadcasters.values()):
+        await broadcaster.stop()
+    _broadcasters.clear()
+
+
+# Wake the tenant's broadcaster after any commit that recorded changes
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(sync.CHANGES_PENDING, False):
+        notify(tenant_of(session))
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(sync.CHANGES_PENDING, None)
+
+
+# * =================
+# * SSE FORMATTING
+# * =================
+
+def format_event(change: dict) -> str:
+    return f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+
+
+def format_reset(seq: int) -> str:
+    """Tell the client it fell too far behind and must catch up through /sync."""
+    return f"event: reset\ndata: {json.dumps({'since': str(seq)})}\n\n"
+
+
+async def stream(
+    tenant: str,
+    last_event_id: Optional[int],
+    profile_ids: Optional[Set[str]],
+    is_disconnected,
+) -> AsyncIterator[str]:
+    """
+    Yield SSE frames: replay after ``last_event_id``, then live changes.
+
+    The subscription starts before the replay read, so nothing committed in
+    between is lost; entries already replayed are skipped by seq.
+    """
+    broadcaster = get_broadcaster(tenant)
+    subscriber = await broadcaster.subscribe(profile_ids)
+    try:
+        last = last_event_id if last_event_id is not None else broadcaster.last_seq
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+        if last_event_id is not None:
+            replay = await run_in_threadpool(
+                load_changes, last, REPLAY_LIMIT + 1, profile_ids, broadcaster.session_factory
+            )
+            if len(replay) > REPLAY_LIMIT:
+                yield format_reset(last)
+                return
+            for change in replay:
+                yield format_event(change)
+                last = change["seq"]
+
+        while True:
+            try:
+                change = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": heartbeat\n\n"
+                continue
+            if change is _OVERFLOW:
+                yield format_reset(last)
+                return
+            if change["seq"] <= last:
+                continue
+            yield format_event(change)
+            last = change["seq"]
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        _release(tenant, broadcaster)
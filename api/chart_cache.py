@@ -0,0 +1,106 @@
+"""Chart fingerprints and the shared chart-result cache.
+
+A chart depends only on the birth date, the hour bucket and the gender, so
+profiles that agree on those (twins, test presets, duplicates entered twice)
+share one fingerprint. Results are cached per fingerprint in the chart_cache
+table, fronted by a small in-process LRU, so identical charts are computed
+once. Rows hold the packed pillars.Chart code ({"code": n}); rows written
+before that hold {"pillars": {"year": "Jia Zi", ...}} and still load.
+
+The hour bucket is the two-hour branch, with 23:00-23:59 kept apart from
+00:00-00:59 because it belongs to the next day's pillar. The solar month in
+force is part of the fingerprint as well, so two times on a Jie day that fall
+on either side of the boundary never collide.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import ChartCache
+import pillars
+from solar_terms import datetime_to_jd, solar_month_at
+
+
+MEMORY_CACHE_SIZE = 4096
+
+_memory: "OrderedDict[str, pillars.Chart]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def hour_bucket(birth_time: Optional[str]) -> str:
+    """Branch bucket of a HH:MM time: "0".."11", "12" for 23:xx, "u" if unknown."""
+    if not birth_time:
+        return "u"
+    hour = int(birth_time.split(":")[0])
+    if hour == 23:
+        return "12"
+    return str((hour + 1) // 2 % 12)
+
+
+def chart_fingerprint(birth_date: str, birth_time: Optional[str], gender: str) -> str:
+    """Stable key shared by every profile whose chart is identical."""
+    year, month, day, hour, minute = pillars.parse_birth(birth_date, birth_time)
+    try:
+        solar_year, month_offset = solar_month_at(
+            datetime_to_jd(datetime(year, month, day, hour or 0, minute or 0))
+        )
+        solar_month = str(solar_year * 12 + month_offset)
+    except ValueError:
+        # Outside the solar-term index; the chart itself cannot be computed either
+        solar_month = "x"
+    return f"{birth_date}|h{hour_bucket(birth_time)}|m{solar_month}|{gender}"
+
+
+def _remember(fingerprint: str, chart: pillars.Chart):
+    with _memory_lock:
+        _memory[fingerprint] = chart
+        _memory.move_to_end(fingerprint)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def get_chart(
+    db: Session,
+    birth_date: str,
+    birth_time: Optional[str],
+    gender: str,
+    fingerprint: Optional[str] = None,
+) -> pillars.Chart:
+    """
+    Return the compact chart for this birth data, computing it at most once.
+
+    A newly computed chart is inserted into chart_cache but not committed;
+    the caller's commit makes it visible to other sessions.
+    """
+    fingerprint = fingerprint or chart_fingerprint(birth_date, birth_time, gender)
+    with _memory_lock:
+        chart = _memory.get(fingerprint)
+        if chart is not None:
+            _memory.move_to_end(fingerprint)
+            return chart
+
+    row = db.query(ChartCache).filter(ChartCache.fingerprint == fingerprint).first()
+    if row:
+        stored = row.chart
+        chart = pillars.Chart.from_code(stored["code"]) if "code" in stored \
+            else pillars.Chart.from_strings(stored["pillars"])
+    else:
+        chart = pillars.chart_for(birth_date, birth_time)
+        db.execute(
+            insert(ChartCache)
+            .values(fingerprint=fingerprint, chart={"code": chart.code})
+            .on_conflict_do_nothing(index_elements=[ChartCache.fingerprint])
+        )
+    _remember(fingerprint, chart)
+    return chart
+
+
+def clear_memory():
+    """Drop the in-process LRU (e.g. after interpretation rules change)."""
+    with _memory_lock:
+        _memory.clear()
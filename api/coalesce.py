@@ -0,0 +1,81 @@
+"""Single-flight coalescing of identical concurrent computations.
+
+When several requests ask for the same thing at once (a practitioner's
+client fanning out parallel requests for one profile, many clients asking
+for the same calendar at midnight), only the first one runs. The blocking
+work runs in the threadpool, and every caller that arrives while it is in
+flight awaits the same result.
+
+Results are shared between callers, so computations must return values that
+nobody mutates (plain dicts serialized by FastAPI are fine).
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in the threadpool unless ``key`` is already in flight."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting does not cancel the others' result
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def forget(self, key: Hashable):
+        """Make later callers start a fresh execution (e.g. after a write)."""
+        self._in_flight.pop(key, None)
+
+    def clear(self):
+        """Make every later caller start a fresh execution."""
+        self._in_flight.clear()
+
+    def stats(self) -> dict:
+        total = self.executions + self.coalesced
+        return {
+            "name": self.name,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._in_flight),
+            "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0,
+        }
+
+
+# Flights shared by the routes of every app that mounts the router
+profiles = SingleFlight("profiles")
+profile_lists = SingleFlight("profile_lists")
+charts = SingleFlight("charts")
+pillars = SingleFlight("pillars")
+solar_terms = SingleFlight("solar_terms")
+almanacs = SingleFlight("almanacs")
+
+ALL_FLIGHTS = [profiles, profile_lists, charts, pillars, solar_terms, almanacs]
+
+
+def stats() -> dict:
+    """Coalescing metrics for every flight."""
+    return {flight.name: flight.stats() for flight in ALL_FLIGHTS}
@@ -1,13 +1,126 @@
 """CRUD operations for profiles."""
 
+from contextlib import contextmanager
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
-from typing import Optional, List
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Callable, Iterator, Optional, List, TypeVar
 from datetime import datetime
 import uuid
 
-from models import Profile
+from models import ChangeOp, Profile
 from schemas import ProfileCreate, ProfileUpdate, LifeEventCreate, LifeEventUpdate
+import analysis_worker
+from chart_cache import chart_fingerprint
+import gazetteer
+import luck
+import phones
+import sync
+
+# Changing these invalidates every life-event analysis of the profile
+BIRTH_FIELDS = ("birth_date", "birth_time")
+
+# Fields that make up Profile.chart_fingerprint
+CHART_FIELDS = ("birth_date", "birth_time", "gender")
+
+# Unconditional writes re-read and re-apply this many times when they lose a race
+MAX_WRITE_ATTEMPTS = 5
+
+# Session.info flag: CRUD calls are part of a larger transaction (see transaction())
+IN_TRANSACTION = "crud_in_transaction"
+
+T = TypeVar("T")
+
+
+class VersionConflict(Exception):
+    """A conditional write found the profile at a different version."""
+
+    def __init__(self, profile: Optional[Profile]):
+        super().__init__("Profile was modified by another request")
+        self.profile = profile
+
+
+@contextmanager
+def transaction(db: Session) -> Iterator[Session]:
+    """
+    Run several CRUD calls as one all-or-nothing transaction.
+
+    Inside the block the CRUD functions flush instead of committing. The
+    block commits once at the end, or rolls everything back if it raises.
+    The write lock is taken up front (BEGIN IMMEDIATE), so reads inside the
+    block see a stable database and version checks cannot race.
+
+    Nested blocks join the enclosing transaction; an error inside one rolls
+    the whole transaction back.
+    """
+    if db.info.get(IN_TRANSACTION):
+        try:
+            yield db
+        except BaseException:
+            db.rollback()
+            raise
+        return
+
+    db.info[IN_TRANSACTION] = True
+    try:
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop(IN_TRANSACTION, None)
+
+
+def commit(db: Session):
+    """Commit, or only flush when running inside transaction(); for writes that may join one."""
+    if db.info.get(IN_TRANSACTION):
+        db.flush()
+    else:
+        db.commit()
+
+
+def _write_profile(
+    db: Session,
+    profile_id: str,
+    expected_version: Optional[int],
+    mutate: Callable[[Profile], Optional[T]],
+) -> Optional[T]:
+    """
+    Apply ``mutate`` to a profile and commit it with a version check.
+
+    Profile.version is the mapper's version counter, so the flush is a
+    compare-and-swap: UPDATE ... WHERE id = ? AND version = ?. No lock is
+    held between the read and the write.
+
+    With ``expected_version`` (If-Match), a mismatch raises VersionConflict.
+    Without it, a write that lost the race is re-read and re-applied, so
+    concurrent edits to different events of one profile are all kept.
+    ``mutate`` returns None to signal "not found" and abort.
+    """
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        profile = db.query(Profile).filter(Profile.id == profile_id).first()
+        if not profile:
+            return None
+        if expected_version is not None and profile.version != expected_version:
+            raise VersionConflict(profile)
+
+        result = mutate(profile)
+        if result is None:
+            if not db.info.get(IN_TRANSACTION):
+                db.rollback()
+            return None
+        try:
+            commit(db)
+            return result
+        except StaleDataError:
+            if db.info.get(IN_TRANSACTION):
+                raise  # Cannot retry without discarding the caller's earlier writes
+            db.rollback()
+            if expected_version is not None:
+                raise VersionConflict(get_profile(db, profile_id))
+    raise VersionConflict(get_profile(db, profile_id))
 
 
 def create_profile(db: Session, profile_data: ProfileCreate) -> Profile:
@@ -21,9 +134,16 @@ def create_profile(db: Session, profile_data: ProfileCreate) -> Profile:
         place_of_birth=profile_data.place_of_birth,
         phone=profile_data.phone,
         life_events=[],
+        chart_fingerprint=chart_fingerprint(
+            profile_data.birth_date, profile_data.birth_time, profile_data.gender
+        ),
     )
+    phones.apply(profile)
+    gazetteer.apply(profile)
+    luck.rebuild(profile)
     db.add(profile)
-    db.commit()
+    sync.record_change(db, sync.PROFILE, profile.id, profile.id, ChangeOp.UPSERT)
+    commit(db)
     db.refresh(profile)
     return profile
 
@@ -38,40 +158,68 @@ def get_profiles(db: Session, skip: int = 0, limit: int = 100) -> List[Profile]:
     return db.query(Profile).offset(skip).limit(limit).all()
 
 
-def update_profile(db: Session, profile_id: str, profile_data: ProfileUpdate) -> Optional[Profile]:
-    """Update an existing profile."""
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
-    if not profile:
-        return None
-
+def update_profile(
+    db: Session, profile_id: str, profile_data: ProfileUpdate, expected_version: Optional[int] = None
+) -> Optional[Profile]:
+    """Update an existing profile, optionally only if it is still at ``expected_version``."""
     update_data = profile_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(profile, field, value)
-
-    db.commit()
-    db.refresh(profile)
+    # A version in the body is the same precondition as If-Match
+    body_version = update_data.pop("version", None)
+    if expected_version is None:
+        expected_version = body_version
+
+    def mutate(profile: Profile) -> Profile:
+        old_events = list(profile.life_events or [])
+        old_event_ids = {e.get("id") for e in old_events}
+        birth_changed = any(
+            field in update_data and update_data[field] != getattr(profile, field)
+            for field in BIRTH_FIELDS
+        )
+        for field, value in update_data.items():
+            setattr(profile, field, value)
+
+        if any(field in update_data for field in CHART_FIELDS):
+            profile.chart_fingerprint = chart_fingerprint(profile.birth_date, profile.birth_time, profile.gender)
+            luck.rebuild(profile)
+        if "phone" in update_data:
+            phones.apply(profile)
+        if "place_of_birth" in update_data:
+            gazetteer.apply(profile)
+
+        # Re-analyze events whose chart context changed
+        new_event_ids = {e.get("id") for e in profile.life_events or []}
+        if birth_changed or "life_events" in update_data:
+            for event_id in old_event_ids | new_event_ids:
+                if event_id:
+                    analysis_worker.enqueue(db, profile_id, event_id)
+
+        sync.record_change(db, sync.PROFILE, profile_id, profile_id, ChangeOp.UPSERT)
+        if "life_events" in update_data:
+            sync.record_event_changes(db, profile_id, old_events, profile.life_events)
+        return profile
+
+    profile = _write_profile(db, profile_id, expected_version, mutate)
+    if profile:
+        db.refresh(profile)
     return profile
 
 
-def delete_profile(db: Session, profile_id: str) -> bool:
-    """Delete a profile by ID."""
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
-    if not profile:
-        return False
+def delete_profile(db: Session, profile_id: str, expected_version: Optional[int] = None) -> bool:
+    """Delete a profile by ID, optionally only if it is still at ``expected_version``."""
+    def mutate(profile: Profile) -> bool:
+        db.delete(profile)
+        sync.record_change(db, sync.PROFILE, profile_id, profile_id, ChangeOp.DELETE)
+        return True
 
-    db.delete(profile)
-    db.commit()
-    return True
+    return bool(_write_profile(db, profile_id, expected_version, mutate))
 
 
 # Life Event CRUD operations
 
-def add_life_event(db: Session, profile_id: str, event_data: LifeEventCreate) -> Optional[dict]:
+def add_life_event(
+    db: Session, profile_id: str, event_data: LifeEventCreate, expected_version: Optional[int] = None
+) -> Optional[dict]:
     """Add a life event to a profile."""
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
-    if not profile:
-        return None
-
     now = datetime.utcnow().isoformat()
     event = {
         "id": str(uuid.uuid4()),
@@ -85,71 +233,66 @@ def add_life_event(db: Session, profile_id: str, event_data: LifeEventCreate) ->
         "updated_at": now,
     }
 
-    # Initialize life_events if None
-    if profile.life_events is None:
-        profile.life_events = []
+    def mutate(profile: Profile) -> dict:
+        # Append to a new list (life_events may be None)
+        profile.life_events = (profile.life_events or []) + [event]
 
-    # Append to list
-    profile.life_events = profile.life_events + [event]
+        # Flag as modified for SQLAlchemy to detect JSON mutation
+        flag_modified(profile, 'life_events')
+        analysis_worker.enqueue(db, profile_id, event["id"])
+        sync.record_change(db, sync.LIFE_EVENT, event["id"], profile_id, ChangeOp.UPSERT)
+        return event
 
-    # Flag as modified for SQLAlchemy to detect JSON mutation
-    flag_modified(profile, 'life_events')
-
-    db.commit()
-    db.refresh(profile)
-    return event
+    return _write_profile(db, profile_id, expected_version, mutate)
 
 
 def update_life_event(
-    db: Session, profile_id: str, event_id: str, event_data: LifeEventUpdate
+    db: Session,
+    profile_id: str,
+    event_id: str,
+    event_data: LifeEventUpdate,
+    expected_version: Optional[int] = None,
 ) -> Optional[dict]:
     """Update a life event in a profile."""
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
-    if not profile or not profile.life_events:
-        return None
-
-    # Find and update the event
-    updated_event = None
-    events = list(profile.life_events)  # Create a copy
-
-    for i, event in enumerate(events):
-        if event.get("id") == event_id:
-            update_data = event_data.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                events[i][field] = value
-            events[i]["updated_at"] = datetime.utcnow().isoformat()
-            updated_event = events[i]
-            break
-
-    if not updated_event:
-        return None
-
-    profile.life_events = events
-    flag_modified(profile, 'life_events')
-
-    db.commit()
-    db.refresh(profile)
-    return updated_event
-
-
-def delete_life_event(db: Session, profile_id: str, event_id: str) -> bool:
+    update_data = event_data.model_dump(exclude_unset=True)
+
+    def mutate(profile: Profile) -> Optional[dict]:
+        # Find and update the event, copying so the loaded state stays untouched
+        events = list(profile.life_events or [])
+        for i, event in enumerate(events):
+            if event.get("id") == event_id:
+                events[i] = {**event, **update_data, "updated_at": datetime.utcnow().isoformat()}
+                break
+        else:
+            return None
+
+        profile.life_events = events
+        flag_modified(profile, 'life_events')
+        analysis_worker.enqueue(db, profile_id, event_id)
+        sync.record_change(db, sync.LIFE_EVENT, event_id, profile_id, ChangeOp.UPSERT)
+        return events[i]
+
+    return _write_profile(db, profile_id, expected_version, mutate)
+
+
+def delete_life_event(
+    db: Session, profile_id: str, event_id: str, expected_version: Optional[int] = None
+) -> bool:
     """Delete a life event from a profile."""
-    profile = db.query(Profile).filter(Profile.id == profile_id).first()
-    if not profile or not profile.life_events:
-        return False
-
-    # Filter out the event
-    original_length = len(profile.life_events)
-    events = [e for e in profile.life_events if e.get("id") != event_id]
-
-    if len(events) == original_length:
-        return False  # Event not found
-
-    profile.life_events = events
-    flag_modified(profile, 'life_events')
-
-    db.commit()
-    return True
+    def mutate(profile: Profile) -> Optional[bool]:
+        # Filter out the event
+        original = profile.life_events or []
+        events = [e for e in original if e.get("id") != event_id]
+        if len(events) == len(original):
+            return None  # Event not found
+
+        profile.life_events = events
+        flag_modified(profile, 'life_events')
+        analysis_worker.enqueue(db, profile_id, event_id)
+        sync.record_change(db, sync.LIFE_EVENT, event_id, profile_id, ChangeOp.DELETE)
+        return True
+
+    return bool(_write_profile(db, profile_id, expected_version, mutate))
 
 
 def get_life_event(db: Session, profile_id: str, event_id: str) -> Optional[dict]:
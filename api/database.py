@@ -1,11 +1,34 @@
-"""SQLite database connection and session management."""
+"""SQLite database connection and session management.
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+Each tenant (practice) can have its own SQLite file, chosen per request by
+the X-Tenant-ID header. Requests without the header use the default
+database at DATABASE_PATH, exactly as before. Tenant engines are opened
+lazily, migrated on first open, and kept in an LRU of at most
+MAX_OPEN_TENANTS. Evicting a tenant closes its idle connections, which
+bounds the number of open files.
+
+Shards are created only by ``provision_tenant`` (``python database.py
+--provision <tenant>``); a request for a tenant without a shard file is
+rejected, so a header can never create files.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 import os
+import re
+import threading
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
-# Database file path - use Railway volume /data, or local
-if os.environ.get("RAILWAY_ENVIRONMENT"):
+# Database file path - explicit override, Railway volume /data, or local
+if os.environ.get("BAZINGSE_DATABASE_PATH"):
+    # Benchmarks and scratch runs point the app at a throwaway file
+    DATABASE_PATH = os.environ["BAZINGSE_DATABASE_PATH"]
+elif os.environ.get("RAILWAY_ENVIRONMENT"):
     # Railway: use persistent volume
     DATABASE_PATH = "/data/bazingse.db"
 else:
@@ -14,41 +37,348 @@ else:
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 print(f"Using database: {DATABASE_PATH}")
 
-# Create engine with check_same_thread=False for SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+# Generated files (tenant shards, backups, caches) live under one folder next to the database
+DATA_DIR = os.environ.get(
+    "BAZINGSE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), "bazingse-data")
 )
 
-# Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def data_dir(name: str, keep_legacy: bool = False) -> str:
+    """
+    Default folder for one kind of generated file: DATA_DIR/<name>.
+
+    With ``keep_legacy``, an existing <database dir>/<name> folder from
+    before DATA_DIR keeps being used, so stored data is not orphaned.
+    """
+    legacy = os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), name)
+    current = os.path.join(DATA_DIR, name)
+    if keep_legacy and os.path.isdir(legacy) and not os.path.isdir(current):
+        return legacy
+    return current
+
+
+DEFAULT_TENANT = "default"
+TENANT_DIR = os.environ.get("BAZINGSE_TENANT_DIR") or data_dir("tenants", keep_legacy=True)
+MAX_OPEN_TENANTS = int(os.environ.get("BAZINGSE_MAX_OPEN_TENANTS", "32"))
+FAN_OUT_WORKERS = 8
+JOURNAL_MODE = os.environ.get("BAZINGSE_JOURNAL_MODE", "WAL")
+AUTO_VACUUM = "INCREMENTAL"
+
+# Tenant IDs become file names: no dots, slashes or leading dashes
+_TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def _configure_connection(dbapi_connection, _record):
+    # Only takes effect on new files (before the first table) or at the next VACUUM
+    dbapi_connection.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM}")
+    # WAL: readers do not block the writer; maintenance.py checkpoints it
+    dbapi_connection.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+
+
+def _create_engine(url: str) -> Engine:
+    # check_same_thread=False for SQLite
+    created = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(created, "connect", _configure_connection)
+    return created
+
+
+# Create engine with check_same_thread=False for SQLite
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
+# Session factory; info["tenant"] tells tenant-aware code which shard a session uses
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"tenant": DEFAULT_TENANT})
 
 # Base class for ORM models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session."""
-    db = SessionLocal()
+# * =================
+# * TENANT ROUTING
+# * =================
+
+_tenants: "OrderedDict[str, sessionmaker]" = OrderedDict()
+_tenants_lock = threading.Lock()
+# One lock per tenant being opened, so a slow migration only blocks that tenant
+_opening: Dict[str, threading.Lock] = {}
+
+
+class UnknownTenant(LookupError):
+    """The tenant has no shard file; provision it first."""
+
+
+def valid_tenant(tenant: str) -> bool:
+    return bool(_TENANT_ID.match(tenant))
+
+
+def tenant_path(tenant: str) -> str:
+    """SQLite file of a tenant shard."""
+    if tenant == DEFAULT_TENANT:
+        return DATABASE_PATH
+    if not valid_tenant(tenant):
+        raise ValueError(f"Invalid tenant ID: {tenant!r}")
+    return os.path.join(TENANT_DIR, f"{tenant}.db")
+
+
+def get_sessionmaker(tenant: str = DEFAULT_TENANT, create: bool = False) -> sessionmaker:
+    """
+    Session factory for a tenant, opening and migrating its shard on first use.
+
+    Raises UnknownTenant if the shard file does not exist, unless ``create``.
+    Factories handed out earlier stay usable after eviction; their engine
+    simply reconnects on the next checkout.
+    """
+    if tenant == DEFAULT_TENANT:
+        return SessionLocal
+    path = tenant_path(tenant)
+
+    with _tenants_lock:
+        factory = _cached(tenant)
+        if factory is not None:
+            return factory
+        if not create and not os.path.exists(path):
+            raise UnknownTenant(tenant)
+        opening = _opening.setdefault(tenant, threading.Lock())
+
+    # Migrate outside the global lock; other tenants' lookups go on meanwhile
+    with opening:
+        with _tenants_lock:
+            factory = _cached(tenant)
+            if factory is not None:
+                return factory
+
+        os.makedirs(TENANT_DIR, exist_ok=True)
+        tenant_engine = _create_engine(f"sqlite:///{path}")
+        try:
+            init_db(tenant_engine)
+        except Exception:
+            tenant_engine.dispose()
+            raise
+        factory = sessionmaker(
+            autocommit=False, autoflush=False, bind=tenant_engine, info={"tenant": tenant}
+        )
+
+        with _tenants_lock:
+            _tenants[tenant] = factory
+            while len(_tenants) > MAX_OPEN_TENANTS:
+                _, evicted = _tenants.popitem(last=False)
+                evicted.kw["bind"].dispose()
+        return factory
+
+
+def _cached(tenant: str) -> Optional[sessionmaker]:
+    """Open factory for a tenant, marked most recently used (caller holds _tenants_lock)."""
+    factory = _tenants.get(tenant)
+    if factory is not None:
+        _tenants.move_to_end(tenant)
+    return factory
+
+
+def provision_tenant(tenant: str) -> str:
+    """Create and migrate a tenant's shard (no-op if it exists); returns its path."""
+    get_sessionmaker(tenant, create=True)
+    return tenant_path(tenant)
+
+
+def get_engine(tenant: str = DEFAULT_TENANT) -> Engine:
+    return get_sessionmaker(tenant).kw["bind"]
+
+
+def tenant_of(db: Session) -> str:
+    """Tenant whose shard a session is bound to."""
+    return db.info.get("tenant", DEFAULT_TENANT)
+
+
+def list_tenants() -> List[str]:
+    """The default tenant plus every shard file on disk."""
+    tenants = [DEFAULT_TENANT]
+    if os.path.isdir(TENANT_DIR):
+        tenants += sorted(
+            name[:-3] for name in os.listdir(TENANT_DIR)
+            if name.endswith(".db") and valid_tenant(name[:-3])
+        )
+    return tenants
+
+
+def fan_out(fn: Callable[[str, Session], object], tenants: Optional[List[str]] = None) -> Dict[str, object]:
+    """
+    Run ``fn(tenant, session)`` against every tenant in parallel.
+
+    Returns {tenant: result}; a tenant whose call raised maps to
+    {"error": "..."} instead of failing the whole query.
+    """
+    def run(tenant):
+        db = get_sessionmaker(tenant)()
+        try:
+            return fn(tenant, db)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            db.close()
+
+    tenants = tenants if tenants is not None else list_tenants()
+    with ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS) as pool:
+        return dict(zip(tenants, pool.map(run, tenants)))
+
+
+def migrate_all() -> List[str]:
+    """Run init_db migrations on every shard; returns the tenants migrated."""
+    tenants = list_tenants()
+    for tenant in tenants:
+        init_db(get_engine(tenant))
+    return tenants
+
+
+def get_tenant(x_tenant_id: Optional[str] = Header(None, description="Tenant shard; default database if absent")) -> str:
+    """Dependency to get the request's tenant, for handlers that open their own sessions."""
+    tenant = x_tenant_id or DEFAULT_TENANT
+    if not valid_tenant(tenant):
+        raise HTTPException(status_code=400, detail="Invalid X-Tenant-ID")
+    try:
+        get_sessionmaker(tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    return tenant
+
+
+def get_db(tenant: str = Depends(get_tenant)):
+    """Dependency to get a database session on the request's tenant shard."""
+    db = get_sessionmaker(tenant)()
     try:
         yield db
     finally:
         db.close()
 
 
-def init_db():
-    """Initialize database tables and run migrations."""
+def init_db(bind: Optional[Engine] = None):
+    """Initialize database tables and run migrations (default database unless ``bind``)."""
     from models import Profile  # Import here to avoid circular imports
-    Base.metadata.create_all(bind=engine)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
 
     # Migration: Add phone column if it doesn't exist
     from sqlalchemy import text, inspect
-    inspector = inspect(engine)
+    inspector = inspect(bind)
     columns = [c['name'] for c in inspector.get_columns('profiles')]
 
     if 'phone' not in columns:
         print("Migration: Adding phone column to profiles table...")
-        with engine.connect() as conn:
+        with bind.connect() as conn:
             conn.execute(text("ALTER TABLE profiles ADD COLUMN phone VARCHAR"))
             conn.commit()
         print("Migration complete: phone column added")
+
+    if 'chart_fingerprint' not in columns:
+        print("Migration: Adding chart_fingerprint column to profiles table...")
+        with bind.connect() as conn:
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN chart_fingerprint VARCHAR"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_profiles_chart_fingerprint ON profiles (chart_fingerprint)"
+            ))
+            conn.commit()
+        print("Migration complete: chart_fingerprint column added")
+
+    if 'version' not in columns:
+        print("Migration: Adding version column to profiles table...")
+        with bind.connect() as conn:
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+            conn.commit()
+        print("Migration complete: version column added")
+
+    if 'phone_key' not in columns:
+        print("Migration: Adding phone_key columns to profiles table...")
+        with bind.connect() as conn:
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN phone_key VARCHAR"))
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN phone_reversed VARCHAR"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_profiles_phone_key ON profiles (phone_key)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_profiles_phone_reversed ON profiles (phone_reversed)"
+            ))
+            conn.commit()
+        print("Migration complete: phone_key columns added")
+
+    if 'birth_timezone' not in columns:
+        print("Migration: Adding birth coordinate columns to profiles table...")
+        with bind.connect() as conn:
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN birth_latitude FLOAT"))
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN birth_longitude FLOAT"))
+            conn.execute(text("ALTER TABLE profiles ADD COLUMN birth_timezone VARCHAR"))
+            conn.commit()
+        print("Migration complete: birth coordinate columns added")
+
+    # Backfill fingerprints for rows written before the column existed
+    from chart_cache import chart_fingerprint
+    with bind.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, birth_date, birth_time, gender FROM profiles WHERE chart_fingerprint IS NULL"
+        )).fetchall()
+        if rows:
+            conn.execute(
+                text("UPDATE profiles SET chart_fingerprint = :fingerprint WHERE id = :id"),
+                [
+                    {"id": row.id, "fingerprint": chart_fingerprint(row.birth_date, row.birth_time, row.gender)}
+                    for row in rows
+                ],
+            )
+            conn.commit()
+            print(f"Migration: backfilled chart_fingerprint for {len(rows)} profiles")
+
+    # Normalized phone keys for rows written before the columns existed
+    import phones
+    with bind.connect() as conn:
+        keyed = phones.backfill(conn)
+        conn.commit()
+        if keyed:
+            print(f"Migration: backfilled phone_key for {keyed} profiles")
+
+    # Birth coordinates from the offline gazetteer for rows written before them
+    import gazetteer
+    with bind.connect() as conn:
+        located = gazetteer.backfill(conn)
+        conn.commit()
+        if located:
+            print(f"Migration: resolved place_of_birth for {located} profiles")
+
+    # Give existing rows a place in the delta-sync feed
+    import sync
+    with bind.connect() as conn:
+        seeded = sync.backfill(conn)
+        conn.commit()
+        if seeded:
+            print(f"Migration: seeded change_log with {seeded} entries")
+
+    # Indexes declared after their tables were first created
+    with bind.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_event_pattern_links_event_id ON event_pattern_links (event_id)"
+        ))
+        conn.commit()
+
+    # Luck-pillar timelines: index for the range join, rows for older profiles
+    import luck
+    with bind.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_life_events_profile_date ON life_events (profile_id, event_date)"
+        ))
+        built = luck.backfill(conn)
+        conn.commit()
+        if built:
+            print(f"Migration: built luck-pillar timelines for {built} profiles")
+
+
+if __name__ == "__main__":
+    # python database.py: run migrations on the default database and every tenant shard.
+    # python database.py --provision acme: create the shard for a new tenant.
+    # Go through the imported module so the models register on the same Base.
+    import argparse
+    import database
+    parser = argparse.ArgumentParser(description="Migrate databases or provision tenant shards.")
+    parser.add_argument("--provision", nargs="+", metavar="TENANT", help="Create these tenants' shards")
+    args = parser.parse_args()
+    if args.provision:
+        for tenant in args.provision:
+            if not database.valid_tenant(tenant):
+                parser.error(f"invalid tenant ID: {tenant!r}")
+            print(f"Provisioned {tenant}: {database.provision_tenant(tenant)}")
+    else:
+        for migrated in database.migrate_all():
+            print(f"Migrated {migrated}: {database.tenant_path(migrated)}")
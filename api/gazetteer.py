@@ -0,0 +1,476 @@
+"""Offline gazetteer: place-of-birth resolution, typeahead and true solar time.
+
+``Profile.place_of_birth`` is free text. Correcting a birth time to true
+solar time needs the place's longitude and the civil time zone in force at
+the birth moment. Both come from bundled data, so nothing is looked up
+over the network:
+- gazetteer.csv lists cities with coordinates and an IANA time zone;
+- zoneinfo supplies each zone's offset history (WIB was UTC+7:30 until 1964,
+  for example). The tzdata package provides it where the OS has none.
+
+The CSV is compiled once into GAZETTEER_DIR as a binary index and memory-
+mapped. Its keys are the normalized names and alternate names, sorted, so a
+typeahead prefix is two binary searches plus a short scan, all well under a
+millisecond. The index records a digest of the CSV and is rebuilt when the
+CSV changes.
+
+Layout (big-endian):
+    header   magic "BZGZ", version u8, CSV digest 8 bytes, places u32,
+             keys u32, zones u16, string bytes u32
+    places   21 bytes each: latitude and longitude in 1e-5 degrees (i32),
+             population in thousands u32, country 2 bytes, zone u16,
+             name offset u32, name length u8
+    keys     7 bytes each, sorted: key offset u32, key length u8, place u16
+    zones    5 bytes each: name offset u32, name length u8
+    strings  UTF-8 names, keys and zone names
+
+Resolved coordinates are stored on profiles (birth_latitude,
+birth_longitude, birth_timezone) by the CRUD layer. Rows written before that
+are resolved by ``backfill``. ``python gazetteer.py resolve --all``
+re-resolves them after the CSV changes; so does POST
+/api/admin/gazetteer/resolve, which needs X-Admin-Token
+(BAZINGSE_ADMIN_TOKEN).
+
+Usage:
+    cd api
+    python gazetteer.py search jak           # typeahead from the command line
+    python gazetteer.py build                # (re)compile the index
+    python gazetteer.py resolve [--all] [--tenant T]
+"""
+
+import argparse
+import csv
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+from database import DEFAULT_TENANT, data_dir, get_engine, init_db
+from models import Profile
+
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+GAZETTEER_DIR = os.environ.get("BAZINGSE_GAZETTEER_DIR") or data_dir("gazetteer")
+FORMAT_VERSION = 1
+MAX_PREFIX_KEYS = 2000       # Keys scanned per typeahead before ranking
+
+MAGIC = b"BZGZ"
+_HEADER = struct.Struct(">4sB8sIIHI")
+_PLACE = struct.Struct(">iiI2sHIB")
+_KEY = struct.Struct(">IBH")
+_ZONE = struct.Struct(">IB")
+_SCALE = 100000
+
+# Country names accepted as hints in free text ("Medan, Indonesia")
+COUNTRY_NAMES = {
+    "indonesia": "ID", "malaysia": "MY", "singapore": "SG", "brunei": "BN", "timor leste": "TL",
+    "thailand": "TH", "vietnam": "VN", "viet nam": "VN", "philippines": "PH", "cambodia": "KH",
+    "laos": "LA", "myanmar": "MM", "burma": "MM", "china": "CN", "prc": "CN", "tiongkok": "CN",
+    "hong kong": "HK", "macau": "MO", "taiwan": "TW", "japan": "JP", "korea": "KR",
+    "south korea": "KR", "north korea": "KP", "mongolia": "MN", "india": "IN", "sri lanka": "LK",
+    "nepal": "NP", "bangladesh": "BD", "pakistan": "PK", "maldives": "MV",
+    "united arab emirates": "AE", "uae": "AE", "qatar": "QA", "kuwait": "KW", "saudi arabia": "SA",
+    "iran": "IR", "turkey": "TR", "israel": "IL", "egypt": "EG", "nigeria": "NG", "kenya": "KE",
+    "south africa": "ZA", "mauritius": "MU", "australia": "AU", "new zealand": "NZ",
+    "papua new guinea": "PG", "united kingdom": "GB", "uk": "GB", "england": "GB", "scotland": "GB",
+    "ireland": "IE", "france": "FR", "netherlands": "NL", "holland": "NL", "belgium": "BE",
+    "germany": "DE", "switzerland": "CH", "austria": "AT", "italy": "IT", "spain": "ES",
+    "portugal": "PT", "sweden": "SE", "norway": "NO", "denmark": "DK", "finland": "FI",
+    "poland": "PL", "czech republic": "CZ", "czechia": "CZ", "hungary": "HU", "greece": "GR",
+    "ukraine": "UA", "russia": "RU", "united states": "US", "usa": "US", "us": "US",
+    "america": "US", "canada": "CA", "mexico": "MX", "colombia": "CO", "peru": "PE", "chile": "CL",
+    "argentina": "AR", "brazil": "BR", "suriname": "SR",
+}
+# Administrative words around a city name in addresses ("Kota Bandung", "Kab. Garut")
+_ADMIN_WORDS = re.compile(r"^(?:kota administrasi|kota|kabupaten|kab|city of)\s+|\s+city$")
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+class Place(NamedTuple):
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+    timezone: str
+    population: int  # Thousands; ranks typeahead matches
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def normalize(name: str) -> str:
+    """Lowercase ASCII words: "São Paulo" -> "sao paulo", "Xi'an" -> "xi an"."""
+    folded = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return _NON_WORD.sub(" ", folded.lower()).strip()
+
+
+def index_path() -> str:
+    return os.path.join(GAZETTEER_DIR, f"gazetteer.v{FORMAT_VERSION}.bin")
+
+
+# * =================
+# * BUILD
+# * =================
+
+def _read_source(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _digest(source: bytes) -> bytes:
+    return hashlib.sha1(source).digest()[:8]
+
+
+def build(source: bytes) -> bytes:
+    """Compile the gazetteer CSV into the binary index."""
+    lines = [line for line in source.decode("utf-8").splitlines() if line and not line.startswith("#")]
+    rows = list(csv.DictReader(lines))
+
+    strings = bytearray()
+    string_offsets: Dict[str, int] = {}
+
+    def intern(value: str) -> Tuple[int, int]:
+        encoded = value.encode("utf-8")
+        if len(encoded) > 255:
+            raise ValueError(f"Gazetteer string too long: {value!r}")
+        if value not in string_offsets:
+            string_offsets[value] = len(strings)
+            strings.extend(encoded)
+        return string_offsets[value], len(encoded)
+
+    zones: List[str] = []
+    zone_ids: Dict[str, int] = {}
+    places = bytearray()
+    keys: Dict[str, List[int]] = {}
+    for place_id, row in enumerate(rows):
+        zone = row["timezone"]
+        ZoneInfo(zone)  # Fail the build, not a lookup, on an unknown zone
+        if zone not in zone_ids:
+            zone_ids[zone] = len(zones)
+            zones.append(zone)
+        offset, length = intern(row["name"])
+        places += _PLACE.pack(
+            round(float(row["latitude"]) * _SCALE), round(float(row["longitude"]) * _SCALE),
+            int(row["population"] or 0), row["country"].encode("ascii"), zone_ids[zone], offset, length,
+        )
+        for name in [row["name"], *filter(None, row["alternate_names"].split("|"))]:
+            key = normalize(name)
+            if key and place_id not in keys.setdefault(key, []):
+                keys[key].append(place_id)
+
+    key_table = bytearray()
+    key_count = 0
+    # Sorted by UTF-8 bytes, the order the mmap lookups compare in
+    for key in sorted(keys, key=lambda k: k.encode("utf-8")):
+        offset, length = intern(key)
+        for place_id in keys[key]:
+            key_table += _KEY.pack(offset, length, place_id)
+            key_count += 1
+
+    zone_table = b"".join(_ZONE.pack(*intern(zone)) for zone in zones)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, _digest(source), len(rows), key_count, len(zones), len(strings))
+    return header + bytes(places) + bytes(key_table) + zone_table + bytes(strings)
+
+
+def write(data: bytes) -> str:
+    """Atomically store the compiled index; returns its path."""
+    os.makedirs(GAZETTEER_DIR, exist_ok=True)
+    path = index_path()
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=GAZETTEER_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+# * =================
+# * INDEX
+# * =================
+
+class _Keys:
+    """Sorted key column of the index as a sequence of bytes, for bisect."""
+
+    def __init__(self, index: "Gazetteer"):
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._index.key_count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._index.key(i)
+
+
+class Gazetteer:
+    """Read-only view of a compiled index file through mmap."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.digest, self.place_count, self.key_count, zone_count, _ = \
+            _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError("Not a gazetteer index of the current format")
+        self._places = _HEADER.size
+        self._keys = self._places + self.place_count * _PLACE.size
+        zones = self._keys + self.key_count * _KEY.size
+        self._strings = zones + zone_count * _ZONE.size
+        self._zones = [self._string(*_ZONE.unpack_from(self._map, zones + i * _ZONE.size)).decode("utf-8")
+                       for i in range(zone_count)]
+        self._sorted_keys = _Keys(self)
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings + offset
+        return self._map[start:start + length]
+
+    def key(self, i: int) -> bytes:
+        offset, length, _ = _KEY.unpack_from(self._map, self._keys + i * _KEY.size)
+        return self._string(offset, length)
+
+    def key_place(self, i: int) -> int:
+        return _KEY.unpack_from(self._map, self._keys + i * _KEY.size)[2]
+
+    def place(self, place_id: int) -> Place:
+        latitude, longitude, population, country, zone, offset, length = \
+            _PLACE.unpack_from(self._map, self._places + place_id * _PLACE.size)
+        return Place(
+            self._string(offset, length).decode("utf-8"), country.decode("ascii"),
+            latitude / _SCALE, longitude / _SCALE, self._zones[zone], population,
+        )
+
+    def _range(self, prefix: bytes) -> Tuple[int, int]:
+        """Key positions [lo, hi) starting with ``prefix``."""
+        lo = bisect_left(self._sorted_keys, prefix)
+        # Keys are ASCII, so every key with the prefix sorts below prefix + 0xff
+        hi = bisect_left(self._sorted_keys, prefix + b"\xff", lo)
+        return lo, hi
+
+    def exact(self, name: str) -> List[Place]:
+        """Places whose name or alternate name normalizes to ``name``."""
+        key = normalize(name).encode("utf-8")
+        lo = bisect_left(self._sorted_keys, key)
+        places = []
+        while lo < self.key_count and self.key(lo) == key:
+            places.append(self.place(self.key_place(lo)))
+            lo += 1
+        return places
+
+    def search(self, prefix: str, limit: int = 10, country: Optional[str] = None) -> List[Place]:
+        """Typeahead: places with a name starting with ``prefix``, most populous first."""
+        key = normalize(prefix).encode("utf-8")
+        if not key:
+            return []
+        lo, hi = self._range(key)
+        seen = set()
+        matches = []
+        for i in range(lo, min(hi, lo + MAX_PREFIX_KEYS)):
+            place_id = self.key_place(i)
+            if place_id in seen:
+                continue
+            seen.add(place_id)
+            place = self.place(place_id)
+            if country is None or place.country == country.upper():
+                matches.append(place)
+        matches.sort(key=lambda place: (-place.population, place.name))
+        return matches[:limit]
+
+
+_index: Optional[Gazetteer] = None
+_index_lock = threading.Lock()
+
+
+def index() -> Gazetteer:
+    """The memory-mapped index, compiling it first if missing or older than the CSV."""
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            source = _read_source(SOURCE_PATH)
+            loaded = None
+            try:
+                loaded = Gazetteer(index_path())
+            except (FileNotFoundError, ValueError, struct.error):
+                pass
+            if loaded is None or loaded.digest != _digest(source):
+                if loaded is not None:
+                    loaded.close()
+                write(build(source))
+                loaded = Gazetteer(index_path())
+            _index = loaded
+    return _index
+
+
+def search(prefix: str, limit: int = 10, country: Optional[str] = None) -> List[Place]:
+    return index().search(prefix, limit, country)
+
+
+def resolve(place_of_birth: Optional[str]) -> Optional[Place]:
+    """
+    The place a free-text place of birth refers to, or None.
+
+    Comma-separated parts are tried in order ("Medan, Sumatera Utara,
+    Indonesia"). Administrative words such as "Kota" or "Kab." are dropped
+    when the full part does not match. A country among the parts narrows
+    ambiguous names; otherwise the most populous match wins.
+    """
+    if not place_of_birth:
+        return None
+    parts = [normalize(part) for part in re.split(r"[,/;]", place_of_birth)]
+    parts = [part for part in parts if part]
+    country = next((COUNTRY_NAMES[part] for part in parts if part in COUNTRY_NAMES), None)
+    gazetteer = index()
+    for part in parts:
+        candidates = gazetteer.exact(part) or gazetteer.exact(_ADMIN_WORDS.sub("", part))
+        if country:
+            candidates = [place for place in candidates if place.country == country] or candidates
+        if candidates:
+            return max(candidates, key=lambda place: place.population)
+    return None
+
+
+# * =================
+# * SOLAR TIME
+# * =================
+
+def equation_of_time(moment: datetime) -> float:
+    """Apparent minus mean solar time in minutes (NOAA approximation, within about 30 s)."""
+    day_of_year = moment.timetuple().tm_yday
+    gamma = 2 * math.pi / 365 * (day_of_year - 1 + (moment.hour - 12) / 24)
+    return 229.18 * (
+        0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+        - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma)
+    )
+
+
+def solar_offset(moment: datetime, longitude: float, timezone: str) -> dict:
+    """
+    Minutes to add to a civil local time to get true solar time at ``longitude``.
+
+    The civil offset is whatever ``timezone`` used at ``moment``, daylight
+    saving and historical changes included. The longitude term is 4 minutes
+    per degree east of Greenwich.
+    """
+    civil = ZoneInfo(timezone).utcoffset(moment).total_seconds() / 60
+    longitude_minutes = longitude * 4 - civil
+    equation = equation_of_time(moment)
+    return {
+        "timezone": timezone,
+        "utc_offset_minutes": civil,
+        "longitude_minutes": round(longitude_minutes, 2),
+        "equation_of_time_minutes": round(equation, 2),
+        "offset_minutes": round(longitude_minutes + equation, 2),
+    }
+
+
+def solar_birth(
+    birth_date: str, birth_time: Optional[str], longitude: float, timezone: str
+) -> Tuple[str, Optional[str], Optional[dict]]:
+    """
+    Birth date and time moved to true solar time, for the pillar calculation.
+
+    Returns (YYYY-MM-DD, HH:MM, offset details). An unknown birth time has no
+    hour pillar to correct and is returned unchanged with no details.
+    """
+    if not birth_time:
+        return birth_date, birth_time, None
+    civil = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
+    offset = solar_offset(civil, longitude, timezone)
+    solar = civil + timedelta(minutes=round(offset["offset_minutes"]))
+    return solar.strftime("%Y-%m-%d"), solar.strftime("%H:%M"), offset
+
+
+# * =================
+# * PROFILES
+# * =================
+
+def apply(profile: Profile):
+    """Set the birth coordinates from ``profile.place_of_birth`` (None when unknown)."""
+    place = resolve(profile.place_of_birth)
+    profile.birth_latitude = place.latitude if place else None
+    profile.birth_longitude = place.longitude if place else None
+    profile.birth_timezone = place.timezone if place else None
+
+
+def backfill(conn, resolve_all: bool = False) -> int:
+    """
+    Resolve profiles' places of birth in bulk; returns the number of profiles updated.
+
+    Each distinct place string is resolved once and written with one UPDATE
+    for all its profiles. Without ``resolve_all`` only profiles that have
+    no coordinates yet are considered.
+    """
+    condition = "" if resolve_all else " AND birth_timezone IS NULL"
+    places = conn.execute(text(
+        "SELECT DISTINCT place_of_birth FROM profiles "
+        f"WHERE place_of_birth IS NOT NULL AND place_of_birth != ''{condition}"
+    )).scalars().all()
+    updated = 0
+    for place_of_birth in places:
+        place = resolve(place_of_birth)
+        if place is None and not resolve_all:
+            continue
+        result = conn.execute(
+            text("UPDATE profiles SET birth_latitude = :latitude, birth_longitude = :longitude, "
+                 f"birth_timezone = :timezone WHERE place_of_birth = :place{condition}"),
+            {
+                "latitude": place.latitude if place else None,
+                "longitude": place.longitude if place else None,
+                "timezone": place.timezone if place else None,
+                "place": place_of_birth,
+            },
+        )
+        updated += result.rowcount
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline gazetteer tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_cmd = commands.add_parser("search", help="Typeahead lookup")
+    search_cmd.add_argument("prefix")
+    search_cmd.add_argument("--limit", type=int, default=10)
+    search_cmd.add_argument("--country")
+
+    commands.add_parser("build", help="Compile gazetteer.csv into the binary index")
+
+    resolve_cmd = commands.add_parser("resolve", help="Resolve profiles' places of birth")
+    resolve_cmd.add_argument("--all", action="store_true", help="Also re-resolve profiles that have coordinates")
+    resolve_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    if args.command == "search":
+        for place in search(args.prefix, args.limit, args.country):
+            print(f"{place.name:24s} {place.country}  {place.latitude:9.4f} {place.longitude:10.4f}  {place.timezone}")
+    elif args.command == "build":
+        path = write(build(_read_source(SOURCE_PATH)))
+        print(f"{path} ({os.path.getsize(path):,} bytes)")
+    else:
+        init_db()
+        with get_engine(args.tenant).connect() as conn:
+            updated = backfill(conn, resolve_all=args.all)
+            conn.commit()
+        print(f"Resolved places of birth for {updated} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Idempotency keys for create endpoints.
+
+A client that may retry a POST sends an ``Idempotency-Key`` header. The
+first request with a key claims it in its own small commit, then runs and
+stores its response in the same transaction as its writes, so the writes
+and the stored response commit together or not at all. Any retry with the
+same key and the same request gets that stored response back without
+running again. Reusing a key for a different request is rejected. So is a
+retry that arrives while the first attempt is still running.
+
+Keys expire after ``TTL``. A claim still without a response after
+``LEASE`` belongs to a request that died before committing anything, and
+can be taken over by the next retry.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import IdempotencyKey
+
+
+TTL = timedelta(hours=24)
+LEASE = timedelta(seconds=60)
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """The key cannot be used for this request right now."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def request_hash(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), b"\0", path.encode(), b"\0", body):
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def claim(db: Session, key: str, method: str, path: str, body: bytes) -> Optional[IdempotencyKey]:
+    """
+    Claim ``key`` for this request.
+
+    Returns None when the caller should run the request, or the completed
+    row whose response should be replayed. Raises IdempotencyError if the
+    key belongs to another request or is still in flight.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+    fingerprint = request_hash(method, path, body)
+    now = datetime.utcnow()
+    for _ in range(2):
+        row = db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+        if row:
+            abandoned = row.status_code is None and row.created_at and row.created_at < now - LEASE
+            if row.expires_at <= now or abandoned:
+                # Conditional, so a claim completed since the read above is kept
+                db.query(IdempotencyKey).filter(
+                    IdempotencyKey.key == key,
+                    or_(
+                        IdempotencyKey.expires_at <= now,
+                        (IdempotencyKey.status_code.is_(None)) & (IdempotencyKey.created_at < now - LEASE),
+                    ),
+                ).delete(synchronize_session=False)
+                db.commit()
+                continue
+            if row.request_hash != fingerprint:
+                raise IdempotencyError(422, "Idempotency-Key was already used for a different request")
+            if row.status_code is None:
+                raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+            return row
+
+        db.add(IdempotencyKey(
+            key=key, method=method, path=path, request_hash=fingerprint,
+            created_at=now, expires_at=now + TTL,
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            # A concurrent request claimed it first; look again
+            db.rollback()
+    raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+
+
+def complete(db: Session, key: str, status_code: int, response_body):
+    """
+    Store the response of a claimed request, without committing.
+
+    Call it inside the request's own transaction so the response commits
+    with its writes. Raises IdempotencyError if the claim was taken over in
+    the meantime; rolling back then leaves the other attempt's result alone.
+    """
+    stored = db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+    ).update(
+        {IdempotencyKey.status_code: status_code, IdempotencyKey.response_body: response_body},
+        synchronize_session=False,
+    )
+    if stored != 1:
+        raise IdempotencyError(409, "Idempotency-Key was claimed by another attempt")
+
+
+def release(db: Session, key: str):
+    """Drop a claim whose request failed, so a retry runs it again."""
+    db.rollback()
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired keys; returns the number removed."""
+    removed = db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= datetime.utcnow()) \
+        .delete(synchronize_session=False)
+    db.commit()
+    return removed
@@ -1,11 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
+import os
 import sys
 
+# Add the api directory to Python path
+api_dir = os.path.dirname(os.path.abspath(__file__))
+if api_dir not in sys.path:
+    sys.path.insert(0, api_dir)
+
 # Initialize FastAPI app for Vercel
 app = FastAPI(title="BaZingSe API")
 
+# Store import error if any
+import_error = None
+
+# Shed load per route class; added before CORS so 503s still carry CORS headers
+try:
+    from admission import AdmissionMiddleware
+    app.add_middleware(AdmissionMiddleware)
+except Exception as e:
+    import_error = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -15,9 +31,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store import error if any
-import_error = None
-
 # Health check
 @app.get("/api/health")
 def health():
@@ -26,13 +39,6 @@ def health():
 # Try to import router
 try:
     # Use relative import for Vercel deployment
-    import os
-    import sys
-    # Add the api directory to Python path
-    api_dir = os.path.dirname(os.path.abspath(__file__))
-    if api_dir not in sys.path:
-        sys.path.insert(0, api_dir)
-
     from routes import router
     app.include_router(router, prefix="/api")
 except Exception as e:
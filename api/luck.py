@@ -0,0 +1,153 @@
+"""Ten-year luck pillar (Da Yun) timeline per profile.
+
+Luck pillars depend only on birth data and gender, so they are computed once
+and stored as dated rows in luck_periods. The CRUD layer rebuilds a profile's
+rows when its birth date, time or gender changes. Questions like "every
+event that happened during a Jia Zi luck pillar, across all clients" then
+become a range join against life_events. No charts are recomputed.
+
+The rules follow generateLuckPillars in the TypeScript chart generator:
+- Direction: forward for a yang year with a male, or a yin year with a
+  female; backward otherwise.
+- Start age: days from the birth date to the next (forward) or previous
+  (backward) Jie term, divided by 3 and rounded up.
+- Pillars: each one steps one further from the month pillar.
+More pillars are stored than the frontend shows (LUCK_PILLAR_COUNT), so
+the timeline covers a full lifetime.
+"""
+
+import math
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import LifeEvent, LuckPeriod, Profile
+import pillars
+import solar_terms
+
+
+LUCK_PILLAR_COUNT = 10
+YEARS_PER_PILLAR = 10
+
+# (ordinal, sexagenary index, start YYYY-MM-DD, end YYYY-MM-DD exclusive)
+PeriodRow = Tuple[int, int, str, str]
+
+
+def _add_years(day: date, years: int) -> date:
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)  # Feb 29 birthdays
+
+
+def _days_to_jie(birth: date, forward: bool) -> int:
+    """Whole days between the birth date and the next or previous Jie term."""
+    instants, term_ids = solar_terms.get_index()
+    jd = solar_terms.datetime_to_jd(datetime(birth.year, birth.month, birth.day))
+    pos = bisect_right(instants, jd)
+    step = 1 if forward else -1
+    if not forward:
+        pos -= 1
+    while 0 <= pos < len(instants) and term_ids[pos] % 2 == 0:
+        pos += step
+    if not 0 <= pos < len(instants):
+        raise ValueError("Birth date outside the solar-term index range (1900-2100)")
+    jie = solar_terms.jd_to_datetime(instants[pos]).date()
+    return (jie - birth).days if forward else (birth - jie).days
+
+
+def is_forward(chart: pillars.Chart, gender: str) -> bool:
+    yang_year = chart.stem("year") % 2 == 0
+    return (gender == "male") == yang_year
+
+
+def compute_periods(birth_date: str, birth_time: Optional[str], gender: str) -> List[PeriodRow]:
+    """Luck-pillar periods for one set of birth data, in order."""
+    chart = pillars.chart_for(birth_date, birth_time)
+    forward = is_forward(chart, gender)
+    birth = date.fromisoformat(birth_date)
+    start_age = math.ceil(_days_to_jie(birth, forward) / 3)
+    step = 1 if forward else -1
+
+    periods = []
+    for ordinal in range(LUCK_PILLAR_COUNT):
+        age = start_age + ordinal * YEARS_PER_PILLAR
+        periods.append((
+            ordinal,
+            (chart.month + step * (ordinal + 1)) % 60,
+            _add_years(birth, age).isoformat(),
+            _add_years(birth, age + YEARS_PER_PILLAR).isoformat(),
+        ))
+    return periods
+
+
+def rebuild(profile: Profile):
+    """Replace a profile's stored timeline from its current birth data (not committed)."""
+    try:
+        periods = compute_periods(profile.birth_date, profile.birth_time, profile.gender)
+    except ValueError:
+        periods = []  # Outside the supported range; the chart itself cannot be computed either
+    profile.luck_periods = [
+        LuckPeriod(ordinal=ordinal, pillar=pillar, start_date=start, end_date=end)
+        for ordinal, pillar, start, end in periods
+    ]
+
+
+def backfill(conn) -> int:
+    """Compute timelines for profiles that have none; returns the number of profiles."""
+    rows = conn.execute(text(
+        "SELECT id, birth_date, birth_time, gender FROM profiles "
+        "WHERE NOT EXISTS (SELECT 1 FROM luck_periods WHERE luck_periods.profile_id = profiles.id)"
+    )).fetchall()
+    values = []
+    for row in rows:
+        try:
+            periods = compute_periods(row.birth_date, row.birth_time, row.gender)
+        except ValueError:
+            continue
+        values.extend(
+            {"profile_id": row.id, "ordinal": ordinal, "pillar": pillar, "start_date": start, "end_date": end}
+            for ordinal, pillar, start, end in periods
+        )
+    if values:
+        conn.execute(
+            text("INSERT INTO luck_periods (profile_id, ordinal, pillar, start_date, end_date) "
+                 "VALUES (:profile_id, :ordinal, :pillar, :start_date, :end_date)"),
+            values,
+        )
+    return len(rows)
+
+
+# * =================
+# * QUERIES
+# * =================
+
+def period_to_dict(period: LuckPeriod) -> dict:
+    return {
+        "ordinal": period.ordinal,
+        "pillar": pillars.SIXTY_PILLARS[period.pillar],
+        "start_date": period.start_date,
+        "end_date": period.end_date,
+    }
+
+
+def timeline(db: Session, profile_id: str) -> List[LuckPeriod]:
+    return db.query(LuckPeriod).filter(LuckPeriod.profile_id == profile_id).order_by(LuckPeriod.ordinal).all()
+
+
+def events_in_pillar(db: Session, pillar: int, skip: int = 0, limit: int = 100) -> List[Tuple[LifeEvent, LuckPeriod]]:
+    """Analyzed life events, across all profiles, dated inside a luck period of ``pillar``."""
+    return (
+        db.query(LifeEvent, LuckPeriod)
+        .join(LuckPeriod, (LuckPeriod.profile_id == LifeEvent.profile_id)
+              & (LifeEvent.event_date >= LuckPeriod.start_date)
+              & (LifeEvent.event_date < LuckPeriod.end_date))
+        .filter(LuckPeriod.pillar == pillar)
+        .order_by(LifeEvent.event_date, LifeEvent.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
@@ -0,0 +1,310 @@
+"""Background SQLite maintenance: vacuum, statistics, WAL checkpoints, housekeeping.
+
+Deleting profiles and rewriting life-event JSON leaves free pages behind,
+planner statistics go stale as tables grow, and the WAL file grows until it
+is checkpointed. A daemon thread, started with the app, runs these jobs for
+every tenant shard on their own intervals:
+- wal_checkpoint: a PASSIVE checkpoint (never waits on readers or writers).
+  When nothing was written since the previous run, the database counts as
+  idle and the WAL file is also truncated.
+- incremental_vacuum: returns free pages to the filesystem VACUUM_STEP_PAGES
+  at a time until the freelist is empty or VACUUM_BUDGET_SECONDS is used
+  up. Writers get the database between steps.
+- optimize: ``ANALYZE`` with a row limit when a shard has no statistics
+  yet, ``PRAGMA optimize`` afterwards.
+- compact_change_log and purge_idempotency_keys: drop superseded change-log
+  entries (sync.compact) and expired idempotency keys.
+
+Incremental vacuum needs ``auto_vacuum = INCREMENTAL``. New databases get
+it from the connection setup in database.py. Older files need one full
+VACUUM, which rewrites the file and holds the write lock throughout, so the
+scheduler never runs it: convert them with ``python maintenance.py
+convert`` during a quiet period.
+
+/api/admin/maintenance needs X-Admin-Token (BAZINGSE_ADMIN_TOKEN), like
+the backup endpoints.
+
+Usage:
+    cd api
+    python maintenance.py status [--tenant T]
+    python maintenance.py run JOB [--tenant T]     # or "all"
+    python maintenance.py convert [--tenant T]     # one-off full VACUUM
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from database import DEFAULT_TENANT, get_sessionmaker, init_db, list_tenants, tenant_path
+import idempotency
+import sync
+
+
+ENABLED = os.environ.get("BAZINGSE_MAINTENANCE", "1") != "0"
+TICK_SECONDS = 30.0
+BUSY_TIMEOUT = 5.0           # Seconds a maintenance statement waits for a lock
+TRUNCATE_BUSY_MS = 100       # Truncating waits for readers; give up quickly instead
+
+VACUUM_STEP_PAGES = 256
+VACUUM_BUDGET_SECONDS = 0.5
+VACUUM_STEP_PAUSE = 0.01
+ANALYSIS_LIMIT = 1000        # Rows sampled per index by ANALYZE
+
+# Job name -> seconds between runs
+INTERVALS = {
+    "wal_checkpoint": 60,
+    "incremental_vacuum": 15 * 60,
+    "optimize": 6 * 3600,
+    "compact_change_log": 24 * 3600,
+    "purge_idempotency_keys": 24 * 3600,
+}
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()  # One maintenance job at a time per process
+_status: Dict[str, Dict[str, dict]] = {}
+_wal_frames: Dict[str, int] = {}  # WAL size seen by the previous checkpoint, per tenant
+
+
+def _connect(tenant: str) -> sqlite3.Connection:
+    # Autocommit, so every PRAGMA and vacuum step is its own short transaction
+    return sqlite3.connect(tenant_path(tenant), timeout=BUSY_TIMEOUT, isolation_level=None,
+                           check_same_thread=False)
+
+
+def _pragma(conn: sqlite3.Connection, name: str):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+# * =================
+# * JOBS
+# * =================
+
+def wal_checkpoint(tenant: str) -> dict:
+    """Checkpoint the WAL without blocking; truncate it when nobody is using the database."""
+    conn = _connect(tenant)
+    try:
+        if _pragma(conn, "journal_mode") != "wal":
+            return {"skipped": "not in WAL mode"}
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        # An unchanged, fully copied WAL means no writes since the last run
+        idle = not busy and log_frames == checkpointed and log_frames == _wal_frames.get(tenant)
+        _wal_frames[tenant] = log_frames
+        mode = "PASSIVE"
+        if idle and log_frames:
+            conn.execute(f"PRAGMA busy_timeout = {TRUNCATE_BUSY_MS}")
+            busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            mode = "TRUNCATE"
+            _wal_frames[tenant] = log_frames
+        return {"mode": mode, "busy": bool(busy), "wal_frames": log_frames,
+                "checkpointed": checkpointed, "idle": idle}
+    finally:
+        conn.close()
+
+
+def _convert_auto_vacuum(conn: sqlite3.Connection) -> dict:
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return {"converted": True, "auto_vacuum": _AUTO_VACUUM_MODES[_pragma(conn, "auto_vacuum")]}
+
+
+def incremental_vacuum(tenant: str, budget: float = VACUUM_BUDGET_SECONDS) -> dict:
+    """Release free pages in small steps within ``budget`` seconds."""
+    conn = _connect(tenant)
+    try:
+        if _pragma(conn, "auto_vacuum") != 2:
+            return {"skipped": "auto_vacuum is not incremental; run python maintenance.py convert"}
+
+        started = time.monotonic()
+        free_before = _pragma(conn, "freelist_count")
+        free = free_before
+        while free and time.monotonic() - started < budget:
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+            free = _pragma(conn, "freelist_count")
+            time.sleep(VACUUM_STEP_PAUSE)
+        return {"pages_released": free_before - free, "free_pages_left": free}
+    finally:
+        conn.close()
+
+
+def optimize(tenant: str) -> dict:
+    """Refresh planner statistics with a bounded ANALYZE."""
+    conn = _connect(tenant)
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if has_stats:
+            conn.execute("PRAGMA optimize")
+            return {"ran": "PRAGMA optimize"}
+        conn.execute("ANALYZE")
+        return {"ran": "ANALYZE"}
+    finally:
+        conn.close()
+
+
+def compact_change_log(tenant: str) -> dict:
+    db = get_sessionmaker(tenant)()
+    try:
+        return {"removed": sync.compact(db)}
+    finally:
+        db.close()
+
+
+def purge_idempotency_keys(tenant: str) -> dict:
+    db = get_sessionmaker(tenant)()
+    try:
+        return {"removed": idempotency.purge_expired(db)}
+    finally:
+        db.close()
+
+
+JOBS: Dict[str, Callable[[str], dict]] = {
+    "wal_checkpoint": wal_checkpoint,
+    "incremental_vacuum": incremental_vacuum,
+    "optimize": optimize,
+    "compact_change_log": compact_change_log,
+    "purge_idempotency_keys": purge_idempotency_keys,
+}
+
+
+def run_job(name: str, tenant: str = DEFAULT_TENANT) -> dict:
+    """Run one job now and record its outcome; errors are recorded, not raised."""
+    job = JOBS[name]
+    started = time.monotonic()
+    record = {"last_run": datetime.utcnow().isoformat(), "result": None, "error": None}
+    with _lock:
+        try:
+            record["result"] = job(tenant)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+    record["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    record["_finished"] = time.monotonic()
+    _status.setdefault(tenant, {})[name] = record
+    return {key: value for key, value in record.items() if not key.startswith("_")}
+
+
+def run_due(tenants: Optional[List[str]] = None) -> List[str]:
+    """Run every job whose interval has elapsed; returns "tenant:job" for each run."""
+    ran = []
+    now = time.monotonic()
+    for tenant in tenants if tenants is not None else list_tenants():
+        if not os.path.exists(tenant_path(tenant)):
+            continue
+        for name, interval in INTERVALS.items():
+            last = _status.get(tenant, {}).get(name)
+            if last is None or now - last["_finished"] >= interval:
+                run_job(name, tenant)
+                ran.append(f"{tenant}:{name}")
+            if _stop.is_set():
+                return ran
+    return ran
+
+
+# * =================
+# * STATUS
+# * =================
+
+def status(tenant: str = DEFAULT_TENANT) -> dict:
+    """File size, free pages and the last run of each job for one tenant."""
+    path = tenant_path(tenant)
+    conn = _connect(tenant)
+    try:
+        page_size = _pragma(conn, "page_size")
+        free_pages = _pragma(conn, "freelist_count")
+        info = {
+            "tenant": tenant,
+            "file_size_bytes": os.path.getsize(path),
+            "wal_size_bytes": os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") else 0,
+            "page_size": page_size,
+            "page_count": _pragma(conn, "page_count"),
+            "free_pages": free_pages,
+            "free_bytes": free_pages * page_size,
+            "journal_mode": _pragma(conn, "journal_mode"),
+            "auto_vacuum": _AUTO_VACUUM_MODES.get(_pragma(conn, "auto_vacuum"), "unknown"),
+        }
+    finally:
+        conn.close()
+    jobs = _status.get(tenant, {})
+    info["jobs"] = {
+        name: (
+            {key: value for key, value in jobs[name].items() if not key.startswith("_")}
+            if name in jobs else None
+        )
+        for name in JOBS
+    }
+    info["scheduler_running"] = _thread is not None
+    return info
+
+
+# * =================
+# * SCHEDULER
+# * =================
+
+def _scheduler_loop():
+    while not _stop.wait(TICK_SECONDS):
+        try:
+            run_due()
+        except Exception as e:
+            print(f"Maintenance error: {type(e).__name__}: {e}")
+
+
+def start_scheduler():
+    """Start the maintenance thread (no-op if disabled or already running)."""
+    global _thread
+    if _thread or not ENABLED:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_scheduler_loop, name="maintenance-scheduler", daemon=True)
+    _thread.start()
+
+
+def stop_scheduler(timeout: float = 5.0):
+    global _thread
+    _stop.set()
+    if _thread:
+        _thread.join(timeout)
+        _thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite maintenance jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    status_cmd = commands.add_parser("status", help="Show file size, free pages and modes")
+    status_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+
+    run_cmd = commands.add_parser("run", help="Run a job now")
+    run_cmd.add_argument("job", choices=[*JOBS, "all"])
+    run_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+
+    convert_cmd = commands.add_parser("convert", help="Switch to incremental auto-vacuum (full VACUUM)")
+    convert_cmd.add_argument("--tenant", default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    init_db()
+
+    if args.command == "status":
+        for key, value in status(args.tenant).items():
+            if key != "jobs":
+                print(f"{key:18s} {value}")
+    elif args.command == "run":
+        for name in JOBS if args.job == "all" else [args.job]:
+            print(f"{name}: {run_job(name, args.tenant)}")
+    else:
+        conn = _connect(args.tenant)
+        try:
+            print(_convert_auto_vacuum(conn))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,18 @@ Includes:
 - BaZiPattern: Pattern definitions with validation statistics
 - EventPatternLink: Many-to-many linking events to patterns
 - PatternStatistics: Accuracy tracking per pattern per domain
+- ProfileChart: Computed pillars per profile
+- LuckPeriod: Dated ten-year luck pillars per profile
+- BatchJob: Progress and resume cursor for batch recomputes
+- AnalysisJob: Queue entries for background life-event analysis
+- ChartCache: Chart results shared by profiles with the same fingerprint
+- ChangeLog: Ordered feed of profile and life-event changes for delta sync
+- IdempotencyKey: Stored responses of create requests, replayed on retry
 """
 
 from sqlalchemy import (
     Column, String, DateTime, JSON, Float, Integer, Boolean,
-    ForeignKey, Text, Enum as SQLEnum
+    ForeignKey, Index, Text, Enum as SQLEnum
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -38,6 +45,28 @@ class EventSentiment(enum.Enum):
     NEUTRAL = "neutral"
 
 
+class BatchJobStatus(enum.Enum):
+    """Lifecycle of a batch recompute job."""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class AnalysisJobStatus(enum.Enum):
+    """Lifecycle of a queued life-event analysis."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ChangeOp(enum.Enum):
+    """Kind of change recorded in the change log."""
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
 class EventSeverity(enum.Enum):
     """Event severity levels."""
     MINOR = "minor"
@@ -61,13 +90,26 @@ class Profile(Base):
     birth_time = Column(String, nullable=True)   # HH:MM format or NULL for unknown
     gender = Column(String, nullable=False)      # "male" or "female"
     place_of_birth = Column(String, nullable=True)  # City/location string
+    birth_latitude = Column(Float, nullable=True)   # Resolved from place_of_birth, see gazetteer.resolve
+    birth_longitude = Column(Float, nullable=True)
+    birth_timezone = Column(String, nullable=True)  # IANA zone name
     phone = Column(String, nullable=True)  # Mobile/WhatsApp number
+    phone_key = Column(String, nullable=True, index=True)  # Normalized phone, see phones.normalize
+    phone_reversed = Column(String, nullable=True, index=True)  # phone_key digits reversed, for suffix lookups
     life_events = Column(JSON, nullable=True, default=list)  # Legacy: Array of life event objects
+    chart_fingerprint = Column(String, nullable=True, index=True)  # See chart_cache.chart_fingerprint
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every write
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     # Relationships
     events = relationship("LifeEvent", back_populates="profile", cascade="all, delete-orphan")
+    chart = relationship("ProfileChart", back_populates="profile", uselist=False, cascade="all, delete-orphan")
+    luck_periods = relationship("LuckPeriod", cascade="all, delete-orphan",
+                                order_by="LuckPeriod.ordinal")
+
+    # Every UPDATE/DELETE checks and bumps version (optimistic concurrency)
+    __mapper_args__ = {"version_id_col": version}
 
     def to_dict(self):
         """Convert model to dictionary."""
@@ -80,6 +122,7 @@ class Profile(Base):
             "place_of_birth": self.place_of_birth,
             "phone": self.phone,
             "life_events": self.life_events or [],
+            "version": self.version,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -100,6 +143,8 @@ class LifeEvent(Base):
     """
 
     __tablename__ = "life_events"
+    # Per-profile date ranges (luck-pillar joins, timelines)
+    __table_args__ = (Index("ix_life_events_profile_date", "profile_id", "event_date"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     profile_id = Column(String, ForeignKey("profiles.id"), nullable=False)
@@ -145,6 +190,8 @@ class LifeEvent(Base):
             "event_description": self.event_description,
             "sentiment": self.sentiment.value if self.sentiment else None,
             "severity": self.severity.value if self.severity else None,
+            "analysis_snapshot": self.analysis_snapshot,
+            "auto_detected_patterns": self.auto_detected_patterns,
             "user_validated": self.user_validated,
             "user_notes": self.user_notes,
             "created_at": self.created_at.isoformat() if self.created_at else None,
@@ -227,7 +274,7 @@ class EventPatternLink(Base):
     __tablename__ = "event_pattern_links"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    event_id = Column(String, ForeignKey("life_events.id"), nullable=False)
+    event_id = Column(String, ForeignKey("life_events.id"), nullable=False, index=True)
     pattern_id = Column(String, ForeignKey("bazi_patterns.id"), nullable=False)
 
     # Link metadata
@@ -342,3 +389,252 @@ class PatternStatistics(Base):
 
         from datetime import datetime
         self.last_calculated = datetime.utcnow()
+
+
+# =============================================================================
+# PROFILE CHART MODEL
+# =============================================================================
+
+class ProfileChart(Base):
+    """
+    Computed four pillars for a profile.
+
+    Written in bulk by the batch recompute job (see batch.py).
+    """
+
+    __tablename__ = "profile_charts"
+
+    profile_id = Column(String, ForeignKey("profiles.id"), primary_key=True)
+    pillars = Column(JSON, nullable=True)  # {"year": "Jia Zi", ...}
+    error = Column(String, nullable=True)  # Set when the birth data could not be computed
+    job_id = Column(String, ForeignKey("batch_jobs.id"), nullable=True)
+    computed_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    profile = relationship("Profile", back_populates="chart")
+
+    def to_dict(self):
+        """Convert model to dictionary."""
+        return {
+            "profile_id": self.profile_id,
+            "pillars": self.pillars,
+            "error": self.error,
+            "job_id": self.job_id,
+            "computed_at": self.computed_at.isoformat() if self.computed_at else None,
+        }
+
+
+# =============================================================================
+# LUCK PERIOD MODEL
+# =============================================================================
+
+class LuckPeriod(Base):
+    """
+    One ten-year luck pillar (Da Yun) of a profile.
+
+    Rebuilt from birth data and gender whenever those change (see luck.py).
+    Dates are YYYY-MM-DD like LifeEvent.event_date with an exclusive end,
+    so an event falls in a period when start_date <= event_date < end_date.
+    """
+
+    __tablename__ = "luck_periods"
+    __table_args__ = (Index("ix_luck_periods_pillar_start", "pillar", "start_date"),)
+
+    profile_id = Column(String, ForeignKey("profiles.id"), primary_key=True)
+    ordinal = Column(Integer, primary_key=True)  # 0 = first luck pillar
+    pillar = Column(Integer, nullable=False)  # Sexagenary index 0-59
+    start_date = Column(String, nullable=False)
+    end_date = Column(String, nullable=False)
+
+    def to_dict(self):
+        """Convert model to dictionary."""
+        return {
+            "profile_id": self.profile_id,
+            "ordinal": self.ordinal,
+            "pillar": self.pillar,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+        }
+
+
+# =============================================================================
+# BATCH JOB MODEL
+# =============================================================================
+
+class BatchJob(Base):
+    """
+    Batch chart recompute over all stored profiles.
+
+    Profiles are processed in primary-key order; ``cursor`` holds the last
+    profile ID whose result has been written, so an interrupted job resumes
+    from there.
+    """
+
+    __tablename__ = "batch_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = Column(SQLEnum(BatchJobStatus), default=BatchJobStatus.PENDING)
+    chunk_size = Column(Integer, nullable=False)
+    workers = Column(Integer, nullable=True)  # None = one per CPU
+
+    # Progress
+    total_profiles = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    cursor = Column(String, nullable=True)  # Last profile ID written
+    elapsed_seconds = Column(Float, default=0.0)  # Accumulated across resumes
+    error = Column(Text, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        """Convert model to dictionary."""
+        throughput = self.processed / self.elapsed_seconds if self.elapsed_seconds else None
+        return {
+            "id": self.id,
+            "status": self.status.value if self.status else None,
+            "chunk_size": self.chunk_size,
+            "workers": self.workers,
+            "total_profiles": self.total_profiles,
+            "processed": self.processed,
+            "failed": self.failed,
+            "cursor": self.cursor,
+            "elapsed_seconds": self.elapsed_seconds,
+            "profiles_per_second": round(throughput, 1) if throughput else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# =============================================================================
+# ANALYSIS JOB MODEL
+# =============================================================================
+
+class AnalysisJob(Base):
+    """
+    Queue entry for background analysis of one life event.
+
+    Created by the CRUD layer when an event is added, changed or deleted and
+    consumed by analysis_worker. ``available_at`` doubles as retry backoff
+    and as the lease of a running job: a job whose worker died becomes
+    claimable again once the lease expires.
+    """
+
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    profile_id = Column(String, nullable=False)
+    event_id = Column(String, nullable=False, index=True)
+
+    status = Column(SQLEnum(AnalysisJobStatus), default=AnalysisJobStatus.PENDING, index=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, server_default=func.now())
+
+    # Timestamps
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        """Convert model to dictionary."""
+        return {
+            "id": self.id,
+            "profile_id": self.profile_id,
+            "event_id": self.event_id,
+            "status": self.status.value if self.status else None,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "last_error": self.last_error,
+            "available_at": self.available_at.isoformat() if self.available_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# =============================================================================
+# CHART CACHE MODEL
+# =============================================================================
+
+class ChartCache(Base):
+    """
+    Chart result keyed by chart fingerprint.
+
+    Every profile with the same Profile.chart_fingerprint shares one row.
+    """
+
+    __tablename__ = "chart_cache"
+
+    fingerprint = Column(String, primary_key=True)
+    chart = Column(JSON, nullable=False)  # {"code": packed pillars.Chart}
+    created_at = Column(DateTime, server_default=func.now())
+
+
+# =============================================================================
+# CHANGE LOG MODEL
+# =============================================================================
+
+class ChangeLog(Base):
+    """
+    One change to a profile or life event, in commit order.
+
+    Written by the CRUD layer in the same transaction as the change itself.
+    ``seq`` is the sync token: SQLite serializes writers, so sequence order
+    is commit order and a client that has seen ``seq`` N has seen every
+    change up to N. Deletes stay in the log as tombstones.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}  # Never reuse a seq after compaction
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)  # "profile" or "life_event"
+    entity_id = Column(String, nullable=False, index=True)
+    profile_id = Column(String, nullable=False)
+    op = Column(SQLEnum(ChangeOp), nullable=False)
+    changed_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        """Convert model to dictionary."""
+        return {
+            "seq": self.seq,
+            "entity": self.entity,
+            "entity_id": self.entity_id,
+            "profile_id": self.profile_id,
+            "op": self.op.value if self.op else None,
+            "changed_at": self.changed_at.isoformat() if self.changed_at else None,
+        }
+
+
+# =============================================================================
+# IDEMPOTENCY KEY MODEL
+# =============================================================================
+
+class IdempotencyKey(Base):
+    """
+    Client-supplied Idempotency-Key of a create request and its response.
+
+    The row is claimed (``status_code`` NULL) before the request runs and
+    completed with the response afterwards; a retry with the same key gets
+    the stored response instead of creating another row.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)  # sha256 of method, path and body
+
+    status_code = Column(Integer, nullable=True)  # NULL while the request is in flight
+    response_body = Column(JSON, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,299 @@
+"""Content negotiation: MessagePack, compression and fast JSON.
+
+Responses follow the request's headers:
+- ``Accept: application/msgpack`` gets MessagePack instead of JSON. The
+  endpoint's content is packed directly; there is no JSON round trip.
+- ``Accept-Encoding`` picks zstd, br or gzip for bodies of at least
+  MIN_COMPRESS_SIZE bytes, in that order of preference among what the
+  client accepts and what is installed.
+- JSON without a response model is encoded with orjson when available.
+  Response-model endpoints keep FastAPI's own Rust serializer.
+
+Request bodies may use the same formats: ``Content-Type:
+application/msgpack`` and ``Content-Encoding: gzip|br|zstd``. Decompressed
+bodies are capped at MAX_BODY_BYTES.
+
+msgpack, brotli, zstandard and orjson are optional. Without them the
+matching format is not offered and JSON/gzip still work.
+"""
+
+import gzip
+import json
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi import routing as fastapi_routing
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+MIN_COMPRESS_SIZE = 1024
+# Larger bodies are compressed off the event loop
+THREADPOOL_COMPRESS_SIZE = 256 * 1024
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+# Scope flag: the body was MessagePack and is presented to FastAPI as JSON
+_MSGPACK_BODY = "bazingse.msgpack_body"
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(body: bytes):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class FastJSONResponse(Response):
+    """JSONResponse encoded with orjson (stdlib json as fallback)."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class MsgPackResponse(Response):
+    """Response packed straight from the endpoint's content."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+# * =================
+# * HEADER PARSING
+# * =================
+
+def _weighted(header: Optional[str]) -> List[Tuple[str, float]]:
+    """Parse a comma-separated header with ;q= weights into (token, q) pairs."""
+    items = []
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q))
+    return items
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """Whether Accept ranks MessagePack at least as high as JSON."""
+    if msgpack is None:
+        return False
+    weights = _weighted(accept)
+    msgpack_q = max((q for token, q in weights if token in MSGPACK_TYPES), default=0.0)
+    json_q = max((q for token, q in weights if token in ("application/json", "application/*", "*/*")), default=0.0)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def available_encodings() -> List[str]:
+    """Supported codings in server preference order."""
+    return [name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if module]
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best coding the client accepts, or None for identity."""
+    weights = dict(_weighted(accept_encoding))
+    best, best_q = None, 0.0
+    for name in available_encodings():
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+# * =================
+# * CODECS
+# * =================
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _read_bounded(reader, chunk_size: int = 1024 * 1024) -> bytes:
+    """Read a decompressing stream up to MAX_BODY_BYTES + 1 bytes."""
+    chunks, size = [], 0
+    while size <= MAX_BODY_BYTES:
+        chunk = reader.read(min(chunk_size, MAX_BODY_BYTES + 1 - size))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    """Undo a request Content-Encoding, refusing bodies that inflate past MAX_BODY_BYTES."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding not in ("gzip", "x-gzip") and not (encoding == "br" and brotli) \
+            and not (encoding == "zstd" and zstandard):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    # Every codec stops one byte past the cap, so a small bomb never inflates in full
+    try:
+        if encoding == "br":
+            data = brotli.Decompressor().process(body, output_buffer_limit=MAX_BODY_BYTES + 1)
+        elif encoding == "zstd":
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = _read_bounded(reader)
+        else:
+            data = zlib.decompressobj(wbits=31).decompress(body, MAX_BODY_BYTES + 1)
+    except Exception as e:  # zlib.error, brotli.error, zstandard.ZstdError
+        raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+    if len(data) > MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return data
+
+
+# * =================
+# * ROUTE INTEGRATION
+# * =================
+
+class NegotiatedRequest(Request):
+    """Request whose body is decompressed and whose json() also reads MessagePack."""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_decoded_body"):
+            self._decoded_body = decompress(await super().body(), self.headers.get("content-encoding"))
+        return self._decoded_body
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            if self.scope.get(_MSGPACK_BODY):
+                self._json = msgpack.unpackb(body, raw=False)
+            else:
+                self._json = loads(body)
+        return self._json
+
+
+def _request_scope(request: Request) -> dict:
+    """Present MessagePack bodies as JSON so FastAPI parses them through json()."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in MSGPACK_TYPES:
+        return request.scope
+    if msgpack is None:
+        raise HTTPException(status_code=415, detail="MessagePack is not supported by this server")
+    headers = [
+        (name, b"application/json" if name == b"content-type" else value)
+        for name, value in request.scope["headers"]
+    ]
+    return {**request.scope, "headers": headers, _MSGPACK_BODY: True}
+
+
+async def encode_response(response: Response, accept: Optional[str], accept_encoding: Optional[str]) -> Response:
+    """Compress a buffered response, packing it as MessagePack if still JSON.
+
+    Content rendered by the route is already MessagePack when the client asked
+    for it; the JSON re-pack only covers responses an endpoint built itself.
+    """
+    body = getattr(response, "body", None)
+    if not body:
+        return response  # Streaming, file or empty responses pass through
+
+    response.headers.append("Vary", "Accept, Accept-Encoding")
+    content_type = response.headers.get("content-type", "")
+    if content_type.startswith("application/json") and wants_msgpack(accept):
+        body = msgpack.packb(loads(body), use_bin_type=True)
+        response.headers["content-type"] = MSGPACK_MEDIA_TYPE
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding and "content-encoding" not in response.headers:
+        if len(body) >= THREADPOOL_COMPRESS_SIZE:
+            body = await run_in_threadpool(compress, body, encoding)
+        else:
+            body = compress(body, encoding)
+        response.headers["content-encoding"] = encoding
+
+    response.body = body
+    response.headers["content-length"] = str(len(body))
+    return response
+
+
+def _route_settings(route: APIRoute):
+    """The object APIRoute.get_route_handler reads its settings from.
+
+    Newer FastAPI builds handlers for included routes from a per-inclusion
+    context instead of the route itself.
+    """
+    context_var = getattr(fastapi_routing, "_effective_route_context_var", None)
+    context = context_var.get() if context_var is not None else None
+    if context is not None and getattr(context, "original_route", None) is route:
+        return context
+    return route
+
+
+class NegotiatedRoute(APIRoute):
+    """APIRoute that decodes request bodies and negotiates response encoding.
+
+    Routes on the default response class get a second handler rendering
+    MessagePack, chosen per request from Accept.
+    """
+
+    def get_route_handler(self) -> Callable:
+        original = super().get_route_handler()
+        packed = None
+        settings = _route_settings(self)
+        if msgpack is not None and isinstance(settings.response_class, DefaultPlaceholder):
+            default = settings.response_class
+            settings.response_class = MsgPackResponse
+            try:
+                packed = super().get_route_handler()
+            finally:
+                settings.response_class = default
+
+        async def handler(request: Request) -> Response:
+            accept = request.headers.get("accept")
+            negotiated = NegotiatedRequest(_request_scope(request), request.receive)
+            route_handler = packed if packed is not None and wants_msgpack(accept) else original
+            response = await route_handler(negotiated)
+            return await encode_response(response, accept, request.headers.get("accept-encoding"))
+
+        return handler
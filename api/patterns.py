@@ -0,0 +1,92 @@
+"""Branch-pair pattern detection between natal and transit pillars.
+
+Pattern IDs, names and categories match the TypeScript pattern engine
+(src/lib/bazi/pattern-engine/patterns), so EventPatternLink rows written
+here line up with BaZiPattern rows used by the frontend.
+"""
+
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from models import BaZiPattern, EventSentiment
+from pillars import EARTHLY_BRANCHES, Chart
+
+
+# (pattern_id, category, chinese_name, english_name, is_positive)
+BRANCH_PAIR_PATTERNS = [
+    ("CLASH~Zi-Wu~opposite", "clash", "子午沖", "Rat-Horse Clash", False),
+    ("CLASH~Chou-Wei~same", "clash", "丑未沖", "Ox-Goat Clash", False),
+    ("CLASH~Yin-Shen~opposite", "clash", "寅申沖", "Tiger-Monkey Clash", False),
+    ("CLASH~Mao-You~opposite", "clash", "卯酉沖", "Rabbit-Rooster Clash", False),
+    ("CLASH~Chen-Xu~same", "clash", "辰戌沖", "Dragon-Dog Clash", False),
+    ("CLASH~Si-Hai~opposite", "clash", "巳亥沖", "Snake-Pig Clash", False),
+    ("SIX_HARMONIES~Zi-Chou~Earth", "six_harmonies", "子丑合土", "Rat-Ox Harmony (Earth)", True),
+    ("SIX_HARMONIES~Yin-Hai~Wood", "six_harmonies", "寅亥合木", "Tiger-Pig Harmony (Wood)", True),
+    ("SIX_HARMONIES~Mao-Xu~Fire", "six_harmonies", "卯戌合火", "Rabbit-Dog Harmony (Fire)", True),
+    ("SIX_HARMONIES~Chen-You~Metal", "six_harmonies", "辰酉合金", "Dragon-Rooster Harmony (Metal)", True),
+    ("SIX_HARMONIES~Si-Shen~Water", "six_harmonies", "巳申合水", "Snake-Monkey Harmony (Water)", True),
+    ("SIX_HARMONIES~Wu-Wei~Fire", "six_harmonies", "午未合火", "Horse-Goat Harmony (Fire)", True),
+    ("HARM~Zi-Wei~", "harm", "子未害", "Rat-Goat Harm", False),
+    ("HARM~Chou-Wu~", "harm", "丑午害", "Ox-Horse Harm", False),
+    ("HARM~Yin-Si~", "harm", "寅巳害", "Tiger-Snake Harm", False),
+    ("HARM~Mao-Chen~", "harm", "卯辰害", "Rabbit-Dragon Harm", False),
+    ("HARM~Shen-Hai~", "harm", "申亥害", "Monkey-Pig Harm", False),
+    ("HARM~You-Xu~", "harm", "酉戌害", "Rooster-Dog Harm", False),
+    ("DESTRUCTION~Zi-You~", "destruction", "子酉破", "Rat-Rooster Destruction", False),
+    ("DESTRUCTION~Chou-Chen~", "destruction", "丑辰破", "Ox-Dragon Destruction", False),
+    ("DESTRUCTION~Mao-Wu~", "destruction", "卯午破", "Rabbit-Horse Destruction", False),
+    ("DESTRUCTION~Wei-Xu~", "destruction", "未戌破", "Goat-Dog Destruction", False),
+    ("DESTRUCTION~Si-Shen~", "destruction", "巳申破", "Snake-Monkey Destruction", False),
+    ("DESTRUCTION~Hai-Yin~", "destruction", "亥寅破", "Pig-Tiger Destruction", False),
+]
+
+# [branch_a][branch_b] -> pattern IDs, branches as 0-11 codes (symmetric)
+_PAIR_TABLE: List[List[List[str]]] = [[[] for _ in range(12)] for _ in range(12)]
+for _pattern in BRANCH_PAIR_PATTERNS:
+    _a, _b = (EARTHLY_BRANCHES.index(name) for name in _pattern[0].split("~")[1].split("-"))
+    _PAIR_TABLE[_a][_b].append(_pattern[0])
+    if _a != _b:
+        _PAIR_TABLE[_b][_a].append(_pattern[0])
+
+# Pillar order used for the distance between a natal and a transit pillar
+PILLAR_ORDER = ["year", "month", "day", "hour"]
+
+
+def detect_branch_patterns(natal: Chart, transit: Chart) -> List[dict]:
+    """
+    Find branch-pair patterns formed between natal and transit pillars.
+
+    Returns one dict per (pattern, natal pillar, transit pillar).
+    """
+    natal_branches = [(PILLAR_ORDER.index(key), key, index % 12) for key, index in natal.items()]
+    found = []
+    for transit_key, transit_index in transit.items():
+        transit_position = PILLAR_ORDER.index(transit_key)
+        row = _PAIR_TABLE[transit_index % 12]
+        for natal_position, natal_key, natal_branch in natal_branches:
+            for pattern_id in row[natal_branch]:
+                found.append({
+                    "pattern_id": pattern_id,
+                    "natal_pillar": natal_key,
+                    "transit_pillar": transit_key,
+                    "distance": abs(natal_position - transit_position),
+                })
+    return found
+
+
+def ensure_patterns(db: Session):
+    """Insert BaZiPattern rows for every branch-pair pattern that is missing."""
+    existing = {row[0] for row in db.query(BaZiPattern.id)}
+    for pattern_id, category, chinese_name, english_name, is_positive in BRANCH_PAIR_PATTERNS:
+        if pattern_id in existing:
+            continue
+        db.add(BaZiPattern(
+            id=pattern_id,
+            category=category,
+            chinese_name=chinese_name,
+            english_name=english_name,
+            participants=pattern_id.split("~")[1].split("-"),
+            is_positive=is_positive,
+            default_sentiment=EventSentiment.POSITIVE if is_positive else EventSentiment.NEGATIVE,
+        ))
@@ -0,0 +1,113 @@
+"""Normalized phone keys for looking clients up by their WhatsApp number.
+
+``Profile.phone`` stays exactly as typed ("+62 811-1234-5678",
+"0811 1234 5678", "6281112345678@s.whatsapp.net"). On every write the CRUD
+layer also stores a canonical E.164-style key ("+6281112345678") in
+``phone_key``, and the key's digits reversed in ``phone_reversed``. Both
+columns are indexed:
+- an exact lookup is an index equality on phone_key;
+- a suffix lookup ("the number ends in 12345678") is a prefix range on
+  phone_reversed, so it also uses the index instead of scanning.
+
+Numbers without a country code are read as national numbers of
+DEFAULT_COUNTRY_CODE, with a leading trunk 0 dropped.
+"""
+
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import Profile
+
+
+DEFAULT_COUNTRY_CODE = os.environ.get("BAZINGSE_PHONE_COUNTRY_CODE", "62")
+MIN_DIGITS = 7               # Anything shorter is not a phone number
+MAX_DIGITS = 15              # E.164 limit, country code included
+MIN_SUFFIX_DIGITS = 6        # Shorter suffixes match too many clients to be useful
+
+_NON_DIGITS = re.compile(r"\D")
+# Reversed keys are digits only; ":" sorts right after "9", closing the prefix range
+_RANGE_END = ":"
+
+
+def normalize(raw: Optional[str]) -> Optional[str]:
+    """Canonical "+<country code><number>" key for a phone number, or None if it is not one."""
+    if not raw:
+        return None
+    raw = raw.split("@", 1)[0].strip()  # WhatsApp JIDs: "<number>@s.whatsapp.net"
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]  # International dialing prefix
+    elif digits.startswith("0"):
+        digits = DEFAULT_COUNTRY_CODE + digits[1:]  # National number with trunk prefix
+    elif not (digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) >= MIN_DIGITS + len(DEFAULT_COUNTRY_CODE)):
+        digits = DEFAULT_COUNTRY_CODE + digits  # National number without trunk prefix
+    if not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+        return None
+    return "+" + digits
+
+
+def reversed_key(key: Optional[str]) -> Optional[str]:
+    return key[:0:-1] if key else None
+
+
+def apply(profile: Profile):
+    """Set the lookup columns from ``profile.phone``."""
+    profile.phone_key = normalize(profile.phone)
+    profile.phone_reversed = reversed_key(profile.phone_key)
+
+
+def backfill(conn) -> int:
+    """Fill phone_key for rows written before it existed; returns the number of rows."""
+    rows = conn.execute(text(
+        "SELECT id, phone FROM profiles WHERE phone IS NOT NULL AND phone != '' AND phone_key IS NULL"
+    )).fetchall()
+    values = []
+    for row in rows:
+        key = normalize(row.phone)
+        if key:
+            values.append({"id": row.id, "key": key, "reversed": reversed_key(key)})
+    if values:
+        conn.execute(
+            text("UPDATE profiles SET phone_key = :key, phone_reversed = :reversed WHERE id = :id"),
+            values,
+        )
+    return len(values)
+
+
+# * =================
+# * LOOKUP
+# * =================
+
+def find(db: Session, raw: str, limit: int = 20) -> Tuple[Optional[str], List[Profile], List[Profile]]:
+    """
+    Profiles matching a phone number: (key, exact matches, suffix matches).
+
+    Exact matches compare normalized keys. Suffix matches compare the last
+    digits typed, so "1234 5678" or a number saved without its country code
+    still finds the client; exact matches are not repeated there.
+    """
+    key = normalize(raw)
+    exact = (
+        db.query(Profile).filter(Profile.phone_key == key).order_by(Profile.created_at).limit(limit).all()
+        if key else []
+    )
+
+    digits = _NON_DIGITS.sub("", raw.split("@", 1)[0])
+    # The trunk 0 of a national number is not part of the stored key
+    suffix_digits = digits.lstrip("0")
+    suffix = []
+    if len(suffix_digits) >= MIN_SUFFIX_DIGITS:
+        prefix = suffix_digits[::-1]
+        query = db.query(Profile).filter(
+            Profile.phone_reversed >= prefix, Profile.phone_reversed < prefix + _RANGE_END
+        )
+        if key:
+            query = query.filter(Profile.phone_key != key)
+        suffix = query.order_by(Profile.phone_reversed).limit(limit).all()
+    return key, exact, suffix
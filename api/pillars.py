@@ -0,0 +1,215 @@
+"""Four Pillars (year, month, day, hour) calculation.
+
+Year and month pillars come from the solar-term index in ``solar_terms``, so
+Lichun and Jie boundaries are resolved to the minute. The day pillar starts
+at 23:00 (Zi hour of the next day). Unknown birth time is evaluated at 00:00
+and omits the hour pillar, matching the TypeScript chart generator.
+
+Internally a chart is a ``Chart``: four sexagenary indices (0-59) that pack
+into a 24-bit integer. Stem (index % 10) and branch (index % 12) checks are
+integer math. "Jia Zi" strings are produced only at the API edge
+(``Chart.to_strings``).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from solar_terms import datetime_to_jd, solar_month_at
+
+
+HEAVENLY_STEMS = ["Jia", "Yi", "Bing", "Ding", "Wu", "Ji", "Geng", "Xin", "Ren", "Gui"]
+EARTHLY_BRANCHES = ["Zi", "Chou", "Yin", "Mao", "Chen", "Si", "Wu", "Wei", "Shen", "You", "Xu", "Hai"]
+
+SIXTY_PILLARS = [f"{HEAVENLY_STEMS[i % 10]} {EARTHLY_BRANCHES[i % 12]}" for i in range(60)]
+PILLAR_INDEX: Dict[str, int] = {name: i for i, name in enumerate(SIXTY_PILLARS)}
+
+PILLAR_KEYS = ("year", "month", "day", "hour")
+
+
+# * =================
+# * COMPACT CHART
+# * =================
+
+class Chart:
+    """
+    Four pillars as sexagenary indices (0-59), None where not known.
+
+    ``code`` packs them into 24 bits, six per pillar from year down to hour,
+    with 63 marking an absent pillar. Two charts are equal when their codes
+    are, and the code is what gets stored (snapshots, chart cache).
+    """
+
+    __slots__ = PILLAR_KEYS
+
+    ABSENT = 63
+    PACKED_SIZE = 3
+
+    def __init__(self, year: Optional[int] = None, month: Optional[int] = None,
+                 day: Optional[int] = None, hour: Optional[int] = None):
+        self.year = year
+        self.month = month
+        self.day = day
+        self.hour = hour
+
+    @property
+    def code(self) -> int:
+        code = 0
+        for key in PILLAR_KEYS:
+            index = getattr(self, key)
+            code = (code << 6) | (self.ABSENT if index is None else index)
+        return code
+
+    @classmethod
+    def from_code(cls, code: int) -> "Chart":
+        indices = []
+        for _ in PILLAR_KEYS:
+            index = code & 63
+            indices.append(None if index == cls.ABSENT else index)
+            code >>= 6
+        return cls(*reversed(indices))
+
+    def pack(self) -> bytes:
+        return self.code.to_bytes(self.PACKED_SIZE, "big")
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "Chart":
+        return cls.from_code(int.from_bytes(data, "big"))
+
+    @classmethod
+    def from_strings(cls, strings: Dict[str, str]) -> "Chart":
+        """Parse a {"year": "Jia Zi", ...} dict (legacy stored format)."""
+        return cls(**{key: PILLAR_INDEX[name] for key, name in strings.items()})
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """(pillar name, index) for every known pillar, year first."""
+        for key in PILLAR_KEYS:
+            index = getattr(self, key)
+            if index is not None:
+                yield key, index
+
+    def stem(self, key: str) -> Optional[int]:
+        index = getattr(self, key)
+        return None if index is None else index % 10
+
+    def branch(self, key: str) -> Optional[int]:
+        index = getattr(self, key)
+        return None if index is None else index % 12
+
+    def to_strings(self) -> Dict[str, str]:
+        """Render as {"year": "Jia Zi", ...}, omitting unknown pillars."""
+        return {key: SIXTY_PILLARS[index] for key, index in self.items()}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Chart) and self.code == other.code
+
+    def __hash__(self) -> int:
+        return self.code
+
+    def __repr__(self) -> str:
+        return f"Chart({', '.join(f'{key}={index}' for key, index in self.items())})"
+
+
+def to_chart(value) -> Chart:
+    """Accept a Chart, a packed code or a legacy {"year": "Jia Zi", ...} dict."""
+    if isinstance(value, Chart):
+        return value
+    if isinstance(value, int):
+        return Chart.from_code(value)
+    return Chart.from_strings(value)
+
+
+def sexagenary(stem: int, branch: int) -> int:
+    """Position (0-59) of a stem/branch pair in the Jia Zi cycle."""
+    return (6 * stem - 5 * branch) % 60
+
+
+def year_index(solar_year: int) -> int:
+    """Sexagenary index of a Lichun-based solar year (1984 = Jia Zi)."""
+    return (solar_year - 1984) % 60
+
+
+def month_index(solar_year: int, month_offset: int) -> int:
+    """Sexagenary index of a Jie month; 1900 Yin month is Wu Yin (14)."""
+    return ((solar_year - 1900) * 12 + month_offset + 14) % 60
+
+
+def day_index(moment: datetime) -> int:
+    """Sexagenary index of the civil day containing ``moment`` (no 23:00 rule)."""
+    return (moment.toordinal() + 14) % 60
+
+
+def hour_index(day: int, hour: int) -> int:
+    """Sexagenary index of the two-hour block starting at ``hour`` of ``day``."""
+    branch = ((hour + 1) // 2) % 12
+    stem = ((day % 10) % 5 * 2 + branch) % 10
+    return sexagenary(stem, branch)
+
+
+def pillar_indices(moment: datetime, has_time: bool = True) -> dict:
+    """
+    Compute sexagenary indices (0-59) for each pillar at a local moment.
+
+    Returns a dict with ``year``, ``month``, ``day`` and, when ``has_time``,
+    ``hour`` keys.
+    """
+    solar_year, month_offset = solar_month_at(datetime_to_jd(moment))
+
+    day_moment = moment
+    if has_time and moment.hour >= 23:
+        day_moment = moment + timedelta(days=1)
+    day = day_index(day_moment)
+
+    result = {
+        "year": year_index(solar_year),
+        "month": month_index(solar_year, month_offset),
+        "day": day,
+    }
+    if has_time:
+        result["hour"] = hour_index(day, moment.hour)
+    return result
+
+
+def chart_at(moment: datetime, has_time: bool = True) -> Chart:
+    """Compact chart of a local moment (hour pillar only when ``has_time``)."""
+    return Chart(**pillar_indices(moment, has_time))
+
+
+def parse_birth(birth_date: str, birth_time: Optional[str]) -> Tuple[int, int, int, Optional[int], Optional[int]]:
+    """Split stored YYYY-MM-DD / HH:MM strings into get_pillars arguments."""
+    year, month, day = (int(part) for part in birth_date.split("-"))
+    hour = minute = None
+    if birth_time:
+        hour, minute = (int(part) for part in birth_time.split(":"))
+    return year, month, day, hour, minute
+
+
+def compute_chart(
+    year: int,
+    month: int,
+    day: int,
+    hour: Optional[int] = None,
+    minute: Optional[int] = None,
+) -> Chart:
+    """Compute the four pillars as a compact Chart (hour omitted if unknown)."""
+    return chart_at(datetime(year, month, day, hour or 0, minute or 0), hour is not None)
+
+
+def chart_for(birth_date: str, birth_time: Optional[str] = None) -> Chart:
+    """Compute the compact chart from stored YYYY-MM-DD / HH:MM strings."""
+    return compute_chart(*parse_birth(birth_date, birth_time))
+
+
+def get_pillars(
+    year: int,
+    month: int,
+    day: int,
+    hour: Optional[int] = None,
+    minute: Optional[int] = None,
+) -> dict:
+    """Compute the four pillars as "Stem Branch" strings (hour omitted if unknown)."""
+    return compute_chart(year, month, day, hour, minute).to_strings()
+
+
+def get_pillars_for(birth_date: str, birth_time: Optional[str] = None) -> dict:
+    """Compute the four pillars from stored YYYY-MM-DD / HH:MM strings."""
+    return get_pillars(*parse_birth(birth_date, birth_time))
@@ -1,18 +1,136 @@
 
-from typing import List
-from fastapi import APIRouter, Query, Depends, HTTPException
+import hmac
+import os
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Header, Query, Depends, HTTPException, Request, Response
+from fastapi.datastructures import Default
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from database import get_db, init_db
-from schemas import ProfileCreate, ProfileUpdate, ProfileResponse, LifeEventCreate, LifeEventUpdate, LifeEvent
+from database import (
+    fan_out, get_db, get_sessionmaker, get_tenant, init_db, tenant_of, valid_tenant, DEFAULT_TENANT, UnknownTenant,
+)
+from schemas import ProfileCreate, ProfileUpdate, ProfileResponse, LifeEventCreate, LifeEventUpdate, LifeEvent, BatchRequest
+import admission
+import almanac
+import analysis_worker
+import backup
+from chart_cache import chart_fingerprint, get_chart
+import batch
+import bulk
+import change_stream
+import coalesce
 import crud
+import gazetteer
+import idempotency
+import luck
+import maintenance
+import negotiation
+import phones
+import pillars
+import solar_terms
+import sync
 
 
 # * =================
 # * API ENDPOINTS
 # * =================
 
-router = APIRouter()
+# Responses negotiate MessagePack and compression; Default() keeps FastAPI's
+# response-model fast path while plain dicts go through orjson
+router = APIRouter(
+    route_class=negotiation.NegotiatedRoute,
+    default_response_class=Default(negotiation.FastJSONResponse),
+)
+
+
+def invalidate_profile(db: Session, profile_id: str):
+    """Stop later reads from joining computations started before a write."""
+    tenant = tenant_of(db)
+    coalesce.profiles.forget((tenant, profile_id))
+    coalesce.charts.forget((tenant, profile_id))
+    coalesce.charts.forget((tenant, profile_id, "solar"))
+    coalesce.profile_lists.clear()
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Profile version from an If-Match header ("3", "\"3\"" or W/"3"); None for absent or *."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def version_conflict(e: crud.VersionConflict) -> HTTPException:
+    """409 carrying the profile's current state so the client can merge and retry."""
+    return HTTPException(status_code=409, detail={
+        "message": str(e),
+        "current": e.profile.to_dict() if e.profile else None,
+    })
+
+
+def set_etag(response: Response, version: int):
+    response.headers["ETag"] = f'"{version}"'
+
+
+# Admin endpoints that can read or replace a whole database need this token
+ADMIN_TOKEN = os.environ.get("BAZINGSE_ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for privileged admin endpoints; they do not exist (404) unless ADMIN_TOKEN is set."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid X-Admin-Token")
+
+
+async def run_idempotent(
+    request: Request, db: Session, key: Optional[str], status_code: int, create, serialize=None
+):
+    """
+    Run a create handler at most once per Idempotency-Key.
+
+    Without a key ``create()`` just runs. With one, ``create()`` and storing
+    its response share one transaction (crud.transaction), a retry of a
+    completed request replays the stored response (marked
+    Idempotent-Replayed), and a failed attempt releases the key so the retry
+    runs again.
+    """
+    if key is None:
+        return create()
+
+    body = await request.body()
+    try:
+        stored = idempotency.claim(db, key, request.method, request.url.path, body)
+    except idempotency.IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if stored:
+        if negotiation.wants_msgpack(request.headers.get("accept")):
+            response_class = negotiation.MsgPackResponse
+        else:
+            response_class = negotiation.FastJSONResponse
+        return response_class(
+            stored.response_body, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"}
+        )
+
+    try:
+        with crud.transaction(db):
+            result = create()
+            payload = jsonable_encoder(serialize(result) if serialize else result)
+            idempotency.complete(db, key, status_code, payload)
+    except idempotency.IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception:
+        idempotency.release(db, key)
+        raise
+    return payload
 
 
 # * =================
@@ -21,14 +139,26 @@ router = APIRouter()
 
 @router.on_event("startup")
 async def startup():
-    """Initialize database on startup."""
+    """Initialize database and start background analysis workers, scheduled backups and maintenance."""
     init_db()
+    analysis_worker.start_workers()
+    backup.start_scheduler()
+    maintenance.start_scheduler()
+
+
+@router.on_event("shutdown")
+async def shutdown():
+    """Stop background analysis workers, scheduled backups, maintenance and the change stream."""
+    analysis_worker.stop_workers()
+    backup.stop_scheduler()
+    maintenance.stop_scheduler()
+    await change_stream.stop_all()
 
 
 @router.post("/seed", status_code=201)
 async def seed_database(db: Session = Depends(get_db)):
     """Seed the database with test profiles."""
-    from models import Profile
+    from models import ChangeOp, Profile
     import uuid
 
     # Check if profiles already exist
@@ -70,8 +200,11 @@ async def seed_database(db: Session = Depends(get_db)):
             birth_date=preset["date"],
             birth_time=preset["time"],
             gender=preset["gender"],
+            chart_fingerprint=chart_fingerprint(preset["date"], preset["time"], preset["gender"]),
         )
+        luck.rebuild(profile)
         db.add(profile)
+        sync.record_change(db, sync.PROFILE, profile.id, profile.id, ChangeOp.UPSERT)
 
     db.commit()
     return {"message": f"Successfully seeded {len(TEST_PRESETS)} profiles."}
@@ -81,57 +214,185 @@ async def seed_database(db: Session = Depends(get_db)):
 async def list_profiles(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=10000),
-    db: Session = Depends(get_db)
+    tenant: str = Depends(get_tenant)
 ):
     """List all profiles."""
-    profiles = crud.get_profiles(db, skip=skip, limit=limit)
-    return profiles
+    # Coalesced loaders are shared by every waiting request, so they open their own session
+    def load():
+        with get_sessionmaker(tenant)() as db:
+            return [profile.to_dict() for profile in crud.get_profiles(db, skip=skip, limit=limit)]
+
+    return await coalesce.profile_lists.do((tenant, skip, limit), load)
 
 
 @router.post("/profiles", response_model=ProfileResponse, status_code=201)
 async def create_profile(
     profile_data: ProfileCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Create a new profile."""
-    profile = crud.create_profile(db, profile_data)
-    return profile
+    """Create a new profile (retry-safe with an Idempotency-Key header)."""
+    def create():
+        profile = crud.create_profile(db, profile_data)
+        coalesce.profile_lists.clear()
+        return profile
+
+    return await run_idempotent(request, db, idempotency_key, 201, create, ProfileResponse.model_validate)
+
+
+@router.get("/profiles/duplicates")
+async def list_duplicate_profiles(
+    min_count: int = Query(2, ge=2),
+    db: Session = Depends(get_db)
+):
+    """Report groups of profiles sharing a chart fingerprint (likely duplicates)."""
+    from sqlalchemy import func
+    from models import Profile
+
+    groups = (
+        db.query(Profile.chart_fingerprint, func.count(Profile.id))
+        .filter(Profile.chart_fingerprint.isnot(None))
+        .group_by(Profile.chart_fingerprint)
+        .having(func.count(Profile.id) >= min_count)
+        .order_by(func.count(Profile.id).desc())
+        .all()
+    )
+    fingerprints = [fingerprint for fingerprint, _ in groups]
+    members = {}
+    for profile in db.query(Profile).filter(Profile.chart_fingerprint.in_(fingerprints)).order_by(Profile.created_at):
+        members.setdefault(profile.chart_fingerprint, []).append({
+            "id": profile.id,
+            "name": profile.name,
+            "birth_date": profile.birth_date,
+            "birth_time": profile.birth_time,
+            "gender": profile.gender,
+            "phone": profile.phone,
+        })
+    return {
+        "groups": [
+            {"fingerprint": fingerprint, "count": count, "profiles": members.get(fingerprint, [])}
+            for fingerprint, count in groups
+        ]
+    }
+
+
+@router.get("/profiles/by_phone")
+async def find_profiles_by_phone(
+    phone: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Profiles with a phone number, as typed or as a WhatsApp ID.
+
+    ``exact`` holds profiles whose normalized number equals the query.
+    ``suffix`` holds profiles whose number ends in the digits typed
+    (at least phones.MIN_SUFFIX_DIGITS).
+    """
+    key, exact, suffix = phones.find(db, phone, limit)
+    return {
+        "phone": phone,
+        "key": key,
+        "exact": [profile.to_dict() for profile in exact],
+        "suffix": [profile.to_dict() for profile in suffix],
+    }
 
 
 @router.get("/profiles/{profile_id}", response_model=ProfileResponse)
 async def get_profile(
     profile_id: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    tenant: str = Depends(get_tenant)
 ):
     """Get a single profile by ID."""
-    profile = crud.get_profile(db, profile_id)
+    def load():
+        with get_sessionmaker(tenant)() as db:
+            profile = crud.get_profile(db, profile_id)
+            return profile.to_dict() if profile else None
+
+    profile = await coalesce.profiles.do((tenant, profile_id), load)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
+    set_etag(response, profile["version"])
     return profile
 
 
+@router.get("/profiles/{profile_id}/chart")
+async def get_profile_chart(
+    profile_id: str,
+    solar_time: bool = Query(False, description="Correct the birth time to true solar time at the place of birth"),
+    tenant: str = Depends(get_tenant)
+):
+    """Get a profile's chart, shared with every profile of the same fingerprint."""
+    def load():
+        with get_sessionmaker(tenant)() as db:
+            profile = crud.get_profile(db, profile_id)
+            if not profile:
+                raise HTTPException(status_code=404, detail="Profile not found")
+            birth_date, birth_time, fingerprint, correction = (
+                profile.birth_date, profile.birth_time, profile.chart_fingerprint, None
+            )
+            if solar_time:
+                if profile.birth_timezone is None:
+                    raise HTTPException(status_code=400, detail="Place of birth is not in the gazetteer")
+                birth_date, birth_time, correction = gazetteer.solar_birth(
+                    birth_date, birth_time, profile.birth_longitude, profile.birth_timezone
+                )
+                fingerprint = chart_fingerprint(birth_date, birth_time, profile.gender)
+            try:
+                chart = get_chart(db, birth_date, birth_time, profile.gender, fingerprint)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            db.commit()
+            result = {
+                "profile_id": profile.id,
+                "fingerprint": fingerprint,
+                "pillars": chart.to_strings(),
+                "code": chart.code,
+            }
+            if solar_time:
+                result["solar_time"] = {"birth_date": birth_date, "birth_time": birth_time, "correction": correction}
+            return result
+
+    key = (tenant, profile_id, "solar") if solar_time else (tenant, profile_id)
+    return await coalesce.charts.do(key, load)
+
+
 @router.put("/profiles/{profile_id}", response_model=ProfileResponse)
 async def update_profile(
     profile_id: str,
     profile_data: ProfileUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Update an existing profile."""
-    profile = crud.update_profile(db, profile_id, profile_data)
+    """Update an existing profile; If-Match or a body version makes it conditional."""
+    try:
+        profile = crud.update_profile(db, profile_id, profile_data, parse_if_match(if_match))
+    except crud.VersionConflict as e:
+        raise version_conflict(e)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
+    invalidate_profile(db, profile_id)
+    set_etag(response, profile.version)
     return profile
 
 
 @router.delete("/profiles/{profile_id}", status_code=204)
 async def delete_profile(
     profile_id: str,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """Delete a profile."""
-    success = crud.delete_profile(db, profile_id)
+    try:
+        success = crud.delete_profile(db, profile_id, parse_if_match(if_match))
+    except crud.VersionConflict as e:
+        raise version_conflict(e)
     if not success:
         raise HTTPException(status_code=404, detail="Profile not found")
+    invalidate_profile(db, profile_id)
     return None
 
 
@@ -143,13 +404,23 @@ async def delete_profile(
 async def create_life_event(
     profile_id: str,
     event_data: LifeEventCreate,
+    request: Request,
+    if_match: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Create a new life event for a profile."""
-    event = crud.add_life_event(db, profile_id, event_data)
-    if not event:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    return event
+    """Create a new life event for a profile (retry-safe with an Idempotency-Key header)."""
+    def create():
+        try:
+            event = crud.add_life_event(db, profile_id, event_data, parse_if_match(if_match))
+        except crud.VersionConflict as e:
+            raise version_conflict(e)
+        if not event:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        invalidate_profile(db, profile_id)
+        return event
+
+    return await run_idempotent(request, db, idempotency_key, 201, create)
 
 
 @router.get("/profiles/{profile_id}/life_events/{event_id}", response_model=LifeEvent)
@@ -170,23 +441,495 @@ async def update_life_event(
     profile_id: str,
     event_id: str,
     event_data: LifeEventUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Update a life event."""
-    event = crud.update_life_event(db, profile_id, event_id, event_data)
+    """Update a life event; If-Match is checked against the profile version."""
+    try:
+        event = crud.update_life_event(db, profile_id, event_id, event_data, parse_if_match(if_match))
+    except crud.VersionConflict as e:
+        raise version_conflict(e)
     if not event:
         raise HTTPException(status_code=404, detail="Life event not found")
+    invalidate_profile(db, profile_id)
     return event
 
 
+@router.get("/profiles/{profile_id}/life_events/{event_id}/analysis")
+async def get_life_event_analysis(
+    profile_id: str,
+    event_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the background analysis status, snapshot and pattern links of a life event."""
+    from models import AnalysisJob, LifeEvent as LifeEventModel
+
+    job = db.query(AnalysisJob).filter(
+        AnalysisJob.profile_id == profile_id, AnalysisJob.event_id == event_id
+    ).order_by(AnalysisJob.created_at.desc()).first()
+    event = db.query(LifeEventModel).filter(
+        LifeEventModel.profile_id == profile_id, LifeEventModel.id == event_id
+    ).first()
+    if not job and not event:
+        raise HTTPException(status_code=404, detail="Life event analysis not found")
+    event_data = event.to_dict() if event else None
+    if event_data:
+        event_data["analysis_snapshot"] = analysis_worker.render_snapshot(event_data["analysis_snapshot"])
+    return {
+        "job": job.to_dict() if job else None,
+        "event": event_data,
+        "pattern_links": [link.to_dict() for link in event.pattern_links] if event else [],
+    }
+
+
 @router.delete("/profiles/{profile_id}/life_events/{event_id}", status_code=204)
 async def delete_life_event(
     profile_id: str,
     event_id: str,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """Delete a life event."""
-    success = crud.delete_life_event(db, profile_id, event_id)
+    try:
+        success = crud.delete_life_event(db, profile_id, event_id, parse_if_match(if_match))
+    except crud.VersionConflict as e:
+        raise version_conflict(e)
     if not success:
         raise HTTPException(status_code=404, detail="Life event not found")
+    invalidate_profile(db, profile_id)
     return None
+
+
+# * =================
+# * MULTI-OPERATION ENDPOINT
+# * =================
+
+@router.post("/batch")
+async def run_batch(
+    batch_request: BatchRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply an ordered list of profile and life-event operations in one transaction.
+
+    All succeed with one commit, or none is applied. Later operations can
+    use "$<ref>" for IDs created earlier in the batch.
+    """
+    def create():
+        try:
+            results = bulk.run(db, batch_request.operations)
+        except bulk.BatchOperationError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.to_dict())
+        for profile_id in bulk.touched_profiles(results):
+            invalidate_profile(db, profile_id)
+        coalesce.profile_lists.clear()
+        return {"results": results}
+
+    return await run_idempotent(request, db, idempotency_key, 200, create)
+
+
+# * =================
+# * SYNC ENDPOINTS
+# * =================
+
+@router.get("/sync")
+async def get_changes(
+    since: str = Query("0", description="next_token from the previous page; 0 for a full sync"),
+    limit: int = Query(sync.DEFAULT_PAGE_SIZE, ge=1, le=sync.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Profiles and life events changed since a sync token, with tombstones for deletes."""
+    try:
+        since_seq = int(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if since_seq < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return sync.read_changes(db, since_seq, limit)
+
+
+@router.get("/sync/stream")
+async def stream_changes(
+    request: Request,
+    profile_id: Optional[List[str]] = Query(None, description="Only changes to these profiles"),
+    last_event_id: Optional[str] = Query(None, description="Resume after this seq (same as the header)"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    x_tenant_id: Optional[str] = Header(None),
+):
+    """Server-sent events for every profile and life-event change, resumable by seq."""
+    resume = last_event_id_header or last_event_id
+    try:
+        resume_seq = int(resume) if resume else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    # No session held for the stream's lifetime; only the tenant is needed
+    tenant = x_tenant_id or DEFAULT_TENANT
+    if not valid_tenant(tenant):
+        raise HTTPException(status_code=400, detail="Invalid X-Tenant-ID")
+    from starlette.concurrency import run_in_threadpool
+    try:
+        await run_in_threadpool(get_sessionmaker, tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+
+    return StreamingResponse(
+        change_stream.stream(tenant, resume_seq, set(profile_id) if profile_id else None, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# * =================
+# * PILLAR ENDPOINTS
+# * =================
+
+@router.get("/pillars")
+async def get_pillars(
+    birth_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    birth_time: Optional[str] = Query(None, pattern=r"^\d{2}:\d{2}$"),
+    place: Optional[str] = Query(None, description="Place of birth; corrects the time to true solar time"),
+):
+    """Compute the four pillars for a birth date and optional HH:MM time."""
+    correction = None
+    if place is not None:
+        resolved = gazetteer.resolve(place)
+        if resolved is None:
+            raise HTTPException(status_code=404, detail=f"Unknown place: {place}")
+        try:
+            birth_date, birth_time, correction = gazetteer.solar_birth(
+                birth_date, birth_time, resolved.longitude, resolved.timezone
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = await coalesce.pillars.do((birth_date, birth_time), pillars.get_pillars_for, birth_date, birth_time)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if place is None:
+        return result
+    return {
+        **result,
+        "solar_time": {
+            "place": resolved.to_dict(), "birth_date": birth_date, "birth_time": birth_time, "correction": correction,
+        },
+    }
+
+
+@router.get("/places")
+async def search_places(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    country: Optional[str] = Query(None, min_length=2, max_length=2, description="ISO country code"),
+):
+    """Typeahead over the offline gazetteer: places whose name starts with ``q``, most populous first."""
+    return {"query": q, "places": [place.to_dict() for place in gazetteer.search(q, limit, country)]}
+
+
+@router.get("/almanac/{year}")
+async def get_year_almanac(year: int):
+    """Every day's year/month/day pillars, hour pillars and solar terms of a year (streamed)."""
+    return await _almanac_response(year, None)
+
+
+@router.get("/almanac/{year}/{month}")
+async def get_month_almanac(year: int, month: int):
+    """One month of the year almanac (streamed)."""
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+    return await _almanac_response(year, month)
+
+
+async def _almanac_response(year: int, month: Optional[int]) -> StreamingResponse:
+    try:
+        # First request for a year builds its file; later ones only read it
+        data = await coalesce.almanacs.do(year, almanac.load, year)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        almanac.iter_json(data, month),
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
+
+
+@router.get("/profiles/{profile_id}/luck_pillars")
+async def get_luck_pillars(profile_id: str, db: Session = Depends(get_db)):
+    """A profile's stored ten-year luck pillars with their date ranges (end exclusive)."""
+    profile = crud.get_profile(db, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {
+        "profile_id": profile_id,
+        "luck_pillars": [luck.period_to_dict(period) for period in luck.timeline(db, profile_id)],
+    }
+
+
+@router.get("/luck_pillars/{pillar}/events")
+async def get_luck_pillar_events(
+    pillar: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyzed life events of every profile that happened during a luck pillar.
+
+    ``pillar`` is a name such as "Jia Zi" (or "Jia-Zi") or its index 0-59.
+    """
+    name = pillar.replace("-", " ").replace("_", " ").title()
+    index = int(pillar) if pillar.isdigit() else pillars.PILLAR_INDEX.get(name)
+    if index is None or not 0 <= index < 60:
+        raise HTTPException(status_code=404, detail=f"Unknown pillar: {pillar}")
+    rows = luck.events_in_pillar(db, index, skip, limit)
+    return {
+        "pillar": pillars.SIXTY_PILLARS[index],
+        "events": [
+            {
+                **event.to_dict(),
+                "analysis_snapshot": analysis_worker.render_snapshot(event.analysis_snapshot),
+                "luck_period": luck.period_to_dict(period),
+            }
+            for event, period in rows
+        ],
+    }
+
+
+@router.get("/solar_terms")
+async def get_solar_terms(year: int = Query(..., ge=1900, le=2100)):
+    """Exact solar-term (JieQi) boundary times for a Gregorian year."""
+    terms = await coalesce.solar_terms.do(year, solar_terms.terms_for_year, year)
+    return {"year": year, "terms": terms}
+
+
+# * =================
+# * BATCH ENDPOINTS
+# * =================
+
+@router.post("/batch/charts", status_code=202, dependencies=[Depends(require_admin)])
+async def start_chart_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    chunk_size: int = Query(batch.DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    workers: Optional[int] = Query(None, ge=1, le=64),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Start recomputing charts for every stored profile (one job at a time per tenant)."""
+    def create():
+        # One transaction, so two concurrent starts cannot both see no active job
+        with crud.transaction(db):
+            active = batch.active_job(db)
+            if active:
+                raise HTTPException(status_code=409, detail=f"Batch job {active.id} is already running")
+            job = batch.create_job(db, chunk_size=chunk_size, workers=workers)
+        background_tasks.add_task(batch.run_job, job.id, tenant=tenant_of(db))
+        return job.to_dict()
+
+    return await run_idempotent(request, db, idempotency_key, 202, create)
+
+
+@router.get("/batch/charts/{job_id}")
+async def get_chart_batch(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get progress and throughput of a batch job."""
+    from models import BatchJob
+
+    job = db.query(BatchJob).filter(BatchJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job.to_dict()
+
+
+@router.post("/batch/charts/{job_id}/resume", status_code=202, dependencies=[Depends(require_admin)])
+async def resume_chart_batch(
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Resume an interrupted batch job from its last written profile."""
+    from models import BatchJob, BatchJobStatus
+
+    job = db.query(BatchJob).filter(BatchJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if job.status == BatchJobStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Batch job already completed")
+    if batch.is_running(job):
+        raise HTTPException(status_code=409, detail="Batch job is already running")
+    active = batch.active_job(db, exclude=job.id)
+    if active:
+        raise HTTPException(status_code=409, detail=f"Batch job {active.id} is already running")
+    background_tasks.add_task(batch.run_job, job.id, tenant=tenant_of(db))
+    return job.to_dict()
+
+
+# * =================
+# * ANALYSIS JOB ENDPOINTS
+# * =================
+
+@router.get("/analysis_jobs")
+async def list_analysis_jobs(
+    status: Optional[str] = Query(None, pattern="^(pending|running|done|failed)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """List queued analysis jobs with per-status counts."""
+    from sqlalchemy import func
+    from models import AnalysisJob, AnalysisJobStatus
+
+    counts = dict(db.query(AnalysisJob.status, func.count()).group_by(AnalysisJob.status).all())
+    query = db.query(AnalysisJob)
+    if status:
+        query = query.filter(AnalysisJob.status == AnalysisJobStatus(status))
+    jobs = query.order_by(AnalysisJob.created_at.desc()).limit(limit).all()
+    return {
+        "counts": {s.value: counts.get(s, 0) for s in AnalysisJobStatus},
+        "jobs": [job.to_dict() for job in jobs],
+    }
+
+
+@router.get("/analysis_jobs/{job_id}")
+async def get_analysis_job(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the status of one analysis job."""
+    from models import AnalysisJob
+
+    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job.to_dict()
+
+
+# * =================
+# * METRICS ENDPOINTS
+# * =================
+
+@router.get("/metrics/coalescing")
+async def get_coalescing_metrics():
+    """Single-flight coalescing counters per computation type."""
+    return coalesce.stats()
+
+
+@router.get("/metrics/admission")
+async def get_admission_metrics():
+    """Admission control: active requests, queue depths and rejections per route class."""
+    return admission.stats()
+
+
+# * =================
+# * TENANT ADMIN ENDPOINTS
+# * =================
+
+@router.get("/admin/tenants", dependencies=[Depends(require_admin)])
+async def list_tenant_stats():
+    """Profile, life-event and change-log counts for every tenant shard."""
+    from sqlalchemy import func
+    from starlette.concurrency import run_in_threadpool
+    from models import LifeEvent as LifeEventModel, Profile
+
+    def count(tenant, db):
+        return {
+            "profiles": db.query(func.count(Profile.id)).scalar(),
+            "analyzed_life_events": db.query(func.count(LifeEventModel.id)).scalar(),
+            "sync_seq": sync.current_seq(db),
+        }
+
+    return {"tenants": await run_in_threadpool(fan_out, count)}
+
+
+# * =================
+# * BACKUP ENDPOINTS
+# * =================
+
+@router.get("/admin/backups", dependencies=[Depends(require_admin)])
+async def list_backups(db: Session = Depends(get_db)):
+    """Stored snapshots of the tenant's database, newest first."""
+    return {"backups": backup.list_backups(tenant_of(db))}
+
+
+@router.post("/admin/backups", status_code=201, dependencies=[Depends(require_admin)])
+async def create_backup(db: Session = Depends(get_db)):
+    """Take an online snapshot; copying yields to live requests between page steps."""
+    from starlette.concurrency import run_in_threadpool
+
+    return await run_in_threadpool(backup.create, tenant_of(db))
+
+
+@router.get("/admin/backups/{name}", dependencies=[Depends(require_admin)])
+async def download_backup(name: str, db: Session = Depends(get_db)):
+    """Stream a stored snapshot as a gzipped SQLite file."""
+    try:
+        path = backup.backup_path(tenant_of(db), name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Backup not found")
+    return FileResponse(path, media_type="application/gzip", filename=name)
+
+
+@router.post("/admin/backups/{name}/restore", dependencies=[Depends(require_admin)])
+async def restore_backup(name: str, db: Session = Depends(get_db)):
+    """Replace the tenant's database with a stored snapshot (current state is saved first)."""
+    from starlette.concurrency import run_in_threadpool
+
+    tenant = tenant_of(db)
+    try:
+        path = backup.backup_path(tenant, name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Backup not found")
+    db.close()
+    try:
+        result = await run_in_threadpool(backup.restore, path, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    coalesce.profile_lists.clear()
+    change_stream.notify(tenant)
+    return result
+
+
+# * =================
+# * MAINTENANCE ENDPOINTS
+# * =================
+
+@router.get("/admin/maintenance", dependencies=[Depends(require_admin)])
+async def get_maintenance_status(db: Session = Depends(get_db)):
+    """Database file size, free pages, journal/vacuum modes and the last run of each maintenance job."""
+    from starlette.concurrency import run_in_threadpool
+
+    return await run_in_threadpool(maintenance.status, tenant_of(db))
+
+
+@router.post("/admin/maintenance/{job}", dependencies=[Depends(require_admin)])
+async def run_maintenance_job(job: str, db: Session = Depends(get_db)):
+    """Run one maintenance job on the tenant's database now."""
+    from starlette.concurrency import run_in_threadpool
+
+    if job not in maintenance.JOBS:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job}")
+    tenant = tenant_of(db)
+    db.close()
+    return await run_in_threadpool(maintenance.run_job, job, tenant)
+
+
+@router.post("/admin/gazetteer/resolve", dependencies=[Depends(require_admin)])
+async def resolve_places_of_birth(
+    resolve_all: bool = Query(False, alias="all", description="Also re-resolve profiles that already have coordinates"),
+    db: Session = Depends(get_db)
+):
+    """Resolve the tenant's places of birth to coordinates in bulk (after a gazetteer update, use all=true)."""
+    from starlette.concurrency import run_in_threadpool
+
+    def resolve():
+        updated = gazetteer.backfill(db.connection(), resolve_all=resolve_all)
+        db.commit()
+        return {"updated": updated}
+
+    return await run_in_threadpool(resolve)
@@ -3,9 +3,14 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from admission import AdmissionMiddleware
+
 # Initialize FastAPI app
 app = FastAPI(title="BaZingSe API")
 
+# Shed load per route class; added before CORS so 503s still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # Add CORS middleware - allow all for cross-origin requests
 app.add_middleware(
     CORSMiddleware,
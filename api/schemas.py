@@ -1,7 +1,7 @@
 """Pydantic schemas for request/response validation."""
 
 from pydantic import BaseModel, Field
-from typing import Optional, Literal, List, Any
+from typing import Annotated, Optional, Literal, List, Any, Union
 from datetime import datetime
 
 
@@ -60,6 +60,7 @@ class ProfileUpdate(BaseModel):
     place_of_birth: Optional[str] = Field(None, max_length=200)
     phone: Optional[str] = Field(None, max_length=20)
     life_events: Optional[List[Any]] = Field(default=None)
+    version: Optional[int] = Field(None, ge=1)  # Only apply if the profile is still at this version
 
 
 class ProfileResponse(BaseModel):
@@ -72,8 +73,69 @@ class ProfileResponse(BaseModel):
     place_of_birth: Optional[str] = None
     phone: Optional[str] = None
     life_events: Optional[List[LifeEvent]] = None
+    version: int = 1
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
     class Config:
         from_attributes = True
+
+
+# Batch schemas: profile_id / event_id may be "$ref", naming an earlier create in the same batch
+MAX_BATCH_OPERATIONS = 500
+
+
+class BatchCreateProfile(BaseModel):
+    op: Literal["create_profile"]
+    ref: Optional[str] = Field(None, min_length=1, max_length=64)
+    data: ProfileCreate
+
+
+class BatchUpdateProfile(BaseModel):
+    op: Literal["update_profile"]
+    profile_id: str
+    version: Optional[int] = Field(None, ge=1)  # Same as If-Match
+    data: ProfileUpdate
+
+
+class BatchDeleteProfile(BaseModel):
+    op: Literal["delete_profile"]
+    profile_id: str
+    version: Optional[int] = Field(None, ge=1)
+
+
+class BatchAddLifeEvent(BaseModel):
+    op: Literal["add_life_event"]
+    ref: Optional[str] = Field(None, min_length=1, max_length=64)
+    profile_id: str
+    version: Optional[int] = Field(None, ge=1)
+    data: LifeEventCreate
+
+
+class BatchUpdateLifeEvent(BaseModel):
+    op: Literal["update_life_event"]
+    profile_id: str
+    event_id: str
+    version: Optional[int] = Field(None, ge=1)
+    data: LifeEventUpdate
+
+
+class BatchDeleteLifeEvent(BaseModel):
+    op: Literal["delete_life_event"]
+    profile_id: str
+    event_id: str
+    version: Optional[int] = Field(None, ge=1)
+
+
+BatchOperation = Annotated[
+    Union[
+        BatchCreateProfile, BatchUpdateProfile, BatchDeleteProfile,
+        BatchAddLifeEvent, BatchUpdateLifeEvent, BatchDeleteLifeEvent,
+    ],
+    Field(discriminator="op"),
+]
+
+
+class BatchRequest(BaseModel):
+    """Schema for an ordered list of operations applied in one transaction."""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
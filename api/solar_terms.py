@@ -0,0 +1,142 @@
+"""Solar-term (JieQi) boundary index.
+
+All 24 solar-term instants from 1900 to 2100 are computed once with sxtwl and
+kept as a sorted float64 array of Julian days (Beijing time) next to a
+parallel array of term IDs. Finding the term, month pillar or solar year in
+force at any instant is then a single binary search.
+
+Term IDs follow sxtwl: 0 = Dongzhi (winter solstice), 1 = Xiaohan, 3 = Lichun.
+Odd IDs are Jie (节) terms, which open a new month pillar.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import sxtwl
+
+
+INDEX_START_YEAR = 1900
+INDEX_END_YEAR = 2100
+
+# (pinyin, chinese) indexed by term ID
+SOLAR_TERMS = [
+    ("Dongzhi", "冬至"), ("Xiaohan", "小寒"), ("Dahan", "大寒"),
+    ("Lichun", "立春"), ("Yushui", "雨水"), ("Jingzhe", "惊蛰"),
+    ("Chunfen", "春分"), ("Qingming", "清明"), ("Guyu", "谷雨"),
+    ("Lixia", "立夏"), ("Xiaoman", "小满"), ("Mangzhong", "芒种"),
+    ("Xiazhi", "夏至"), ("Xiaoshu", "小暑"), ("Dashu", "大暑"),
+    ("Liqiu", "立秋"), ("Chushu", "处暑"), ("Bailu", "白露"),
+    ("Qiufen", "秋分"), ("Hanlu", "寒露"), ("Shuangjiang", "霜降"),
+    ("Lidong", "立冬"), ("Xiaoxue", "小雪"), ("Daxue", "大雪"),
+]
+
+LICHUN = 3
+
+_J2000_JD = 2451545.0
+_J2000 = datetime(2000, 1, 1, 12)
+
+# Lazily built: sorted instants (JD) and the matching term IDs
+_instants: Optional[array] = None
+_term_ids: Optional[array] = None
+_index_lock = threading.Lock()
+
+
+def datetime_to_jd(dt: datetime) -> float:
+    """Convert a naive local (Beijing) datetime to a Julian day."""
+    return _J2000_JD + (dt - _J2000).total_seconds() / 86400.0
+
+
+def jd_to_datetime(jd: float) -> datetime:
+    """Convert a Julian day to a naive datetime, rounded to the second."""
+    seconds = round((jd - _J2000_JD) * 86400.0)
+    return _J2000 + timedelta(seconds=seconds)
+
+
+def _build_index() -> Tuple[array, array]:
+    """Compute every solar-term instant covering 1900-2100."""
+    instants = array("d")
+    term_ids = array("B")
+    # The 1899 table supplies Xiaohan/Dahan/Daxue needed for early January 1900
+    for year in range(INDEX_START_YEAR - 1, INDEX_END_YEAR + 1):
+        for info in sxtwl.getJieQiByYear(year):
+            # Each yearly table ends with the next year's Lichun; skip repeats
+            if instants and info.jd <= instants[-1]:
+                continue
+            instants.append(info.jd)
+            term_ids.append(info.jqIndex)
+    return instants, term_ids
+
+
+def get_index() -> Tuple[array, array]:
+    """Return the (instants, term_ids) arrays, building them on first use."""
+    global _instants, _term_ids
+    if _instants is None:
+        with _index_lock:
+            if _instants is None:
+                _instants, _term_ids = _build_index()
+    return _instants, _term_ids
+
+
+def _position(jd: float) -> int:
+    """Index of the last term at or before ``jd``."""
+    instants, _ = get_index()
+    pos = bisect_right(instants, jd) - 1
+    if pos < 0 or pos >= len(instants) - 1:
+        raise ValueError("Instant outside the solar-term index range (1900-2100)")
+    return pos
+
+
+def term_at(jd: float) -> Tuple[int, float]:
+    """Return (term_id, instant) of the solar term in force at ``jd``."""
+    instants, term_ids = get_index()
+    pos = _position(jd)
+    return term_ids[pos], instants[pos]
+
+
+def jie_at(jd: float) -> Tuple[int, float]:
+    """Return (term_id, instant) of the Jie term governing the month at ``jd``."""
+    instants, term_ids = get_index()
+    pos = _position(jd)
+    if term_ids[pos] % 2 == 0:
+        pos -= 1
+    return term_ids[pos], instants[pos]
+
+
+def solar_month_at(jd: float) -> Tuple[int, int]:
+    """
+    Return (solar_year, month_offset) in force at ``jd``.
+
+    ``solar_year`` starts at Lichun; ``month_offset`` counts Jie months from
+    the Yin month (0) to the Chou month (11).
+    """
+    term_id, instant = jie_at(jd)
+    gregorian_year = jd_to_datetime(instant).year
+    solar_year = gregorian_year if term_id >= LICHUN else gregorian_year - 1
+    return solar_year, ((term_id - LICHUN) // 2) % 12
+
+
+def terms_between(start: datetime, end: datetime) -> List[Tuple[int, datetime]]:
+    """List (term_id, datetime) for every term with start <= instant < end."""
+    instants, term_ids = get_index()
+    lo = bisect_left(instants, datetime_to_jd(start))
+    hi = bisect_left(instants, datetime_to_jd(end))
+    return [(term_ids[i], jd_to_datetime(instants[i])) for i in range(lo, hi)]
+
+
+def terms_for_year(year: int) -> List[dict]:
+    """All solar terms falling in a Gregorian year, with exact boundary times."""
+    if not INDEX_START_YEAR <= year <= INDEX_END_YEAR:
+        raise ValueError(f"Year must be between {INDEX_START_YEAR} and {INDEX_END_YEAR}")
+    return [
+        {
+            "term_id": term_id,
+            "name": SOLAR_TERMS[term_id][0],
+            "chinese": SOLAR_TERMS[term_id][1],
+            "is_jie": term_id % 2 == 1,
+            "datetime": moment.isoformat(),
+        }
+        for term_id, moment in terms_between(datetime(year, 1, 1), datetime(year + 1, 1, 1))
+    ]
@@ -0,0 +1,205 @@
+"""Delta sync over the change log.
+
+Every write in the CRUD layer appends ChangeLog rows in its own transaction.
+A client keeps the ``seq`` of the last change it applied as its sync token
+and asks for everything after it, instead of downloading every profile again.
+
+Each page holds at most one entry per entity. That entry carries the entity's
+current state: profiles without their life events, which arrive as separate
+``life_event`` entries. Deletes come back as tombstones. Deleting a profile
+produces a single profile tombstone that implies its events.
+"""
+
+import json
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models import ChangeLog, ChangeOp, Profile
+
+
+PROFILE = "profile"
+LIFE_EVENT = "life_event"
+
+# Session.info flag: this transaction recorded changes (see change_stream)
+CHANGES_PENDING = "sync_changes_pending"
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+
+# * =================
+# * RECORDING
+# * =================
+
+def record_change(db: Session, entity: str, entity_id: str, profile_id: str, op: ChangeOp):
+    """Append one change to the log without committing."""
+    db.add(ChangeLog(entity=entity, entity_id=entity_id, profile_id=profile_id, op=op))
+    db.info[CHANGES_PENDING] = True
+
+
+def record_event_changes(db: Session, profile_id: str, old_events: Optional[Iterable[dict]],
+                         new_events: Optional[Iterable[dict]]):
+    """Log the difference between two versions of a profile's life_events array."""
+    old = {event.get("id"): event for event in old_events or [] if event.get("id")}
+    new = {event.get("id"): event for event in new_events or [] if event.get("id")}
+    for event_id, event in new.items():
+        if old.get(event_id) != event:
+            record_change(db, LIFE_EVENT, event_id, profile_id, ChangeOp.UPSERT)
+    for event_id in old.keys() - new.keys():
+        record_change(db, LIFE_EVENT, event_id, profile_id, ChangeOp.DELETE)
+
+
+# * =================
+# * READING
+# * =================
+
+def current_seq(db: Session) -> int:
+    """Seq of the newest change, 0 if the log is empty."""
+    return db.query(func.max(ChangeLog.seq)).scalar() or 0
+
+
+def high_water(conn) -> int:
+    """Largest seq ever issued, including entries removed by compaction."""
+    row = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")).first()
+    return row[0] if row else 0
+
+
+def _profile_payload(profile: Profile) -> dict:
+    payload = profile.to_dict()
+    payload.pop("life_events")
+    return payload
+
+
+def read_changes(db: Session, since: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    Return up to ``limit`` log entries after ``since`` with current state.
+
+    ``next_token`` is the seq to pass as ``since`` for the following page.
+    It advances past entries that were folded away or that are already
+    deleted (their tombstone comes later), so paging always makes progress.
+    """
+    entries: List[ChangeLog] = db.query(ChangeLog).filter(ChangeLog.seq > since) \
+        .order_by(ChangeLog.seq).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Keep only the last entry per entity within the page
+    latest = {}
+    for entry in entries:
+        latest[(entry.entity, entry.entity_id)] = entry
+
+    profile_ids = {entry.profile_id for entry in latest.values() if entry.op == ChangeOp.UPSERT}
+    profiles = {
+        profile.id: profile
+        for profile in db.query(Profile).filter(Profile.id.in_(profile_ids))
+    } if profile_ids else {}
+
+    changes = []
+    for entry in sorted(latest.values(), key=lambda e: e.seq):
+        change = {
+            "seq": entry.seq,
+            "entity": entry.entity,
+            "id": entry.entity_id,
+            "profile_id": entry.profile_id,
+            "op": entry.op.value,
+        }
+        if entry.op == ChangeOp.UPSERT:
+            profile = profiles.get(entry.profile_id)
+            if entry.entity == PROFILE:
+                data = _profile_payload(profile) if profile else None
+            else:
+                data = next(
+                    (event for event in (profile.life_events or []) if event.get("id") == entry.entity_id),
+                    None,
+                ) if profile else None
+            if data is None:
+                # Deleted since; a later tombstone covers it
+                continue
+            change["data"] = data
+        changes.append(change)
+
+    next_token = entries[-1].seq if entries else since
+    return {
+        "changes": changes,
+        "next_token": str(next_token),
+        "has_more": has_more,
+    }
+
+
+# * =================
+# * MAINTENANCE
+# * =================
+
+def compact(db: Session) -> int:
+    """
+    Drop entries superseded by a later entry for the same entity.
+
+    Safe for any outstanding token: the latest entry of every entity is
+    kept, so a client resuming from any seq still sees every entity that
+    changed after it. Returns the number of rows removed.
+    """
+    result = db.execute(text(
+        "DELETE FROM change_log WHERE seq NOT IN "
+        "(SELECT MAX(seq) FROM change_log GROUP BY entity, entity_id)"
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def entities(conn) -> List[Tuple[str, str, str]]:
+    """(entity, entity_id, profile_id) of every stored profile and event."""
+    rows = []
+    for profile_id, life_events in conn.execute(text("SELECT id, life_events FROM profiles ORDER BY rowid")):
+        rows.append((PROFILE, profile_id, profile_id))
+        for event in json.loads(life_events) if life_events else []:
+            if event.get("id"):
+                rows.append((LIFE_EVENT, event["id"], profile_id))
+    return rows
+
+
+def _insert(conn, rows: List[Tuple[str, str, str]], op: ChangeOp):
+    if rows:
+        conn.execute(
+            text("INSERT INTO change_log (entity, entity_id, profile_id, op) "
+                 f"VALUES (:entity, :entity_id, :profile_id, '{op.name}')"),
+            [{"entity": e, "entity_id": i, "profile_id": p} for e, i, p in rows],
+        )
+
+
+def backfill(conn) -> int:
+    """Seed an empty log with upserts for every existing profile and event."""
+    if conn.execute(text("SELECT 1 FROM change_log LIMIT 1")).first():
+        return 0
+    rows = entities(conn)
+    _insert(conn, rows, ChangeOp.UPSERT)
+    return len(rows)
+
+
+def rebase(conn, floor_seq: int, previous: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Re-announce everything after the database was replaced (backup restore).
+
+    New entries start above ``floor_seq``, the log's high-water mark before
+    the replacement, so tokens clients already hold stay valid: they receive
+    an upsert for every restored entity and a tombstone for every entity in
+    ``previous`` that the restored database no longer has.
+    """
+    conn.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :floor) WHERE name = 'change_log'"),
+                 {"floor": floor_seq})
+    if not conn.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = 'change_log'")).first():
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', :floor)"),
+                     {"floor": floor_seq})
+
+    restored = entities(conn)
+    present = {(entity, entity_id) for entity, entity_id, _ in restored}
+    profiles = {entity_id for entity, entity_id, _ in restored if entity == PROFILE}
+    # A profile tombstone implies its events, so only orphaned events of kept profiles need one
+    gone = [
+        (entity, entity_id, profile_id) for entity, entity_id, profile_id in previous
+        if (entity, entity_id) not in present and (entity == PROFILE or profile_id in profiles)
+    ]
+    _insert(conn, gone, ChangeOp.DELETE)
+    _insert(conn, restored, ChangeOp.UPSERT)
+    return len(gone) + len(restored)
@@ -0,0 +1,374 @@
+"""Deterministic synthetic dataset for scale testing.
+
+Builds realistic-looking profiles with life events (both the legacy JSON
+array on the profile and the normalized life_events rows, sharing IDs),
+the branch-pair BaZiPattern catalogue and EventPatternLink rows. The same
+seed always produces the same rows, IDs included, so benchmarks and index
+experiments can be compared across runs.
+
+Rows are inserted with executemany in one transaction per chunk of
+profiles, on a dedicated engine whose connections relax durability
+(synchronous=OFF), which is fine for throwaway data. The app's shared engine
+is never touched, so the build can run next to live requests and workers.
+
+Usage:
+    cd api
+    python synthetic.py --profiles 100000 --events 50
+    BAZINGSE_DATABASE_PATH=/tmp/scale.db python synthetic.py --profiles 20000 --wipe
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.sqlite import insert
+
+from chart_cache import chart_fingerprint
+from database import _create_engine, engine, init_db
+import gazetteer
+import luck
+import phones
+from models import (
+    BaZiPattern, ChangeOp, EventPatternLink, EventSentiment, EventSeverity, LifeEvent, LuckPeriod, Profile,
+    ValidationStatus,
+)
+from patterns import BRANCH_PAIR_PATTERNS
+
+
+DEFAULT_CHUNK_SIZE = 2000
+
+FIRST_NAMES = [
+    "Andi", "Budi", "Citra", "Dewi", "Eka", "Fajar", "Gita", "Hendra", "Indah", "Joko",
+    "Kevin", "Lina", "Mei", "Nanda", "Oscar", "Putri", "Rudy", "Sari", "Tono", "Wulan",
+    "Wei", "Ling", "Hui", "Jun", "Xiu", "Ming", "Fang", "Yan", "Jie", "Lan",
+]
+LAST_NAMES = [
+    "Wijaya", "Santoso", "Halim", "Tanoto", "Gunawan", "Kusuma", "Salim", "Lim", "Tan", "Chen",
+    "Wong", "Liu", "Huang", "Setiawan", "Pratama", "Hartono", "Sutanto", "Lee", "Ng", "Goh",
+]
+PLACES = [
+    "Jakarta", "Surabaya", "Medan", "Bandung", "Semarang", "Makassar", "Denpasar",
+    "Singapore", "Kuala Lumpur", "Hong Kong", "Taipei", "Shanghai", None,
+]
+
+# life_domain -> event types
+EVENT_TYPES = {
+    "career": ["promotion", "job_loss", "job_change", "business_start"],
+    "wealth": ["windfall", "major_loss", "property_purchase", "investment_gain"],
+    "health": ["illness_major", "illness_minor", "surgery", "accident"],
+    "relationship": ["marriage", "divorce", "breakup", "new_relationship"],
+    "family": ["child_birth", "parent_death", "relocation"],
+    "education": ["graduation", "exam_pass", "exam_fail"],
+}
+VALIDATION_WEIGHTS = [
+    (ValidationStatus.PENDING, 60),
+    (ValidationStatus.VALIDATED, 25),
+    (ValidationStatus.REJECTED, 10),
+    (ValidationStatus.UNCERTAIN, 5),
+]
+
+# Fixed clock so timestamps depend only on the seed
+EPOCH = datetime(2024, 1, 1)
+
+
+def _stamp(moment: Optional[datetime]) -> Optional[str]:
+    """Render a datetime the way SQLAlchemy's SQLite DateTime stores it."""
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f") if moment else None
+
+
+class Generator:
+    """
+    Deterministic row factory; every value comes from one seeded RNG.
+
+    Rows are plain tuples already in their stored form (JSON text, enum
+    names, SQLite timestamps) so they can go straight to executemany
+    without per-value type processing.
+    """
+
+    PROFILE_COLUMNS = (
+        "id", "name", "birth_date", "birth_time", "gender", "place_of_birth", "phone",
+        "life_events", "chart_fingerprint", "created_at", "updated_at", "phone_key", "phone_reversed",
+        "birth_latitude", "birth_longitude", "birth_timezone",
+    )
+    EVENT_COLUMNS = (
+        "id", "profile_id", "event_date", "life_domain", "event_type", "event_title",
+        "event_description", "sentiment", "severity", "user_validated", "created_at", "updated_at",
+    )
+    LUCK_COLUMNS = ("profile_id", "ordinal", "pillar", "start_date", "end_date")
+    LINK_COLUMNS = (
+        "id", "event_id", "pattern_id", "contribution_weight", "distance", "validation_status",
+        "system_confidence", "user_rating", "created_at", "validated_at",
+    )
+
+    def __init__(self, seed: int, events_per_profile: int, links_per_event: float):
+        self.rng = random.Random(seed)
+        self.events_per_profile = events_per_profile
+        self.links_per_event = links_per_event
+        self.pattern_ids = [pattern[0] for pattern in BRANCH_PAIR_PATTERNS]
+        self.domains = list(EVENT_TYPES)
+        self.sentiments = [member.name for member in EventSentiment]
+        self.severities = [member.name for member in EventSeverity]
+        self._statuses = [status.name for status, _ in VALIDATION_WEIGHTS]
+        self._status_weights = [weight for _, weight in VALIDATION_WEIGHTS]
+
+    def below(self, n: int) -> int:
+        """Uniform int in [0, n); cheaper than randint in the hot loop."""
+        return int(self.rng.random() * n)
+
+    def pick(self, seq):
+        return seq[int(self.rng.random() * len(seq))]
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self) -> datetime:
+        return EPOCH + timedelta(seconds=self.below(365 * 86400))
+
+    def profile(self) -> list:
+        """Profile row with an empty event list; see ``events``."""
+        birth_date = (date(1940, 1, 1) + timedelta(days=self.below(70 * 365))).isoformat()
+        birth_time = None if self.rng.random() < 0.15 else f"{self.below(24):02d}:{self.below(60):02d}"
+        gender = self.pick(("male", "female"))
+        created = _stamp(self.timestamp())
+        phone = f"+62 8{11 + self.below(89)} {1000 + self.below(9000)} {1000 + self.below(9000)}"
+        phone_key = phones.normalize(phone)
+        place_of_birth = self.pick(PLACES)
+        place = gazetteer.resolve(place_of_birth)
+        return [
+            self.uuid(),
+            f"{self.pick(FIRST_NAMES)} {self.pick(LAST_NAMES)}",
+            birth_date,
+            birth_time,
+            gender,
+            place_of_birth,
+            phone,
+            [],
+            chart_fingerprint(birth_date, birth_time, gender),
+            created,
+            created,
+            phone_key,
+            phones.reversed_key(phone_key),
+            place.latitude if place else None,
+            place.longitude if place else None,
+            place.timezone if place else None,
+        ]
+
+    def luck_periods(self, profile: list) -> List[tuple]:
+        """Luck-pillar timeline rows, computed like luck.rebuild would."""
+        periods = luck.compute_periods(profile[2], profile[3], profile[4])
+        return [(profile[0], *period) for period in periods]
+
+    def events(self, profile: list) -> List[tuple]:
+        """Event rows for one profile; the JSON entries are added to the profile row."""
+        count = self.below(2 * self.events_per_profile + 1)
+        birth_year = int(profile[2][:4])
+        first_year = min(birth_year + 5, 2030)
+        events = profile[7]
+        rows = []
+        for _ in range(count):
+            year = first_year + self.below(2031 - first_year)
+            month = 1 + self.below(12) if self.rng.random() < 0.8 else None
+            day = 1 + self.below(28) if month and self.rng.random() < 0.6 else None
+            domain = self.pick(self.domains)
+            event_type = self.pick(EVENT_TYPES[domain])
+            location = self.pick(PLACES)
+            moment = self.timestamp()
+            stamp = _stamp(moment)
+            event_id = self.uuid()
+            notes = event_type.replace("_", " ")
+
+            events.append({
+                "id": event_id,
+                "year": year,
+                "month": month,
+                "day": day,
+                "location": location,
+                "notes": notes,
+                "is_abroad": self.rng.random() < 0.1,
+                "created_at": moment.isoformat(),
+                "updated_at": moment.isoformat(),
+            })
+            rows.append((
+                event_id,
+                profile[0],
+                f"{year:04d}-{month or 1:02d}-{day or 1:02d}",
+                domain,
+                event_type,
+                location,
+                notes,
+                self.pick(self.sentiments),
+                self.pick(self.severities),
+                int(self.rng.random() < 0.3),
+                stamp,
+                stamp,
+            ))
+        return rows
+
+    def links(self, event_row: tuple) -> List[tuple]:
+        if not self.links_per_event:
+            return []
+        count = min(int(self.rng.expovariate(1 / self.links_per_event)), len(self.pattern_ids))
+        rows = []
+        for pattern_id in self.rng.sample(self.pattern_ids, count):
+            status = self.rng.choices(self._statuses, self._status_weights)[0]
+            reviewed = status != "PENDING"
+            rows.append((
+                self.uuid(),
+                event_row[0],
+                pattern_id,
+                float(1 + self.below(3)),
+                self.below(4),
+                status,
+                round(self.rng.random(), 3),
+                1 + self.below(5) if reviewed else None,
+                event_row[-1],
+                event_row[-1] if reviewed else None,
+            ))
+        return rows
+
+
+CHANGE_COLUMNS = ("entity_id", "entity", "profile_id", "op")
+
+
+def _executemany(conn, table: str, columns: tuple, rows: list):
+    if not rows:
+        return
+    placeholders = ", ".join("?" for _ in columns)
+    conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def insert_patterns(conn):
+    """Insert the branch-pair pattern catalogue, keeping rows that already exist."""
+    rows = [
+        {
+            "id": pattern_id,
+            "category": category,
+            "chinese_name": chinese_name,
+            "english_name": english_name,
+            "participants": pattern_id.split("~")[1].split("-"),
+            "is_positive": is_positive,
+            "default_sentiment": EventSentiment.POSITIVE if is_positive else EventSentiment.NEGATIVE,
+        }
+        for pattern_id, category, chinese_name, english_name, is_positive in BRANCH_PAIR_PATTERNS
+    ]
+    conn.execute(insert(BaZiPattern).on_conflict_do_nothing(index_elements=[BaZiPattern.id]), rows)
+
+
+def wipe(conn):
+    """Delete all profiles, life events and pattern links (patterns are kept)."""
+    # Tombstone every profile so delta-sync clients drop them too
+    conn.execute(text(
+        "INSERT INTO change_log (entity, entity_id, profile_id, op) "
+        f"SELECT 'profile', id, id, '{ChangeOp.DELETE.name}' FROM profiles"
+    ))
+    for table in (EventPatternLink.__table__, LifeEvent.__table__, LuckPeriod.__table__, Profile.__table__):
+        conn.execute(table.delete())
+
+
+def _fast_writes(dbapi_connection, _record):
+    dbapi_connection.execute("PRAGMA synchronous = OFF")
+
+
+def generate(
+    profiles: int,
+    events_per_profile: int = 10,
+    links_per_event: float = 1.5,
+    seed: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    bind: Optional[Engine] = None,
+) -> dict:
+    """
+    Insert a synthetic dataset and return row counts and timing.
+
+    ``events_per_profile`` and ``links_per_event`` are averages; the actual
+    counts vary per profile and event. Rows go to the database of ``bind``
+    (the default database unless given).
+    """
+    generator = Generator(seed, events_per_profile, links_per_event)
+    counts = {"profiles": 0, "life_events": 0, "event_pattern_links": 0, "luck_periods": 0}
+    started = time.monotonic()
+
+    # Own engine: the pragma must not leak onto connections of the shared one
+    build_engine = _create_engine((bind or engine).url.render_as_string(hide_password=False))
+    sa_event.listen(build_engine, "connect", _fast_writes)
+    try:
+        with build_engine.begin() as conn:
+            insert_patterns(conn)
+
+        remaining = profiles
+        while remaining > 0:
+            profile_rows, event_rows, link_rows, luck_rows = [], [], [], []
+            for _ in range(min(chunk_size, remaining)):
+                profile = generator.profile()
+                luck_rows.extend(generator.luck_periods(profile))
+                for event_row in generator.events(profile):
+                    event_rows.append(event_row)
+                    link_rows.extend(generator.links(event_row))
+                profile[7] = json.dumps(profile[7])
+                profile_rows.append(tuple(profile))
+
+            with build_engine.begin() as conn:
+                _executemany(conn, "profiles", Generator.PROFILE_COLUMNS, profile_rows)
+                _executemany(conn, "life_events", Generator.EVENT_COLUMNS, event_rows)
+                _executemany(conn, "event_pattern_links", Generator.LINK_COLUMNS, link_rows)
+                _executemany(conn, "luck_periods", Generator.LUCK_COLUMNS, luck_rows)
+                # Make the new rows visible to delta-sync clients
+                _executemany(conn, "change_log", CHANGE_COLUMNS, [
+                    *((row[0], "profile", row[0], ChangeOp.UPSERT.name) for row in profile_rows),
+                    *((row[0], "life_event", row[1], ChangeOp.UPSERT.name) for row in event_rows),
+                ])
+
+            remaining -= len(profile_rows)
+            counts["profiles"] += len(profile_rows)
+            counts["life_events"] += len(event_rows)
+            counts["event_pattern_links"] += len(link_rows)
+            counts["luck_periods"] += len(luck_rows)
+            if progress:
+                progress(counts)
+    finally:
+        build_engine.dispose()
+
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    return {
+        **counts,
+        "elapsed_seconds": round(elapsed, 2),
+        "rows_per_second": round(total / elapsed) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic dataset.")
+    parser.add_argument("--profiles", type=int, default=10_000, help="Profiles to insert")
+    parser.add_argument("--events", type=int, default=10, help="Average life events per profile")
+    parser.add_argument("--links", type=float, default=1.5, help="Average pattern links per event")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Profiles per transaction")
+    parser.add_argument("--wipe", action="store_true", help="Delete existing profiles and events first")
+    args = parser.parse_args()
+
+    init_db()
+    if args.wipe:
+        with engine.begin() as conn:
+            wipe(conn)
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+
+    def report(counts):
+        print(f"  {counts['profiles']:,} profiles, {counts['life_events']:,} events, "
+              f"{counts['event_pattern_links']:,} links", flush=True)
+
+    result = generate(args.profiles, args.events, args.links, args.seed, args.chunk_size, report)
+    rows = result["profiles"] + result["life_events"] + result["event_pattern_links"] + result["luck_periods"]
+    print(f"Inserted {rows:,} rows in {result['elapsed_seconds']}s ({result['rows_per_second']:,} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
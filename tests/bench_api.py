@@ -0,0 +1,455 @@
+"""
+Load benchmark for the BaZingSe API.
+
+Drives ``run_bazingse.app`` with scripted request mixes at a fixed
+concurrency and reports per-operation p50/p95/p99 latency and overall
+throughput. The profile table can be grown between runs (``--sizes``) to see
+how latency behaves as the client base gets larger.
+
+Targets:
+- inprocess: httpx over an ASGI transport, no sockets (default)
+- uvicorn:   spawns a local uvicorn on a free port
+- url:       an already running server (``--base-url``); no table growth
+
+Both local targets run against a throwaway SQLite file (via
+BAZINGSE_DATABASE_PATH) so the real bazingse.db is never touched.
+
+Results can be saved as a JSON baseline and later compared against it; runs
+whose p95 or throughput regress past ``--max-regression`` fail the process,
+so CI can gate on it.
+
+Usage:
+    cd api
+    python ../tests/bench_api.py                                   # balanced, 10s
+    python ../tests/bench_api.py --mix read_heavy --concurrency 32 --sizes 100,10000
+    python ../tests/bench_api.py --save-baseline bench_baseline.json
+    python ../tests/bench_api.py --baseline bench_baseline.json --max-regression 1.25
+    python ../tests/bench_api.py --target uvicorn --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import httpx
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+# Relative weights of each operation in a mix
+MIXES = {
+    "read_heavy": {
+        "list": 15, "get": 65, "create": 3, "update": 5,
+        "event_create": 6, "event_update": 5, "event_delete": 1,
+    },
+    "balanced": {
+        "list": 10, "get": 40, "create": 10, "update": 10,
+        "event_create": 15, "event_update": 10, "event_delete": 5,
+    },
+    "write_heavy": {
+        "list": 5, "get": 15, "create": 20, "update": 20,
+        "event_create": 20, "event_update": 15, "event_delete": 5,
+    },
+}
+
+WORKING_SET = 50          # Profiles created over HTTP for get/update targets
+EVENTS_PER_PROFILE = 3
+
+
+# * =================
+# * SYNTHETIC DATA
+# * =================
+
+def random_birth(rng):
+    birth_date = date(1940, 1, 1) + timedelta(days=rng.randint(0, 70 * 365))
+    birth_time = None if rng.random() < 0.15 else f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+    return birth_date.isoformat(), birth_time, rng.choice(["male", "female"])
+
+
+def random_profile(rng, index):
+    birth_date, birth_time, gender = random_birth(rng)
+    return {
+        "name": f"Bench {index}",
+        "birth_date": birth_date,
+        "birth_time": birth_time,
+        "gender": gender,
+        "place_of_birth": rng.choice(["Jakarta", "Singapore", "Taipei", "Hong Kong", None]),
+        "phone": f"+62 8{rng.randint(10, 99)} {rng.randint(1000, 9999)} {rng.randint(1000, 9999)}",
+    }
+
+
+def random_event(rng):
+    return {
+        "year": rng.randint(1960, 2030),
+        "month": rng.choice([None, rng.randint(1, 12)]),
+        "day": None,
+        "location": rng.choice(["Jakarta", "Bali", None]),
+        "notes": "Benchmark event",
+    }
+
+
+def table_size():
+    from sqlalchemy import func, select
+    from database import engine
+    from models import Profile
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Profile.__table__)).scalar()
+
+
+def grow_profiles(target, seed, events_per_profile):
+    """Bulk-insert synthetic background profiles until the table holds ``target`` rows."""
+    import synthetic
+    current = table_size()
+    if target > current:
+        # Offset the seed so each growth step adds new IDs
+        synthetic.generate(target - current, events_per_profile, seed=seed + current)
+
+
+# * =================
+# * WORKLOAD
+# * =================
+
+class Workload:
+    """Shared state of one run: known profile and event ids, recorded samples."""
+
+    def __init__(self, client, rng, total_profiles):
+        self.client = client
+        self.rng = rng
+        self.total_profiles = total_profiles
+        self.profiles = []             # Profile ids safe to read and update
+        self.events = defaultdict(list)  # profile id -> event ids
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def setup(self):
+        for i in range(WORKING_SET):
+            response = await self.client.post("/api/profiles", json=random_profile(self.rng, i))
+            response.raise_for_status()
+            profile_id = response.json()["id"]
+            self.profiles.append(profile_id)
+            for _ in range(EVENTS_PER_PROFILE):
+                response = await self.client.post(
+                    f"/api/profiles/{profile_id}/life_events", json=random_event(self.rng)
+                )
+                response.raise_for_status()
+                self.events[profile_id].append(response.json()["id"])
+
+    async def op_list(self):
+        skip = self.rng.randint(0, max(0, self.total_profiles - 100))
+        return await self.client.get("/api/profiles", params={"skip": skip, "limit": 100})
+
+    async def op_get(self):
+        return await self.client.get(f"/api/profiles/{self.rng.choice(self.profiles)}")
+
+    async def op_create(self):
+        response = await self.client.post("/api/profiles", json=random_profile(self.rng, len(self.profiles)))
+        if response.status_code == 201:
+            self.profiles.append(response.json()["id"])
+            self.total_profiles += 1
+        return response
+
+    async def op_update(self):
+        return await self.client.put(
+            f"/api/profiles/{self.rng.choice(self.profiles)}",
+            json={"place_of_birth": self.rng.choice(["Jakarta", "Surabaya", "Medan"])},
+        )
+
+    async def op_event_create(self):
+        profile_id = self.rng.choice(self.profiles)
+        response = await self.client.post(f"/api/profiles/{profile_id}/life_events", json=random_event(self.rng))
+        if response.status_code == 201:
+            self.events[profile_id].append(response.json()["id"])
+        return response
+
+    async def op_event_update(self):
+        profile_id = self.rng.choice(self.profiles)
+        if not self.events[profile_id]:
+            return await self.op_event_create()
+        event_id = self.rng.choice(self.events[profile_id])
+        return await self.client.put(
+            f"/api/profiles/{profile_id}/life_events/{event_id}", json={"notes": "Updated by benchmark"}
+        )
+
+    async def op_event_delete(self):
+        profile_id = self.rng.choice(self.profiles)
+        if not self.events[profile_id]:
+            return await self.op_event_create()
+        event_id = self.events[profile_id].pop(self.rng.randrange(len(self.events[profile_id])))
+        return await self.client.delete(f"/api/profiles/{profile_id}/life_events/{event_id}")
+
+    async def worker(self, mix, deadline, record):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = (await getattr(self, f"op_{name}")()).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if record:
+                self.latencies[name].append((time.perf_counter() - started) * 1000)
+                self.statuses[name][status] += 1
+
+    async def run(self, mix, concurrency, seconds, record=True):
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(self.worker(mix, deadline, record) for _ in range(concurrency)))
+
+
+# * =================
+# * REPORTING
+# * =================
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, statuses, elapsed):
+    def stats(values):
+        return {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(max(values), 2),
+            "mean": round(sum(values) / len(values), 2),
+        }
+
+    ops = {}
+    for name, values in sorted(latencies.items()):
+        ops[name] = stats(values)
+        ops[name]["statuses"] = {str(k): v for k, v in statuses[name].items()}
+    everything = [v for values in latencies.values() for v in values]
+    errors = sum(
+        count for counter in statuses.values() for status, count in counter.items()
+        if not isinstance(status, int) or status >= 500
+    )
+    return {
+        "requests": len(everything),
+        "errors": errors,
+        "rps": round(len(everything) / elapsed, 1),
+        "overall": stats(everything) if everything else None,
+        "ops": ops,
+    }
+
+
+def run_key(run):
+    return f"{run['mix']}|c{run['concurrency']}|n{run['profiles']}"
+
+
+def compare(runs, baseline_path, max_regression):
+    """Return regressions of p95 latency or throughput against a saved baseline."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {run_key(run): run for run in json.load(f)["runs"]}
+
+    regressions = []
+    for run in runs:
+        previous = baseline.get(run_key(run))
+        if not previous or not run["overall"] or not previous["overall"]:
+            continue
+        if run["rps"] * max_regression < previous["rps"]:
+            regressions.append(f"{run_key(run)}: throughput {previous['rps']} -> {run['rps']} req/s")
+        if run["overall"]["p95"] > previous["overall"]["p95"] * max_regression:
+            regressions.append(
+                f"{run_key(run)}: p95 {previous['overall']['p95']} -> {run['overall']['p95']} ms"
+            )
+        for name, stats in run["ops"].items():
+            before = previous["ops"].get(name)
+            # Ignore noisy ops that were barely sampled
+            if before and stats["count"] >= 50 and stats["p95"] > before["p95"] * max_regression:
+                regressions.append(f"{run_key(run)}: {name} p95 {before['p95']} -> {stats['p95']} ms")
+    return regressions
+
+
+def print_run(run):
+    print()
+    print(f"  {run['mix']} @ {run['concurrency']} concurrent, {run['profiles']:,} profiles: "
+          f"{run['requests']:,} requests, {run['rps']:,.1f} req/s, {run['errors']} errors")
+    print(f"    {'op':14s} {'count':>7s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}")
+    rows = list(run["ops"].items())
+    if run["overall"]:
+        rows.append(("overall", run["overall"]))
+    for name, stats in rows:
+        print(f"    {name:14s} {stats['count']:7,d} {stats['p50']:8.1f}ms {stats['p95']:8.1f}ms "
+              f"{stats['p99']:8.1f}ms {stats['max']:8.1f}ms")
+
+
+# * =================
+# * TARGETS
+# * =================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "run_bazingse:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env=os.environ.copy(),
+    )
+    health = f"http://127.0.0.1:{port}/health"
+    for _ in range(100):
+        try:
+            if httpx.get(health, timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"uvicorn did not become healthy at {health}")
+
+
+async def bench(args, sizes):
+    rng = random.Random(args.seed)
+    local = args.target != "url"
+    process = None
+
+    if args.target == "inprocess":
+        from run_bazingse import app
+        from database import init_db
+        import analysis_worker
+        # ASGITransport does not send lifespan events; do what startup would
+        init_db()
+        analysis_worker.start_workers(args.analysis_workers)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    elif args.target == "uvicorn":
+        from database import init_db
+        init_db()
+        os.environ["ANALYSIS_WORKERS"] = str(args.analysis_workers)
+        port = free_port()
+        process = start_uvicorn(port)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url.rstrip("/"), timeout=args.timeout)
+
+    runs = []
+    try:
+        async with client:
+            workload = Workload(client, rng, 0)
+            await workload.setup()
+            for size in sizes:
+                if local:
+                    grow_profiles(size, args.seed, args.events)
+                    workload.total_profiles = table_size()
+                if args.warmup:
+                    await workload.run(MIXES[args.mix], args.concurrency, args.warmup, record=False)
+                workload.latencies.clear()
+                workload.statuses.clear()
+
+                started = time.perf_counter()
+                await workload.run(MIXES[args.mix], args.concurrency, args.duration)
+                elapsed = time.perf_counter() - started
+
+                run = {
+                    "mix": args.mix,
+                    "concurrency": args.concurrency,
+                    "profiles": size if local else None,
+                    "duration_seconds": round(elapsed, 2),
+                    **summarize(workload.latencies, workload.statuses, elapsed),
+                }
+                print_run(run)
+                runs.append(run)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+        if args.target == "inprocess":
+            import analysis_worker
+            analysis_worker.stop_workers()
+    return runs
+
+
+# * =================
+# * MAIN
+# * =================
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the BaZingSe API.")
+    parser.add_argument("--target", choices=["inprocess", "uvicorn", "url"], default="inprocess")
+    parser.add_argument("--base-url", default="http://localhost:8008", help="Server for --target url")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="balanced")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per table size")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each run")
+    parser.add_argument("--sizes", default="1000", help="Comma-separated profile table sizes to measure at")
+    parser.add_argument("--events", type=int, default=0, help="Average life events per background profile")
+    parser.add_argument("--analysis-workers", type=int, default=2, help="Background analysis threads")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (network targets)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="SQLite file to use instead of a throwaway one")
+    parser.add_argument("--report", help="Write the full JSON report to this path")
+    parser.add_argument("--save-baseline", help="Write the runs as a baseline to this path")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.25,
+                        help="Fail if p95 grows or throughput drops by more than this factor (default: 1.25)")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    scratch = None
+    if args.target != "url":
+        if args.db:
+            os.environ["BAZINGSE_DATABASE_PATH"] = os.path.abspath(args.db)
+        else:
+            scratch = tempfile.mkdtemp(prefix="bazingse-bench-")
+            os.environ["BAZINGSE_DATABASE_PATH"] = os.path.join(scratch, "bench.db")
+
+    print(f"Benchmarking {args.target} target: {args.mix} mix, {args.concurrency} concurrent, "
+          f"{args.duration:g}s per size, sizes {sizes}")
+    try:
+        runs = asyncio.run(bench(args, sizes))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "target": args.target,
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "runs": runs,
+    }
+    for path in (args.report, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nWrote {path}")
+
+    failed = False
+    if args.baseline:
+        regressions = compare(runs, args.baseline, args.max_regression)
+        print()
+        if regressions:
+            print(f"REGRESSIONS against {args.baseline} (threshold x{args.max_regression}):")
+            for line in regressions:
+                print(f"  {line}")
+            failed = True
+        else:
+            print(f"No regressions against {args.baseline}")
+    if any(run["errors"] for run in runs):
+        print("Server errors occurred during the run")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,36 @@
 """
-Generate golden files from the Python BaZi API for migration verification.
+Generate and verify golden files for the BaZingSe API.
 
-Calls the running Python API at http://localhost:8008 and saves responses
-as JSON files. These files serve as the reference output that the TypeScript
-port must match.
+Calls the running API and saves responses as JSON files. These files serve
+as the reference output that later changes must keep matching.
+
+Cases are fetched concurrently (``--concurrency``). Every run records
+per-case latency and payload size; ``--verify`` compares live responses
+against the stored golden JSON with a structural diff instead of
+overwriting them, and can flag latency drift against a previous report.
 
 Usage:
     cd /Users/macbookair/GitHub/bazingse
     source api/.venv/bin/activate
-    python3 tests/golden/generate_golden.py
+    python3 tests/golden/generate_golden.py                        # regenerate
+    python3 tests/golden/generate_golden.py --verify               # diff only
+    python3 tests/golden/generate_golden.py --verify \
+        --baseline last_report.json --report report.json           # + perf drift
 """
 
+import argparse
+import asyncio
 import json
+import math
 import os
 import sys
+import time
 import urllib.request
 import urllib.error
 import urllib.parse
 
 API_BASE = "http://localhost:8008/api"
+HEALTH_URL = "http://localhost:8008/health"
 OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Define all test cases: (filename, endpoint, params)
@@ -166,90 +178,237 @@ TEST_CASES = [
 ]
 
 
-def fetch_endpoint(endpoint: str, params: dict) -> dict:
-    """Call the API and return the parsed JSON response."""
+def fetch_endpoint(api_base: str, endpoint: str, params: dict, timeout: float) -> bytes:
+    """Call the API and return the raw response body."""
     query_string = urllib.parse.urlencode(params)
-    url = f"{API_BASE}{endpoint}?{query_string}"
+    url = f"{api_base}{endpoint}?{query_string}"
     req = urllib.request.Request(url)
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            body = resp.read().decode("utf-8")
-            return json.loads(body)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.read()
     except urllib.error.HTTPError as e:
         body = e.read().decode("utf-8")
-        print(f"  HTTP {e.code} error for {url}")
-        print(f"  Response: {body[:500]}")
-        raise
+        raise RuntimeError(f"HTTP {e.code} for {url}: {body[:500]}") from e
     except urllib.error.URLError as e:
-        print(f"  Connection error for {url}: {e.reason}")
-        print("  Is the Python API running at http://localhost:8008?")
-        raise
+        raise RuntimeError(f"Connection error for {url}: {e.reason}") from e
+
+
+# * =================
+# * STRUCTURAL DIFF
+# * =================
+
+def structural_diff(expected, actual, path="$", float_tol=0.0, limit=50):
+    """
+    Compare two JSON values and return a list of differences.
+
+    Each difference is a dict with ``path`` (JSONPath-like), ``kind``
+    ("changed", "type", "missing", "added", "length") and the values
+    involved. Stops after ``limit`` differences.
+    """
+    diffs = []
+
+    def add(kind, p, exp=None, act=None):
+        if len(diffs) < limit:
+            diffs.append({"path": p, "kind": kind, "expected": exp, "actual": act})
+
+    def walk(exp, act, p):
+        if len(diffs) >= limit:
+            return
+        if isinstance(exp, bool) or isinstance(act, bool) or not (
+            isinstance(exp, (int, float)) and isinstance(act, (int, float))
+        ):
+            if type(exp) is not type(act):
+                add("type", p, type(exp).__name__, type(act).__name__)
+                return
+        if isinstance(exp, dict):
+            for key in exp:
+                if key not in act:
+                    add("missing", f"{p}.{key}", exp[key], None)
+                else:
+                    walk(exp[key], act[key], f"{p}.{key}")
+            for key in act:
+                if key not in exp:
+                    add("added", f"{p}.{key}", None, act[key])
+        elif isinstance(exp, list):
+            if len(exp) != len(act):
+                add("length", p, len(exp), len(act))
+            for i, (e, a) in enumerate(zip(exp, act)):
+                walk(e, a, f"{p}[{i}]")
+        elif isinstance(exp, float) or isinstance(act, float):
+            if not math.isclose(exp, act, rel_tol=float_tol, abs_tol=float_tol):
+                add("changed", p, exp, act)
+        elif exp != act:
+            add("changed", p, exp, act)
+
+    walk(expected, actual, path)
+    return diffs
+
+
+# * =================
+# * RUNNER
+# * =================
+
+async def run_case(index, case, args, semaphore):
+    """Fetch one case, then save it or diff it against the stored golden file."""
+    filename, endpoint, params = case
+    filepath = os.path.join(OUTPUT_DIR, filename)
+    result = {"case": filename, "endpoint": endpoint, "params": params}
+
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            body = await asyncio.to_thread(fetch_endpoint, args.base_url, endpoint, params, args.timeout)
+        except Exception as e:
+            result.update(status="error", error=str(e))
+            print(f"[{index:2d}/{len(TEST_CASES)}] {filename}... FAILED: {e}")
+            return result
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    result["payload_bytes"] = len(body)
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except ValueError as e:  # JSONDecodeError, UnicodeDecodeError: e.g. an HTML error page
+        result.update(status="error", error=f"Response is not JSON: {e}")
+        print(f"[{index:2d}/{len(TEST_CASES)}] {filename}... FAILED: response is not JSON ({e})")
+        return result
+
+    if args.verify:
+        if not os.path.exists(filepath):
+            result.update(status="missing_golden", diffs=[])
+        else:
+            with open(filepath, encoding="utf-8") as f:
+                golden = json.load(f)
+            diffs = structural_diff(golden, data, float_tol=args.float_tol)
+            result.update(status="ok" if not diffs else "mismatch", diffs=diffs)
+    else:
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        result["status"] = "ok"
+
+    print(f"[{index:2d}/{len(TEST_CASES)}] {filename}... {result['status'].upper()} "
+          f"({result['latency_ms']:.0f} ms, {result['payload_bytes']:,} bytes)")
+    return result
+
+
+def check_latency(results, baseline_path, max_slowdown):
+    """Mark cases slower than ``max_slowdown`` x their latency in a previous report."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["case"]: r for r in json.load(f)["cases"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["case"], {}).get("latency_ms")
+        after = result.get("latency_ms")
+        if before and after and after > before * max_slowdown:
+            result["latency_regression"] = {"baseline_ms": before, "ratio": round(after / before, 2)}
+            regressions.append(result["case"])
+    return regressions
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+async def run(args):
+    cases = [c for c in TEST_CASES if not args.cases or c[0] in args.cases]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_case(i, case, args, semaphore) for i, case in enumerate(cases, 1)
+    ))
+    wall_ms = round((time.perf_counter() - started) * 1000, 2)
+    return list(results), wall_ms
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate or verify BaZingSe golden files.")
+    parser.add_argument("--verify", action="store_true", help="Diff live responses against stored golden files")
+    parser.add_argument("--base-url", default=API_BASE, help=f"API base URL (default: {API_BASE})")
+    parser.add_argument("--health-url", default=HEALTH_URL, help=f"Health check URL (default: {HEALTH_URL})")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel requests (default: 4)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--float-tol", type=float, default=0.0, help="Tolerance for float comparisons")
+    parser.add_argument("--cases", nargs="*", help="Only run these golden files (e.g. natal_basic.json)")
+    parser.add_argument("--report", help="Write a JSON report to this path")
+    parser.add_argument("--baseline", help="Previous JSON report to compare latencies against")
+    parser.add_argument("--max-slowdown", type=float, default=1.5,
+                        help="Latency ratio over the baseline that counts as a regression (default: 1.5)")
+    args = parser.parse_args()
+
     print("=" * 60)
-    print("Golden File Generator for BaZingSe API Migration")
+    print("Golden File " + ("Verifier" if args.verify else "Generator") + " for BaZingSe API")
     print("=" * 60)
-    print(f"API base: {API_BASE}")
+    print(f"API base: {args.base_url}")
     print(f"Output dir: {OUTPUT_DIR}")
+    print(f"Concurrency: {args.concurrency}")
     print()
 
     # Check API is reachable
     try:
-        health_url = "http://localhost:8008/health"
-        with urllib.request.urlopen(health_url, timeout=5) as resp:
+        with urllib.request.urlopen(args.health_url, timeout=5) as resp:
             health = json.loads(resp.read().decode("utf-8"))
             print(f"API health check: {health}")
     except Exception as e:
-        print(f"ERROR: Cannot reach API at http://localhost:8008")
+        print(f"ERROR: Cannot reach API at {args.health_url}")
         print(f"  {e}")
         print("  Start the API with: cd api && python run_bazingse.py")
         sys.exit(1)
 
     print()
-    results = []
-    errors = []
+    results, wall_ms = asyncio.run(run(args))
+    regressions = check_latency(results, args.baseline, args.max_slowdown) if args.baseline else []
 
-    for i, (filename, endpoint, params) in enumerate(TEST_CASES, 1):
-        print(f"[{i:2d}/13] {filename}...", end=" ", flush=True)
-        filepath = os.path.join(OUTPUT_DIR, filename)
-        try:
-            data = fetch_endpoint(endpoint, params)
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            size = os.path.getsize(filepath)
-            results.append((filename, size))
-            print(f"OK ({size:,} bytes)")
-        except Exception as e:
-            errors.append((filename, str(e)))
-            print(f"FAILED: {e}")
+    latencies = [r["latency_ms"] for r in results if "latency_ms" in r]
+    failed = [r for r in results if r["status"] != "ok"]
+    summary = {
+        "mode": "verify" if args.verify else "generate",
+        "cases": len(results),
+        "passed": len(results) - len(failed),
+        "failed": len(failed),
+        "latency_regressions": regressions,
+        "wall_ms": wall_ms,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies),
+        } if latencies else None,
+        "payload_bytes_total": sum(r.get("payload_bytes", 0) for r in results),
+    }
 
     # Summary
     print()
     print("=" * 60)
     print("SUMMARY")
     print("=" * 60)
-    print(f"  Successful: {len(results)}/13")
-    print(f"  Failed:     {len(errors)}/13")
-    print()
+    print(f"  Passed:     {summary['passed']}/{summary['cases']}")
+    print(f"  Failed:     {summary['failed']}/{summary['cases']}")
+    print(f"  Wall time:  {wall_ms:,.0f} ms")
+    if summary["latency_ms"]:
+        print(f"  Latency:    p50 {summary['latency_ms']['p50']:,.0f} ms, "
+              f"p95 {summary['latency_ms']['p95']:,.0f} ms, max {summary['latency_ms']['max']:,.0f} ms")
+    print(f"  Payload:    {summary['payload_bytes_total']:,} bytes")
 
-    if results:
-        print("Generated files:")
-        total_size = 0
-        for filename, size in results:
-            print(f"  {filename:30s} {size:>10,} bytes")
-            total_size += size
-        print(f"  {'TOTAL':30s} {total_size:>10,} bytes")
-
-    if errors:
+    for result in failed:
         print()
-        print("Errors:")
-        for filename, err in errors:
-            print(f"  {filename}: {err}")
+        print(f"  {result['case']}: {result['status']}")
+        if result.get("error"):
+            print(f"    {result['error']}")
+        for diff in result.get("diffs", [])[:10]:
+            print(f"    {diff['kind']:8s} {diff['path']}: {diff['expected']!r} -> {diff['actual']!r}")
+    for case in regressions:
+        print(f"  {case}: latency regression {results[[r['case'] for r in results].index(case)]['latency_regression']}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "cases": results}, f, indent=2, ensure_ascii=False)
+        print(f"\nReport written to {args.report}")
+
+    if failed or regressions:
         sys.exit(1)
 
     print()
-    print("All golden files generated successfully.")
+    print("All golden files " + ("match." if args.verify else "generated successfully."))
 
 
 if __name__ == "__main__":
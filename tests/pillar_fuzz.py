@@ -0,0 +1,378 @@
+"""
+Differential fuzzing of pillar computation across engines.
+
+Generates dense timestamp sets, computes the four pillars with every
+available engine, and streams disagreements to an NDJSON report:
+
+- random:   uniform minutes from 1900 to 2100
+- boundary: clustered around the 23:00 day rollover and around Lichun
+- jieqi:    every minute within +/- --window minutes of every solar term
+
+Engines:
+- index:  api/pillars.py (solar-term index, bisect lookup)
+- sxtwl:  sxtwl used directly: day and hour pillars from its day lookup,
+          year and month pillars switched at the Lichun/Jie instants of its
+          JieQi table (minute-precise, unlike the day-level
+          tests/pillar_test_sxtwl.py, which switches on the calendar day)
+- lunar:  lunar_python, the Python twin of the lunar-typescript engine used
+          by the TypeScript chart generator (optional, ~10 ms per case, so
+          only practical for small sweeps)
+
+Work is sharded across a process pool. Each disagreement is then minimized
+to the contiguous run of minutes over which the engines disagree in the same
+way, so the report lists one interval per disagreeing region instead of
+every failing minute.
+
+Throughput is bound by the reference engine, not the index. sxtwl lookups
+are cached per year (JieQi table) and per day, so dense sweeps reuse them
+heavily: about 35k cases/s per core for jieqi and 17k-19k for random and
+boundary, i.e. a million cases is roughly a minute of CPU time. The lunar
+engine is not cached and stays at ~100 cases/s.
+
+Reports go to the system temp directory unless --report is given.
+
+Usage:
+    cd api
+    python ../tests/pillar_fuzz.py --mode jieqi --window 120 --report /tmp/fuzz.ndjson
+    python ../tests/pillar_fuzz.py --mode random --cases 1000000 --seed 7
+    python ../tests/pillar_fuzz.py --mode boundary --cases 2000 --engines index,lunar
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import sxtwl
+
+import pillars
+import solar_terms
+
+EPOCH = datetime(1900, 1, 1)
+FIRST_MINUTE = 0
+LAST_MINUTE = int((datetime(2100, 12, 31, 23, 59) - EPOCH).total_seconds() // 60)
+FIELDS = ("year", "month", "day", "hour")
+DEFAULT_REPORT = os.path.join(tempfile.gettempdir(), "pillar_fuzz.ndjson")
+
+
+# * =================
+# * ENGINES
+# * =================
+# Each engine maps a datetime to a (year, month, day, hour) tuple of
+# sexagenary indices (0-59).
+
+def engine_index(moment):
+    result = pillars.pillar_indices(moment, True)
+    return (result["year"], result["month"], result["day"], result["hour"])
+
+
+def _gz_index(gz):
+    return pillars.sexagenary(gz.tg, gz.dz)
+
+
+@lru_cache(maxsize=None)
+def _sxtwl_jie(year):
+    """
+    (instant, year pillar, month pillar) of each Jie in sxtwl's table for
+    ``year``, which runs from that year's Lichun to the next one. The pillars
+    are read on the day after the Jie, once sxtwl's day-level lookup has
+    switched over.
+    """
+    rows = []
+    for info in sxtwl.getJieQiByYear(year):
+        if info.jqIndex % 2 == 0:
+            continue
+        when = sxtwl.JD2DD(info.jd)
+        after = sxtwl.fromSolar(int(when.Y), int(when.M), int(when.D)).after(1)
+        rows.append((info.jd, _gz_index(after.getYearGZ()), _gz_index(after.getMonthGZ())))
+    return rows
+
+
+@lru_cache(maxsize=1 << 16)
+def _sxtwl_day(year, month, day):
+    return sxtwl.fromSolar(year, month, day)
+
+
+def engine_sxtwl(moment):
+    # Year and month switch at the exact Lichun/Jie instant, not on its calendar day
+    jd = sxtwl.toJD(sxtwl.Time(moment.year, moment.month, moment.day, moment.hour, moment.minute, 0))
+    jie = _sxtwl_jie(moment.year - 1) + _sxtwl_jie(moment.year)
+    _, year, month = jie[bisect_right(jie, jd, key=itemgetter(0)) - 1]
+
+    lunar_day = _sxtwl_day(moment.year, moment.month, moment.day)
+    day_gz = lunar_day.getDayGZ()
+    if moment.hour >= 23:
+        following = moment + timedelta(days=1)
+        day_gz = _sxtwl_day(following.year, following.month, following.day).getDayGZ()
+    return (year, month, _gz_index(day_gz), _gz_index(lunar_day.getHourGZ(moment.hour)))
+
+
+_STEMS_CN = "甲乙丙丁戊己庚辛壬癸"
+_BRANCHES_CN = "子丑寅卯辰巳午未申酉戌亥"
+
+
+def _parse_cn(ganzhi):
+    return pillars.sexagenary(_STEMS_CN.index(ganzhi[0]), _BRANCHES_CN.index(ganzhi[1]))
+
+
+def engine_lunar(moment):
+    from lunar_python import Solar
+    eight_char = Solar.fromYmdHms(
+        moment.year, moment.month, moment.day, moment.hour, moment.minute, 0
+    ).getLunar().getEightChar()
+    day = eight_char.getDay()
+    if moment.hour >= 23:
+        # Same manual 23:00 advance as src/lib/bazi/chart.ts
+        following = moment + timedelta(days=1)
+        day = Solar.fromYmdHms(following.year, following.month, following.day, 0, 0, 0) \
+            .getLunar().getEightChar().getDay()
+    return (_parse_cn(eight_char.getYear()), _parse_cn(eight_char.getMonth()),
+            _parse_cn(day), _parse_cn(eight_char.getTime()))
+
+
+ENGINES = {"index": engine_index, "sxtwl": engine_sxtwl, "lunar": engine_lunar}
+
+
+def available_engines():
+    names = ["index", "sxtwl"]
+    try:
+        import lunar_python  # noqa: F401
+        names.append("lunar")
+    except ImportError:
+        pass
+    return names
+
+
+def to_moment(minute):
+    return EPOCH + timedelta(minutes=minute)
+
+
+def evaluate(engines, minute):
+    """Return (signature, outputs): the differing fields and every engine's output."""
+    moment = to_moment(minute)
+    outputs = {name: ENGINES[name](moment) for name in engines}
+    reference = outputs[engines[0]]
+    differing = tuple(
+        field for i, field in enumerate(FIELDS)
+        if any(output[i] != reference[i] for output in outputs.values())
+    )
+    return differing, outputs
+
+
+# * =================
+# * CASE GENERATORS
+# * =================
+# Generators yield minute offsets from EPOCH.
+
+def gen_random(count, rng):
+    for _ in range(count):
+        yield rng.randint(FIRST_MINUTE, LAST_MINUTE)
+
+
+def gen_boundary(count, rng):
+    instants, term_ids = solar_terms.get_index()
+    lichun = [jd for jd, term_id in zip(instants, term_ids) if term_id == solar_terms.LICHUN]
+    last_day = LAST_MINUTE // 1440
+    for i in range(count):
+        if i % 2:
+            # Around the 23:00 rollover: 22:00-01:00
+            day = rng.randint(0, last_day - 1)
+            yield day * 1440 + 22 * 60 + rng.randint(0, 180)
+        else:
+            # Within six hours of a Lichun instant
+            centre = _jd_to_minute(rng.choice(lichun))
+            yield min(max(centre + rng.randint(-360, 360), FIRST_MINUTE), LAST_MINUTE)
+
+
+def gen_jieqi(window):
+    instants, _ = solar_terms.get_index()
+    for jd in instants:
+        centre = _jd_to_minute(jd)
+        for minute in range(centre - window, centre + window + 1):
+            if FIRST_MINUTE <= minute <= LAST_MINUTE:
+                yield minute
+
+
+def _jd_to_minute(jd):
+    return int((solar_terms.jd_to_datetime(jd) - EPOCH).total_seconds() // 60)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# * =================
+# * WORKERS
+# * =================
+
+def run_shard(engines, minutes):
+    """Worker entry point: evaluate one shard and return its mismatches."""
+    mismatches = []
+    for minute in minutes:
+        try:
+            differing, outputs = evaluate(engines, minute)
+        except Exception as e:
+            mismatches.append({"minute": minute, "fields": ["error"], "error": f"{type(e).__name__}: {e}"})
+            continue
+        if differing:
+            mismatches.append({"minute": minute, "fields": list(differing), "engines": outputs})
+    return len(minutes), mismatches
+
+
+def _init_worker():
+    solar_terms.get_index()
+
+
+def minimize(engines, minute, fields, limit=7 * 1440):
+    """
+    Shrink a failing case to the contiguous run of minutes with the same
+    disagreement, using exponential then binary search in both directions.
+    """
+    signature = tuple(fields)
+
+    def same(m):
+        if not FIRST_MINUTE <= m <= LAST_MINUTE:
+            return False
+        try:
+            return evaluate(engines, m)[0] == signature
+        except Exception:
+            return False
+
+    def edge(direction):
+        good, step = minute, 1
+        while step <= limit and same(minute + direction * step):
+            good = minute + direction * step
+            step *= 2
+        bad = minute + direction * step
+        while abs(bad - good) > 1:
+            mid = (good + bad) // 2
+            if same(mid):
+                good = mid
+            else:
+                bad = mid
+        return good
+
+    return edge(-1), edge(1)
+
+
+# * =================
+# * MAIN
+# * =================
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzing of pillar engines.")
+    parser.add_argument("--mode", choices=["random", "boundary", "jieqi"], default="jieqi")
+    parser.add_argument("--cases", type=int, default=1_000_000, help="Cases for random/boundary modes")
+    parser.add_argument("--window", type=int, default=120, help="Minutes either side of each solar term (jieqi mode)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", default=None, help="Comma-separated engines (default: index,sxtwl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="NDJSON output path")
+    parser.add_argument("--no-minimize", action="store_true", help="Skip interval minimization")
+    args = parser.parse_args()
+
+    engines = args.engines.split(",") if args.engines else ["index", "sxtwl"]
+    missing = [name for name in engines if name not in available_engines()]
+    if missing or len(engines) < 2:
+        raise SystemExit(f"Need at least two available engines; unavailable: {missing}")
+
+    rng = random.Random(args.seed)
+    if args.mode == "random":
+        cases = gen_random(args.cases, rng)
+    elif args.mode == "boundary":
+        cases = gen_boundary(args.cases, rng)
+    else:
+        cases = gen_jieqi(args.window)
+
+    print(f"Fuzzing {args.mode} with engines {engines} on {args.workers} workers -> {args.report}")
+    solar_terms.get_index()
+    started = time.monotonic()
+    total = 0
+    errors = 0
+    mismatches = []
+
+    with open(args.report, "w", encoding="utf-8") as report, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+
+        def drain(future):
+            nonlocal total, errors
+            count, found = future.result()
+            total += count
+            for mismatch in found:
+                mismatch["timestamp"] = to_moment(mismatch["minute"]).isoformat()
+                report.write(json.dumps({"type": "mismatch", **mismatch}) + "\n")
+            # Keep only what minimization needs; full records are already on disk
+            mismatches.extend((m["minute"], m["fields"]) for m in found if "error" not in m)
+            errors += sum(1 for m in found if "error" in m)
+            rate = total / (time.monotonic() - started)
+            print(f"  {total:,} cases, {len(mismatches):,} mismatches, {errors:,} errors "
+                  f"({rate:,.0f} cases/s)", flush=True)
+
+        in_flight = deque()
+        for shard in chunked(cases, args.chunk_size):
+            in_flight.append(pool.submit(run_shard, engines, shard))
+            if len(in_flight) >= args.workers * 2:
+                drain(in_flight.popleft())
+        while in_flight:
+            drain(in_flight.popleft())
+
+        intervals = []
+        if not args.no_minimize:
+            covered = []
+            for minute, fields in sorted(mismatches):
+                if any(lo <= minute <= hi and f == fields for lo, hi, f in covered[-8:]):
+                    continue
+                lo, hi = minimize(engines, minute, fields)
+                covered.append((lo, hi, fields))
+                _, outputs = evaluate(engines, lo)
+                interval = {
+                    "type": "minimized",
+                    "start": to_moment(lo).isoformat(),
+                    "end": to_moment(hi).isoformat(),
+                    "minutes": hi - lo + 1,
+                    "fields": fields,
+                    "engines": outputs,
+                }
+                report.write(json.dumps(interval) + "\n")
+                intervals.append(interval)
+
+        elapsed = time.monotonic() - started
+        summary = {
+            "type": "summary",
+            "mode": args.mode,
+            "engines": engines,
+            "cases": total,
+            "mismatches": len(mismatches),
+            "errors": errors,
+            "intervals": len(intervals),
+            "elapsed_seconds": round(elapsed, 2),
+            "cases_per_second": round(total / elapsed) if elapsed else None,
+        }
+        report.write(json.dumps(summary) + "\n")
+
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if mismatches or errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
 
 import sxtwl
 import json
-from library.derived import Gan, Zhi, GAN_MAP, ZHI_MAP
+from pillars import HEAVENLY_STEMS, EARTHLY_BRANCHES
 
 # Test dates covering various edge cases
 TEST_CASES = [
@@ -62,8 +62,8 @@ def get_pillars(year, month, day, hour, minute):
 
     # Year pillar
     year_gz = lunar_day.getYearGZ()
-    year_stem = GAN_MAP[Gan[year_gz.tg]]
-    year_branch = ZHI_MAP[Zhi[year_gz.dz]]
+    year_stem = HEAVENLY_STEMS[year_gz.tg]
+    year_branch = EARTHLY_BRANCHES[year_gz.dz]
 
     # Month pillar (with solar term adjustment)
     month_gz = lunar_day.getMonthGZ()
@@ -78,8 +78,8 @@ def get_pillars(year, month, day, hour, minute):
                 prev_day = lunar_day.before(1)
                 month_gz = prev_day.getMonthGZ()
 
-    month_stem = GAN_MAP[Gan[month_gz.tg]]
-    month_branch = ZHI_MAP[Zhi[month_gz.dz]]
+    month_stem = HEAVENLY_STEMS[month_gz.tg]
+    month_branch = EARTHLY_BRANCHES[month_gz.dz]
 
     # Day pillar (23:00 boundary)
     day_gz = lunar_day.getDayGZ()
@@ -87,8 +87,8 @@ def get_pillars(year, month, day, hour, minute):
         next_day = lunar_day.after(1)
         day_gz = next_day.getDayGZ()
 
-    day_stem = GAN_MAP[Gan[day_gz.tg]]
-    day_branch = ZHI_MAP[Zhi[day_gz.dz]]
+    day_stem = HEAVENLY_STEMS[day_gz.tg]
+    day_branch = EARTHLY_BRANCHES[day_gz.dz]
 
     result = {
         "year": f"{year_stem} {year_branch}",
@@ -99,21 +99,26 @@ def get_pillars(year, month, day, hour, minute):
     # Hour pillar
     if hour is not None:
         hour_gz = lunar_day.getHourGZ(hour)
-        hour_stem = GAN_MAP[Gan[hour_gz.tg]]
-        hour_branch = ZHI_MAP[Zhi[hour_gz.dz]]
+        hour_stem = HEAVENLY_STEMS[hour_gz.tg]
+        hour_branch = EARTHLY_BRANCHES[hour_gz.dz]
         result["hour"] = f"{hour_stem} {hour_branch}"
 
     return result
 
 
-results = []
-for year, month, day, hour, minute, desc in TEST_CASES:
-    pillars = get_pillars(year, month, day, hour, minute)
-    results.append({
-        "date": f"{year}-{month:02d}-{day:02d}",
-        "time": f"{hour:02d}:{minute:02d}" if hour is not None else None,
-        "desc": desc,
-        "pillars": pillars,
-    })
+def main():
+    results = []
+    for year, month, day, hour, minute, desc in TEST_CASES:
+        pillars = get_pillars(year, month, day, hour, minute)
+        results.append({
+            "date": f"{year}-{month:02d}-{day:02d}",
+            "time": f"{hour:02d}:{minute:02d}" if hour is not None else None,
+            "desc": desc,
+            "pillars": pillars,
+        })
 
-print(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
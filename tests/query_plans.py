@@ -0,0 +1,298 @@
+"""
+Query-plan regression check for the SQL issued by the API.
+
+Builds a throwaway database at scale with ``synthetic.generate`` and drives
+a scripted tour of the API through TestClient. The tour covers profile and
+life-event CRUD, charts, analysis, luck pillars, sync, batch and admin
+endpoints. Every statement executed meanwhile is captured, including those
+of the background analysis workers but not startup migrations. Each
+distinct statement is run through ``EXPLAIN QUERY PLAN`` with the
+parameters it was first seen with.
+
+The plans are compared with the committed expectations in
+tests/query_plans.json. The check fails when a statement scans a large
+table (one with at least ``--min-rows`` rows) and its expected plan did not
+already scan that table. That covers new statements as well as index
+lookups that turned into full scans. Other plan changes are reported but
+do not fail. Inherent scans, such as paging through the whole profile
+table, are accepted by recording them with ``--update`` and committing the
+file, so they show up in review.
+
+Usage:
+    cd api
+    python ../tests/query_plans.py                       # check against tests/query_plans.json
+    python ../tests/query_plans.py --update              # accept the current plans
+    python ../tests/query_plans.py --profiles 50000 --analyze
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+EXPECTATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans.json")
+ADMIN_TOKEN = "query-plan-check"  # Lets the tour reach the admin endpoints
+
+# Statements worth planning; plain INSERTs, PRAGMAs and transaction control are not
+_PLANNED = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH|INSERT\b.*\bSELECT\b)", re.IGNORECASE | re.DOTALL)
+_IN_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def normalize(statement: str) -> str:
+    """Stable key for a statement: collapsed whitespace, IN lists of any length alike."""
+    return _IN_LIST.sub("(?...)", " ".join(statement.split()))
+
+
+# * =================
+# * CAPTURE
+# * =================
+
+class Capture:
+    """Record distinct statements (first parameters seen) and where they came from."""
+
+    def __init__(self):
+        self.label = None
+        self.statements = {}
+        self.seen_in = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.label is None or not _PLANNED.match(statement):
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        key = normalize(statement)
+        thread = threading.current_thread().name
+        label = "background" if thread.startswith("analysis-worker") else self.label
+        with self._lock:
+            self.statements.setdefault(key, (statement, tuple(parameters or ())))
+            self.seen_in[key].add(label)
+
+
+def tour(client, capture):
+    """Exercise the endpoints that reach the database, labelling each step."""
+    def call(label, method, url, **kwargs):
+        capture.label = label
+        response = client.request(method, url, **kwargs)
+        if response.status_code >= 500:
+            raise SystemExit(f"{label}: {method} {url} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    profile = call("create_profile", "POST", "/api/profiles", json={
+        "name": "Plan Check", "birth_date": "1988-02-02", "birth_time": "13:30",
+        "gender": "male", "place_of_birth": "Jakarta", "phone": "+62 811 1234 5678",
+    }).json()
+    profile_id = profile["id"]
+    call("create_profile_idempotent", "POST", "/api/profiles", headers={"Idempotency-Key": "plan-check-1"}, json={
+        "name": "Plan Check 2", "birth_date": "1990-05-05", "gender": "female",
+    })
+
+    call("list_profiles", "GET", "/api/profiles?limit=100")
+    call("list_profiles_page", "GET", "/api/profiles?skip=5000&limit=100")
+    call("get_profile", "GET", f"/api/profiles/{profile_id}")
+    call("profile_chart", "GET", f"/api/profiles/{profile_id}/chart")
+    call("duplicates", "GET", "/api/profiles/duplicates")
+    call("profiles_by_phone", "GET", "/api/profiles/by_phone?phone=0811-1234-5678")
+    call("update_profile", "PUT", f"/api/profiles/{profile_id}", json={"name": "Plan Check Renamed"})
+    call("update_profile_birth", "PUT", f"/api/profiles/{profile_id}", json={"birth_time": "14:30"})
+
+    event = call("add_life_event", "POST", f"/api/profiles/{profile_id}/life_events",
+                 json={"year": 2010, "month": 6, "day": 1, "location": "Bali"}).json()
+    event_id = event["id"]
+    call("get_life_event", "GET", f"/api/profiles/{profile_id}/life_events/{event_id}")
+    call("update_life_event", "PUT", f"/api/profiles/{profile_id}/life_events/{event_id}",
+         json={"notes": "Plan check"})
+
+    # Let the background analysis finish so its statements are part of the tour
+    for _ in range(100):
+        capture.label = "analysis"
+        analysis = client.get(f"/api/profiles/{profile_id}/life_events/{event_id}/analysis").json()
+        if analysis.get("job") and analysis["job"]["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    call("analysis_jobs", "GET", "/api/analysis_jobs?limit=10")
+    call("analysis_job", "GET", f"/api/analysis_jobs/{analysis['job']['id']}" if analysis.get("job") else
+         "/api/analysis_jobs/missing")
+
+    call("luck_pillars", "GET", f"/api/profiles/{profile_id}/luck_pillars")
+    call("luck_pillar_events", "GET", "/api/luck_pillars/Jia-Zi/events?limit=50")
+
+    sync_page = call("sync_full", "GET", "/api/sync?since=0&limit=200").json()
+    call("sync_delta", "GET", f"/api/sync?since={sync_page['next_token']}")
+
+    call("batch", "POST", "/api/batch", json={"operations": [
+        {"op": "create_profile", "ref": "p", "data": {"name": "Batch", "birth_date": "1975-01-01", "gender": "male"}},
+        {"op": "add_life_event", "ref": "e", "profile_id": "$p", "data": {"year": 2001}},
+        {"op": "update_life_event", "profile_id": "$p", "event_id": "$e", "data": {"notes": "x"}},
+        {"op": "delete_life_event", "profile_id": "$p", "event_id": "$e"},
+    ]})
+    call("batch_job", "GET", "/api/batch/charts/missing")
+    call("admin_tenants", "GET", "/api/admin/tenants", headers={"X-Admin-Token": ADMIN_TOKEN})
+
+    call("delete_life_event", "DELETE", f"/api/profiles/{profile_id}/life_events/{event_id}")
+    call("delete_profile", "DELETE", f"/api/profiles/{profile_id}")
+    capture.label = None
+
+
+# * =================
+# * PLANS
+# * =================
+
+def explain(conn, statement, parameters):
+    """EXPLAIN QUERY PLAN as indented detail lines."""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        # Older SQLite versions say "SCAN TABLE x" / "SEARCH TABLE x"
+        detail = re.sub(r"^(SCAN|SEARCH) TABLE ", r"\1 ", detail)
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def scanned_tables(plan, statement, tables):
+    """Tables read by full scans in a plan, resolving aliases through the statement."""
+    scanned = set()
+    for line in plan:
+        match = _SCAN.match(line.strip())
+        if not match:
+            continue
+        name = match.group(1)
+        if name not in tables:
+            alias = re.search(rf"\b(\w+)\s+(?:AS\s+)?{re.escape(name)}\b", statement, re.IGNORECASE)
+            name = alias.group(1) if alias and alias.group(1) in tables else name
+        if name in tables:
+            scanned.add(name)
+    return scanned
+
+
+def table_sizes(conn):
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in names}
+
+
+def check(current, expected, sizes, min_rows):
+    """Return (failures, notes) comparing current plans with expectations."""
+    large = {name for name, rows in sizes.items() if rows >= min_rows}
+    failures, notes = [], []
+    for key, entry in sorted(current.items()):
+        before = expected.get(key)
+        new_scans = set(entry["scans"]) & large
+        if before is not None:
+            new_scans -= set(before.get("scans", []))
+        if new_scans:
+            kind = "new statement" if before is None else "plan regressed"
+            failures.append(f"{kind}: full scan of {', '.join(sorted(new_scans))}\n"
+                            f"    in: {', '.join(entry['seen_in'])}\n    sql: {key}\n"
+                            + "".join(f"    | {line}\n" for line in entry["plan"]))
+        elif before is None:
+            notes.append(f"new statement (no large scans): {key}")
+        elif before["plan"] != entry["plan"]:
+            notes.append(f"plan changed: {key}\n" + "".join(f"    | {line}\n" for line in entry["plan"]))
+    for key in sorted(set(expected) - set(current)):
+        notes.append(f"no longer issued: {key}")
+    return failures, notes
+
+
+# * =================
+# * MAIN
+# * =================
+
+def main():
+    parser = argparse.ArgumentParser(description="Check query plans against committed expectations.")
+    parser.add_argument("--profiles", type=int, default=20000, help="Synthetic profiles to plan against")
+    parser.add_argument("--events", type=int, default=5, help="Average life events per profile")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Tables at least this big must not be scanned")
+    parser.add_argument("--analyze", action="store_true", help="Run ANALYZE before planning")
+    parser.add_argument("--expectations", default=EXPECTATIONS)
+    parser.add_argument("--update", action="store_true", help="Write the current plans as the expectations")
+    parser.add_argument("--db", help="SQLite file to use instead of a throwaway one")
+    args = parser.parse_args()
+
+    scratch = None
+    if args.db:
+        os.environ["BAZINGSE_DATABASE_PATH"] = args.db
+    else:
+        scratch = tempfile.mkdtemp(prefix="bazingse-plans-")
+        os.environ["BAZINGSE_DATABASE_PATH"] = os.path.join(scratch, "plans.db")
+        os.environ["BAZINGSE_TENANT_DIR"] = os.path.join(scratch, "tenants")
+        os.environ["BAZINGSE_BACKUP_DIR"] = os.path.join(scratch, "backups")
+    os.environ.setdefault("ANALYSIS_WORKERS", "1")
+    os.environ["BAZINGSE_ADMIN_TOKEN"] = ADMIN_TOKEN
+
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from fastapi.testclient import TestClient
+        from database import DATABASE_PATH, init_db
+        import synthetic
+
+        init_db()
+        if args.profiles:
+            print(f"Generating {args.profiles:,} profiles...", flush=True)
+            synthetic.generate(args.profiles, args.events)
+
+        capture = Capture()
+        event.listen(Engine, "before_cursor_execute", capture)
+        from run_bazingse import app
+        with TestClient(app) as client:
+            tour(client, capture)
+        event.remove(Engine, "before_cursor_execute", capture)
+
+        conn = sqlite3.connect(DATABASE_PATH)
+        if args.analyze:
+            conn.execute("ANALYZE")
+        sizes = table_sizes(conn)
+        tables = set(sizes)
+        current = {}
+        for key, (statement, parameters) in capture.statements.items():
+            plan = explain(conn, statement, parameters)
+            current[key] = {
+                "plan": plan,
+                "scans": sorted(scanned_tables(plan, statement, tables)),
+                "seen_in": sorted(capture.seen_in[key]),
+            }
+        conn.close()
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"Planned {len(current)} distinct statements")
+    if args.update:
+        with open(args.expectations, "w") as f:
+            json.dump({"min_rows": args.min_rows, "statements": current}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {args.expectations}")
+        return
+
+    expected = {}
+    if os.path.exists(args.expectations):
+        with open(args.expectations) as f:
+            expected = json.load(f)["statements"]
+    failures, notes = check(current, expected, sizes, args.min_rows)
+    for note in notes:
+        print(f"note: {note}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(f"{len(failures)} statement(s) scan large tables; "
+                         f"add an index or accept with --update")
+    print("No new full scans of large tables")
+
+
+if __name__ == "__main__":
+    main()